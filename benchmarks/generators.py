@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from pyes.data_io._savers import save_to_binaryFile
+
+
+
+#*### A R R A Y S #################################################################################################
+def make_matrix(n_rows, n_features, dtype='float32', seed=0, nan_fraction=0., outlier_fraction=0.):
+    '''
+        Gaussian (n_rows, n_features) matrix, optionally with NaNs and outliers.
+
+        Parameters
+        ----------
+        n_rows, n_features : int
+            Shape of the matrix.
+        dtype : dtype, optional
+            Dtype of the values. Default is float32.
+        seed : int, optional
+            Seed of the generator.
+        nan_fraction : float, optional
+            Fraction of values replaced by NaN.
+        outlier_fraction : float, optional
+            Fraction of values multiplied by 50.
+
+        Returns
+        -------
+        ndarray
+    '''
+
+    rng = np.random.default_rng(seed)
+    data = rng.standard_normal((n_rows, n_features), dtype=np.float64).astype(dtype)
+
+    if outlier_fraction:
+        data[rng.random(data.shape) < outlier_fraction] *= 50
+    if nan_fraction:
+        data[rng.random(data.shape) < nan_fraction] = np.nan
+
+    return data
+
+
+def make_signal_classes(n_classes, n_rows, row_shape=(1,), dtype='float32', seed=0):
+    '''
+        One noisy sine signal per class, with a different frequency and offset per class.
+
+        Returns
+        -------
+        list of ndarray     :   n_classes arrays of shape (n_rows, *row_shape)
+    '''
+
+    rng = np.random.default_rng(seed)
+    steps = np.arange(n_rows, dtype=np.float64)
+    n_values = int(np.prod(row_shape))
+
+    classes = []
+    for label in range(n_classes):
+        signal = np.sin(steps * (label + 1) * 2e-3)[:, None] + label + 0.1 * rng.standard_normal((n_rows, n_values))
+        classes.append(signal.astype(dtype).reshape((n_rows,) + tuple(row_shape)))
+
+    return classes
+
+
+
+#*### F I L E S #################################################################################################
+def write_dataset(directory, classes, file_format='npy', delimiter=','):
+    '''
+        Writes one file per class.
+
+        Parameters
+        ----------
+        directory : str
+            Output directory; created if missing.
+        classes : list of ndarray
+            Class arrays, e.g. from `make_signal_classes`.
+        file_format : {'npy', 'text', 'raw', 'binary'}, optional
+            'text' is delimited values (.txt), 'raw' headerless C-ordered values
+            (.bin), 'binary' a dill pickle (.pkl). Default is 'npy'.
+        delimiter : str, optional
+            Value separator of text files.
+
+        Returns
+        -------
+        list of str     :   file paths, in class order
+    '''
+
+    os.makedirs(directory, exist_ok=True)
+    extension = {'npy': '.npy', 'text': '.txt', 'raw': '.bin', 'binary': '.pkl'}[file_format]
+
+    paths = []
+    for label, data in enumerate(classes):
+        path = os.path.join(directory, f'class_{label}{extension}')
+        if file_format == 'npy':
+            np.save(path, data)
+        elif file_format == 'text':
+            np.savetxt(path, data.reshape(len(data), -1), delimiter=delimiter, fmt='%.6g')
+        elif file_format == 'raw':
+            np.ascontiguousarray(data).tofile(path)
+        else:
+            save_to_binaryFile(data, path)
+        paths.append(path)
+
+    return paths
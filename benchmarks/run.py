@@ -0,0 +1,389 @@
+'''
+    Benchmarks of the pyes hot paths on synthetic data.
+
+    Usage
+    -----
+        python -m benchmarks.run --size small --output bench_output.json
+        python -m benchmarks.run --size small --baseline baseline.json --fail-on-regression
+        python -m benchmarks.run --only cleaning. --rows 500000 --dtype float64
+
+    Every benchmark is timed `--repeat` times after one warm-up run; the JSON
+    output holds the configuration, the environment and, per benchmark, the
+    median and minimum time, the processed bytes and the throughput. With
+    `--baseline` the medians are compared with a previous output: a benchmark
+    slower than the baseline by more than `--tolerance` is a regression.
+'''
+
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+import pyes
+from pyes.data_io.file_manager import load_from_file, load_array_from_file
+from pyes.preprocessing import cleaning
+from pyes.preprocessing.vector_manager import splitter
+from pyes.utils import to_z_score, value_to_vector
+
+from benchmarks.generators import make_matrix, make_signal_classes, write_dataset
+
+
+
+#*### CONSTANTS #################################################################################################
+SIZES = {
+    'small':  {'rows': 20_000, 'features': 16},
+    'medium': {'rows': 200_000, 'features': 32},
+    'large':  {'rows': 2_000_000, 'features': 32},
+}
+
+_BENCHMARKS = {}
+
+
+
+#*### R E G I S T R Y #################################################################################################
+def benchmark(name):
+    '''
+        Registers a benchmark.
+
+        The decorated function is called as `setup(config, workdir)` and returns
+        `(func, nbytes)`: `func()` is the timed call, `nbytes` the bytes it processes.
+    '''
+
+    def register(setup):
+        _BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+
+#*## D A T A  I / O ###################################################
+@benchmark('io.load_from_file.text')
+def _load_text(config, workdir):
+    path = write_dataset(os.path.join(workdir, 'text'), [config['matrix']], 'text')[0]
+    return (lambda: load_from_file(path, type='text/plain')), os.path.getsize(path)
+
+
+@benchmark('io.load_from_file.binary')
+def _load_binary(config, workdir):
+    path = write_dataset(os.path.join(workdir, 'binary'), [config['matrix']], 'binary')[0]
+    return (lambda: load_from_file(path)), os.path.getsize(path)
+
+
+@benchmark('io.load_array_from_file.text')
+def _load_array_text(config, workdir):
+    path = write_dataset(os.path.join(workdir, 'text'), [config['matrix']], 'text')[0]
+    return (lambda: load_array_from_file(path, type='text', dtype=config['dtype'])), os.path.getsize(path)
+
+
+@benchmark('io.load_array_from_file.npy')
+def _load_array_npy(config, workdir):
+    path = write_dataset(os.path.join(workdir, 'npy'), [config['matrix']], 'npy')[0]
+    return (lambda: load_array_from_file(path, type='npy')), os.path.getsize(path)
+
+
+@benchmark('io.load_array_from_file.raw')
+def _load_array_raw(config, workdir):
+    matrix = config['matrix']
+    path = write_dataset(os.path.join(workdir, 'raw'), [matrix], 'raw')[0]
+    return (lambda: load_array_from_file(path, type='raw', dtype=matrix.dtype, row_shape=matrix.shape[1:])), matrix.nbytes
+
+
+
+#*## C L E A N I N G ##################################################
+def _cleaning(name, func, data_key='matrix', **kwargs):
+    '''
+        ### Private function — do not use!
+        registers a serial and a threaded (n_jobs=-1) benchmark of a cleaning function
+    '''
+
+    def setup(config, workdir, n_jobs=None):
+        data = config[data_key]
+        extra = {} if n_jobs is None else {'n_jobs': n_jobs}
+        return (lambda: func(data, **kwargs, **extra)), data.nbytes
+
+    benchmark(f'cleaning.{name}')(setup)
+    if 'n_jobs' in func.__code__.co_varnames:
+        benchmark(f'cleaning.{name}[n_jobs=-1]')(lambda config, workdir: setup(config, workdir, n_jobs=-1))
+
+
+_cleaning('minmax_scaling', cleaning.minmax_scaling)
+_cleaning('maxabs_scaling', cleaning.maxabs_scaling)
+_cleaning('std_norm.1D', cleaning.std_norm, dim='1D')
+_cleaning('std_norm.2D', cleaning.std_norm, data_key='images', dim='2D')
+_cleaning('channel_norm', cleaning.channel_norm, data_key='images')
+_cleaning('whitening', cleaning.whitening)
+_cleaning('normalization.l2', cleaning.normalization, type_norm='l2')
+_cleaning('impute.mean', cleaning.impute, data_key='nan_matrix')
+_cleaning('outlier_detection', cleaning.outlier_detection, data_key='outlier_matrix', threshold=3)
+_cleaning('remove_outliers', cleaning.remove_outliers, data_key='outlier_matrix', threshold=3)
+_cleaning('replace_outliers', cleaning.replace_outliers, data_key='outlier_matrix', threshold=3)
+
+
+
+#*## V E C T O R S  A N D  U T I L S ##################################
+@benchmark('vector_manager.splitter')
+def _splitter(config, workdir):
+    classes = config['classes']
+    split_index = [int(len(classes[0]) * 0.7), int(len(classes[0]) * 0.85)]
+    return (lambda: splitter(classes, split_index)), sum(data.nbytes for data in classes)
+
+
+@benchmark('utils.to_z_score')
+def _to_z_score(config, workdir):
+    data = config['matrix']
+    return (lambda: to_z_score(data)), data.nbytes
+
+
+@benchmark('utils.value_to_vector')
+def _value_to_vector(config, workdir):
+    dimension = [max(1, config['rows'] // 100), 100]
+    return (lambda: value_to_vector(1, dimension)), dimension[0] * dimension[1] * 8
+
+
+
+#*## D A T A S E T  M A N A G E R #####################################
+@benchmark('dataset_manager.end_to_end')
+def _dataset_manager(config, workdir):
+    from pyes.neural_networks.dataset_manager import DatasetManager
+
+    classes = config['classes']
+    paths = write_dataset(os.path.join(workdir, 'classes'), classes, 'npy')
+    split_index = [int(len(classes[0]) * 0.7), int(len(classes[0]) * 0.85)]
+
+    def run():
+        manager = DatasetManager(paths, normalization=to_z_score)
+        manager.load_data(dtype=config['dtype'])
+        return manager.data_processing(split_index, window=256)
+
+    return run, sum(data.nbytes for data in classes)
+
+
+@benchmark('dataset_manager.end_to_end_reshape')
+def _dataset_manager_reshape(config, workdir):
+    from pyes.neural_networks.dataset_manager import DatasetManager
+
+    classes = config['classes']
+    paths = write_dataset(os.path.join(workdir, 'classes'), classes, 'npy')
+    split_index = [int(len(classes[0]) * 0.7), int(len(classes[0]) * 0.85)]
+    data_shape = (-1,) + classes[0].shape[1:]           # one sample per row: any split size fits
+
+    def run():
+        manager = DatasetManager(paths, normalization=to_z_score)
+        manager.load_data(dtype=config['dtype'])
+        return manager.data_processing(split_index, data_shape=data_shape)
+
+    return run, sum(data.nbytes for data in classes)
+
+
+
+#*### R U N #################################################################################################
+def run_benchmarks(rows, features, dtype='float32', repeat=5, only=None, seed=0):
+    '''
+        Runs the registered benchmarks.
+
+        Parameters
+        ----------
+        rows, features : int
+            Size of the synthetic matrix (the class signals have `rows` rows each).
+        dtype : str, optional
+            Dtype of the synthetic data.
+        repeat : int, optional
+            Timed runs per benchmark.
+        only : str, optional
+            Runs only the benchmarks whose name contains this string.
+        seed : int, optional
+            Seed of the synthetic data.
+
+        Returns
+        -------
+        dict    :   'meta' and 'results', see the module docstring
+    '''
+
+    config = {
+        'rows': rows,
+        'dtype': dtype,
+        'matrix': make_matrix(rows, features, dtype, seed),
+        'images': make_matrix(rows, features, dtype, seed).reshape(rows, 1, features),
+        'nan_matrix': make_matrix(rows, features, dtype, seed, nan_fraction=0.01),
+        'outlier_matrix': make_matrix(rows, features, dtype, seed, outlier_fraction=0.001),
+        'classes': make_signal_classes(4, rows, (1,), dtype, seed),
+    }
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='pyes-bench-')
+    try:
+        for name, setup in _BENCHMARKS.items():
+            if only and only not in name:
+                continue
+
+            try:
+                func, nbytes = setup(config, workdir)
+                times = _time(func, repeat)
+            except ImportError as error:
+                results[name] = {'skipped': f'missing dependency: {error.name}'}
+                continue
+
+            median = float(np.median(times))
+            results[name] = {
+                'median': median,
+                'min': float(np.min(times)),
+                'repeat': repeat,
+                'nbytes': int(nbytes),
+                'throughput': nbytes / median if median > 0 else None,
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {
+        'pyes_version': pyes.__version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'rows': rows,
+        'features': features,
+        'dtype': dtype,
+        'repeat': repeat,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    return {'meta': meta, 'results': results}
+
+
+def _time(func, repeat):
+    '''
+        ### Private function — do not use!
+        one warm-up run, then `repeat` timed runs with the garbage collector off
+    '''
+
+    func()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+    return times
+
+
+
+#*### C O M P A R E #################################################################################################
+def compare(current, baseline, tolerance=0.2):
+    '''
+        Compares two outputs of `run_benchmarks`.
+
+        Parameters
+        ----------
+        current, baseline : dict
+            Benchmark outputs.
+        tolerance : float, optional
+            Relative change of the median considered noise. Default is 0.2 (20%).
+
+        Returns
+        -------
+        dict of str -> dict
+            Per benchmark present in both: baseline and current medians, their
+            ratio and a status among 'regression', 'improvement' and 'unchanged'.
+    '''
+
+    comparison = {}
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if 'median' not in result or not before or 'median' not in before:
+            continue
+
+        ratio = result['median'] / before['median'] if before['median'] > 0 else float('inf')
+        status = 'unchanged'
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 - tolerance:
+            status = 'improvement'
+
+        comparison[name] = {'baseline': before['median'], 'current': result['median'], 'ratio': ratio, 'status': status}
+
+    return comparison
+
+
+def _format(output, comparison=None):
+    '''
+        ### Private function — do not use!
+        text table of the results
+    '''
+
+    lines = [f'{"benchmark":<42}{"median ms":>11}{"min ms":>10}{"MB/s":>10}' + (f'{"vs base":>10}' if comparison else '')]
+    for name, result in output['results'].items():
+        if 'skipped' in result:
+            lines.append(f'{name:<42}  skipped ({result["skipped"]})')
+            continue
+
+        line = f'{name:<42}{result["median"] * 1e3:>11.3f}{result["min"] * 1e3:>10.3f}{(result["throughput"] or 0) / 2**20:>10.1f}'
+        if comparison and name in comparison:
+            change = comparison[name]
+            line += f'{change["ratio"]:>9.2f}x' + ('  <-- regression' if change['status'] == 'regression' else '')
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+
+#*### M A I N #################################################################################################
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description='Benchmarks of the pyes hot paths on synthetic data.')
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='preset size of the synthetic data')
+    parser.add_argument('--rows', type=int, help='rows of the synthetic data (overrides --size)')
+    parser.add_argument('--features', type=int, help='features of the synthetic matrix (overrides --size)')
+    parser.add_argument('--dtype', default='float32', help='dtype of the synthetic data')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--only', help='run only the benchmarks whose name contains this string')
+    parser.add_argument('--output', default='bench_output.json', help='JSON output path')
+    parser.add_argument('--baseline', help='JSON output of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change considered noise')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on regressions')
+    args = parser.parse_args(argv)
+
+    size = SIZES[args.size]
+    output = run_benchmarks(args.rows or size['rows'], args.features or size['features'], args.dtype,
+                            args.repeat, args.only)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        comparison = compare(output, baseline, args.tolerance)
+        output['comparison'] = {'baseline': args.baseline, 'tolerance': args.tolerance, 'results': comparison}
+
+        different = [key for key in ('rows', 'features', 'dtype') if baseline['meta'].get(key) != output['meta'][key]]
+        if different:
+            print(f'warning: the baseline was run with a different {", ".join(different)}', file=sys.stderr)
+
+    with open(args.output, 'w') as file:
+        json.dump(output, file, indent=2)
+
+    print(_format(output, comparison))
+
+    regressions = [name for name, change in (comparison or {}).items() if change['status'] == 'regression']
+    if regressions:
+        print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+        if args.fail_on_regression:
+            return 1
+
+    return 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,3 @@
-## Empty for now
\ No newline at end of file
+## Empty for now
+
+__version__ = '0.1'
@@ -1,4 +1,7 @@
+import itertools
+
 import dill
+import numpy as np
 
 #*### LOAD FROM BINARY FILE ########################################################################
 def load_from_binaryFile(filename, path=''):
@@ -48,3 +51,98 @@ def load_from_textFile(filename, path=''):
         data = file.read()
 
     return data
+
+
+#*### LOAD ARRAY FROM TEXT FILE ########################################################################
+def load_array_from_textFile(filename, out, delimiter=',', path='', chunk_rows=65536):
+    """
+        Parse a delimited numeric text file straight into a preallocated array.
+
+        Lines are parsed by the C reader of `np.loadtxt`, `chunk_rows` at a time,
+        so the only temporary is one chunk of typed values.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the text file.
+        out : ndarray, shape (n_rows, ...)
+            Destination array; its dtype is the parsing dtype and its trailing
+            shape is filled by the values of each line.
+        delimiter : str, optional
+            Value separator. Default is ','.
+        path : str, optional
+            Directory path where the file is stored. Default is current directory.
+        chunk_rows : int, optional
+            Lines parsed per chunk.
+
+        Returns
+        -------
+        out : ndarray
+            The filled destination array.
+
+        Raises
+        ------
+        ValueError
+            If the file does not contain exactly len(out) non-empty lines.
+    """
+
+    full_path = path + filename
+    flat = out.reshape((len(out), -1))
+
+    filled = 0
+    with open(full_path, 'r') as file:
+        while True:
+            lines = list(itertools.islice(file, chunk_rows))
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, delimiter=delimiter, dtype=out.dtype, comments=None, ndmin=2)
+            if filled + len(chunk) > len(flat):
+                raise ValueError(f'{full_path} has more rows than expected ({len(flat)})')
+            flat[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+
+    if filled != len(flat):
+        raise ValueError(f'{full_path} has {filled} rows, expected {len(flat)}')
+
+    if not np.shares_memory(flat, out):
+        out[...] = flat.reshape(out.shape)
+
+    return out
+
+
+#*### LOAD ARRAY FROM RAW BINARY FILE ########################################################################
+def load_array_from_rawFile(filename, out, path=''):
+    """
+        Read a headerless binary file straight into a preallocated array.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the binary file, containing C-ordered values of `out.dtype`.
+        out : ndarray
+            C-contiguous destination array.
+        path : str, optional
+            Directory path where the file is stored. Default is current directory.
+
+        Returns
+        -------
+        out : ndarray
+            The filled destination array.
+
+        Raises
+        ------
+        ValueError
+            If the file is shorter than `out`.
+    """
+
+    if not out.flags.c_contiguous:
+        raise ValueError('out must be C-contiguous')
+
+    full_path = path + filename
+    with open(full_path, 'rb') as file:
+        read = file.readinto(memoryview(out.reshape(-1).view(np.uint8)))
+
+    if read != out.nbytes:
+        raise ValueError(f'{full_path}: read {read} bytes, expected {out.nbytes}')
+
+    return out
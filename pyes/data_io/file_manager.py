@@ -2,6 +2,8 @@ import os
 import mimetypes
 from typing import Dict
 
+import numpy as np
+
 import pyes.data_io._loaders as loaders
 import pyes.data_io._savers as savers
 
@@ -283,4 +285,351 @@ def save_to_file(data_to_save, file_name, path='', type='auto'):
         else:
             raise NotImplementedError(f"Saver for type '{type}' is not implemented.")
     
-    return savers.save_to_binaryFile(data_to_save, file_name, path)
\ No newline at end of file
+    return savers.save_to_binaryFile(data_to_save, file_name, path)
+
+
+#*## T Y P E D  A R R A Y  L O A D I N G ################################################
+def array_file_info(path, type='auto', dtype='float32', row_shape=None, delimiter=','):
+    '''
+        Reads the number of rows and the row shape of a numeric file, without parsing it.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file.
+        type : {'auto', 'text', 'npy', 'raw', 'binary'} or MIME type, optional
+            File format, see `load_array_from_file`. Default is 'auto'.
+        dtype : dtype, optional
+            Value dtype; only used by 'raw' files. Default is float32.
+        row_shape : tuple of int, optional
+            Shape of one row. Default is read from the file (one line of a text
+            file, the trailing axes of a .npy file); raw files default to one value per row.
+        delimiter : str, optional
+            Value separator of text files. Default is ','.
+
+        Returns
+        -------
+        tuple (n_rows, row_shape)
+
+        Raises
+        ------
+        ValueError
+            If `row_shape` does not match the values of a row.
+
+        Notes
+        -----
+        'binary' (dill) files have to be deserialized to be measured: prefer
+        'npy' or 'raw' files for large numeric data.
+    '''
+
+    type = _array_type(path, type)
+
+    if type == 'text':
+        n_rows, first_offset = _count_lines(path)
+        shape = _first_row(path, first_offset, delimiter)
+    elif type == 'npy':
+        shape = np.load(path, mmap_mode='r').shape
+        n_rows, shape = shape[0], shape[1:]
+    elif type == 'raw':
+        row_values = int(np.prod(row_shape)) if row_shape else 1
+        n_rows = os.path.getsize(path) // (np.dtype(dtype).itemsize * row_values)
+        shape = tuple(row_shape) if row_shape else ()
+    else:
+        shape = np.shape(loaders.load_from_binaryFile(path))
+        n_rows, shape = shape[0], shape[1:]
+
+    if row_shape is None:
+        return n_rows, tuple(shape)
+
+    row_shape = tuple(row_shape)
+    if int(np.prod(row_shape)) != int(np.prod(shape)):
+        raise ValueError(f'row_shape {row_shape} does not match the {int(np.prod(shape))} values per row of {path}')
+
+    return n_rows, row_shape
+
+
+def load_array_from_file(path, out=None, type='auto', dtype='float32', row_shape=None, delimiter=','):
+    '''
+        Load a numeric file into a typed array, optionally preallocated.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file.
+        out : ndarray, optional
+            Destination array of shape (n_rows, *row_shape), e.g. a slice of a
+            larger preallocated tensor. Its dtype is used instead of `dtype`.
+            A new array is allocated if not given.
+        type : str, optional
+            - 'text' (or any text MIME type): delimited values, one row per line,
+              parsed chunk by chunk straight into `out`
+            - 'npy': NumPy .npy file, memory-mapped and copied into `out`
+            - 'raw': headerless C-ordered binary values, read straight into `out`
+            - 'binary': dill-serialized array-like, as `load_from_file`
+            - 'auto': '.npy' extension -> 'npy', text MIME types -> 'text', else 'binary'
+            Default is 'auto'.
+        dtype : dtype, optional
+            Dtype of the allocated array. Default is float32.
+        row_shape : tuple of int, optional
+            Shape of one row, see `array_file_info`.
+        delimiter : str, optional
+            Value separator of text files. Default is ','.
+
+        Returns
+        -------
+        ndarray     :   `out`, or the newly allocated array
+
+        Examples
+        --------
+        >>> data = load_array_from_file('signal.csv', dtype='float64')
+        >>> load_array_from_file('class_1.npy', out=tensor[0:1000])
+    '''
+
+    type = _array_type(path, type)
+
+    if out is None:
+        n_rows, row_shape = array_file_info(path, type, dtype, row_shape, delimiter)
+        out = np.empty((n_rows,) + row_shape, dtype=dtype)
+
+    if type == 'text':
+        return loaders.load_array_from_textFile(path, out, delimiter)
+    if type == 'raw':
+        return loaders.load_array_from_rawFile(path, out)
+    if type == 'npy':
+        out[...] = np.load(path, mmap_mode='r').reshape(out.shape)
+        return out
+
+    out[...] = np.asarray(loaders.load_from_binaryFile(path)).reshape(out.shape)
+    return out
+
+
+#*## R O W  I N D E X ###################################################################
+_INDEX_SUFFIX = '.idx.npz'
+_INDEX_VERSION = 2          # 2: empty lines are not rows
+
+
+def row_index(path, type='auto', dtype='float32', row_shape=None, delimiter=',', sidecar=True):
+    '''
+        Builds (or reloads) the row index of a numeric file, for random row access.
+
+        Text files are scanned once for the byte offset of every line; the offsets
+        are saved in a `<path>.idx.npz` sidecar together with the size and mtime of
+        the file, and reused until the file changes. Rows of 'npy' and 'raw' files
+        are at fixed offsets, read through a memmap, so they need no sidecar.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file.
+        type, dtype, row_shape, delimiter
+            See `array_file_info`.
+        sidecar : bool, optional
+            Read and write the sidecar of text files. Default is True; a sidecar
+            that cannot be written (e.g. read-only directory) is silently skipped.
+
+        Returns
+        -------
+        dict
+            'path', 'type', 'n_rows', 'row_shape', 'dtype' and, for text files,
+            'offsets' (n_rows + 1 byte offsets, the last one is the end of the file).
+            Empty lines are not rows, as for `load_array_from_file`.
+    '''
+
+    type = _array_type(path, type)
+    index = {'path': path, 'type': type, 'dtype': np.dtype(dtype).str}
+
+    if type != 'text':
+        index['n_rows'], index['row_shape'] = array_file_info(path, type, dtype, row_shape, delimiter)
+        return index
+
+    stat = os.stat(path)
+    stamp = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    sidecar_path = path + _INDEX_SUFFIX
+
+    offsets = None
+    if sidecar and os.path.exists(sidecar_path):
+        with np.load(sidecar_path) as stored:
+            if 'version' in stored and stored['version'] == _INDEX_VERSION and np.array_equal(stored['stamp'], stamp):
+                offsets = stored['offsets']
+
+    if offsets is None:
+        offsets = _line_offsets(path)
+        if sidecar:
+            try:
+                with open(sidecar_path, 'wb') as file:
+                    np.savez(file, offsets=offsets, stamp=stamp, version=_INDEX_VERSION)
+            except OSError:
+                pass
+
+    shape = _first_row(path, int(offsets[0]) if len(offsets) > 1 else None, delimiter)
+    if row_shape is not None and int(np.prod(row_shape)) != int(np.prod(shape)):
+        raise ValueError(f'row_shape {tuple(row_shape)} does not match the {int(np.prod(shape))} values per row of {path}')
+
+    index['offsets'] = offsets
+    index['n_rows'] = len(offsets) - 1
+    index['row_shape'] = tuple(row_shape) if row_shape is not None else shape
+    return index
+
+
+def read_array_rows(index, rows, delimiter=','):
+    '''
+        Reads some rows of a file through its `row_index`, without loading the rest.
+
+        Parameters
+        ----------
+        index : dict
+            Row index returned by `row_index`.
+        rows : int, slice or array-like of int
+            Rows to read, in the requested order.
+        delimiter : str, optional
+            Value separator of text files. Default is ','.
+
+        Returns
+        -------
+        ndarray     :   shape (n_selected, *row_shape), or row_shape for an int
+
+        Notes
+        -----
+        Text rows are read by seeking to their offset; runs of consecutive rows
+        are read and parsed with a single read.
+
+        Examples
+        --------
+        >>> index = row_index('class_2.csv')
+        >>> read_array_rows(index, [10, 11, 12, 500])
+    '''
+
+    path, type, n_rows = index['path'], index['type'], index['n_rows']
+    shape = (n_rows,) + tuple(index['row_shape'])
+
+    if np.ndim(rows) == 0 and not isinstance(rows, slice):
+        return read_array_rows(index, [rows], delimiter)[0]
+
+    selected = np.arange(n_rows)[rows] if isinstance(rows, slice) else np.asarray(rows, dtype=np.int64)
+    if len(selected) and (selected.min() < -n_rows or selected.max() >= n_rows):
+        raise IndexError(f'row index out of range for {path} ({n_rows} rows)')
+    selected = np.where(selected < 0, selected + n_rows, selected)
+
+    if type == 'npy':
+        return np.asarray(np.load(path, mmap_mode='r').reshape(shape)[selected], dtype=index['dtype'])
+    if type == 'raw':
+        return np.memmap(path, dtype=index['dtype'], mode='r', shape=shape)[selected]
+    if type == 'binary':
+        return np.asarray(loaders.load_from_binaryFile(path), dtype=index['dtype']).reshape(shape)[selected]
+
+    out = np.empty((len(selected),) + shape[1:], dtype=index['dtype'])
+    flat = out.reshape((len(out), -1))
+    offsets = index['offsets']
+
+    # -- runs of consecutive rows --
+    breaks = np.flatnonzero(np.diff(selected) != 1) + 1
+    with open(path, 'rb') as file:
+        for first, last in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(selected)]))):
+            start, stop = selected[first], selected[last - 1] + 1
+            file.seek(offsets[start])
+            lines = file.read(offsets[stop] - offsets[start]).decode().splitlines()
+            flat[first:last] = np.loadtxt(lines, delimiter=delimiter, dtype=out.dtype, comments=None, ndmin=2)
+
+    return out
+
+
+def _line_offsets(path, chunk_bytes=1 << 20):
+    '''
+        ### Private function - do not use!
+        Byte offset of the start of every non-empty line, plus the end of the file.
+    '''
+
+    starts = list(_row_starts(path, chunk_bytes))
+    return np.concatenate(starts + [np.array([os.path.getsize(path)], dtype=np.int64)])
+
+
+def _row_starts(path, chunk_bytes=1 << 20):
+    '''
+        ### Private function - do not use!
+
+        Yields, chunk by chunk, the byte offsets of the lines that hold a row:
+        the lines `np.loadtxt` keeps, i.e. all but the empty ones ('\\n' or '\\r\\n').
+    '''
+
+    position, line_start, previous = 0, 0, b'\n'
+    with open(path, 'rb') as file:
+        while True:
+            chunk = file.read(chunk_bytes)
+            if not chunk:
+                break
+
+            data = np.frombuffer(previous + chunk, dtype=np.uint8)      # data[i] is the byte before chunk[i]
+            newlines = np.flatnonzero(data[1:] == ord('\n'))
+            ends = newlines.astype(np.int64) + position
+            starts = np.concatenate(([line_start], ends[:-1] + 1)).astype(np.int64)[:len(ends)]
+
+            lengths = ends - starts
+            empty = (lengths == 0) | ((lengths == 1) & (data[newlines] == ord('\r')))
+            yield starts[~empty]
+
+            if len(ends):
+                line_start = int(ends[-1]) + 1
+            position += len(chunk)
+            previous = chunk[-1:]
+
+    # -- last line without trailing newline --
+    if position - line_start > 1 or (position - line_start == 1 and previous != b'\r'):
+        yield np.array([line_start], dtype=np.int64)
+
+
+def _first_row(path, offset, delimiter=','):
+    '''
+        ### Private function - do not use!
+        number of values of the line starting at `offset` (0 if None)
+    '''
+
+    if offset is None:
+        return (0,)
+
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        line = file.readline().decode().strip()
+    return (len(line.split(delimiter)),) if line else (0,)
+
+
+def _array_type(path, type='auto'):
+    '''
+        ### Private function - do not use!
+        Maps a `type` argument to one of 'text', 'npy', 'raw', 'binary'.
+    '''
+
+    if type in ('text', 'npy', 'raw', 'binary'):
+        return type
+
+    if type == 'auto':
+        if path.lower().endswith('.npy'):
+            return 'npy'
+        type = detect_file_type(path)
+
+    type = type.lower()
+    if type.startswith('text/') or type in ('application/json', 'application/xml', 'application/javascript'):
+        return 'text'
+
+    return 'binary'
+
+
+def _count_lines(path, chunk_bytes=1 << 20):
+    '''
+        ### Private function - do not use!
+        Counts the rows of a text file by scanning raw byte chunks.
+
+        Returns
+        -------
+        tuple (n_lines, first_offset)
+            Empty lines are not counted, as `np.loadtxt` skips them; a last
+            line without trailing newline is counted. `first_offset` is the byte
+            offset of the first row (None if there is none).
+    '''
+
+    n_lines, first_offset = 0, None
+    for starts in _row_starts(path, chunk_bytes):
+        if first_offset is None and len(starts):
+            first_offset = int(starts[0])
+        n_lines += len(starts)
+
+    return n_lines, first_offset
@@ -1,34 +1,47 @@
-from FilesManager_class import FilesManager
 import numpy as np
-import keras
 import tensorflow as tf
-from Normalization_class import Normalization
+
+from pyes.data_io.file_manager import load_array_from_file
+from pyes.preprocessing.vector_manager import split_ranges
+from pyes.preprocessing._parallel import _block_moments, _merge_moments
+from pyes.neural_networks.labels import label_dtype, class_labels, one_hot as encode_one_hot
+
+
+#*### CONSTANTS #################################################################################################
+SAMPLE_SHAPE = (3840, 1)            # shape of one sample of the legacy models
+_MOMENT_BLOCK = 1 << 20             # values per block of the in-place normalization statistics
 
 
 class _DataProcessing():
     '''
-        ## Not working
         ## It's just for an internal use - Do not use!
-    
+        Legacy engine of the first models, for any number of classes (one file per class).
+
+        The size of every split is computed before any copy: each class slice is
+        written straight into its place in a preallocated float32 tensor of shape
+        (-1, *sample_shape) per split, which is then normalized in place. No
+        per-class or per-split array is concatenated.
+
+        Parameters
+        ----------
+        file_path_list : list of str
+            One file per class, in class order.
+        file_type : {'text', 'bin', 'npy', 'raw', 'auto'}, optional (default='text')
+            'bin' is a dill pickle ('binary' of `load_array_from_file`).
+        sample_shape : tuple of int, optional (default=(3840, 1))
+            Shape of one sample of the output tensors.
     '''
 
 
-    def __init__(self, file_path_list, file_type = 'text'):
+    def __init__(self, file_path_list, file_type = 'text', sample_shape = SAMPLE_SHAPE):
 
+        if isinstance(file_path_list, str): file_path_list = [file_path_list]
 
         self.num_classes = len(file_path_list)
+        self.sample_shape = tuple(sample_shape)
 
-        filesManager = FilesManager()
-        self.normalizer = Normalization()
-
-        self.files_list = []
-        for path in file_path_list:
-            if file_type == 'bin':
-                file = filesManager.load_from_binaryFile(path)
-            elif file_type == 'text':
-                file = filesManager.load_from_textFile(path)
-
-            self.files_list.append(file)
+        file_type = 'binary' if file_type == 'bin' else file_type
+        self.files_list = [load_array_from_file(path, type=file_type) for path in file_path_list]
 
 
 
@@ -60,7 +73,7 @@ class _DataProcessing():
             dataset.append(self.build_dataset((data, label)))
 
         return tuple(dataset)
-    
+
 
     def load_data(self, split_index):
         '''
@@ -74,7 +87,7 @@ class _DataProcessing():
                     split_index:    the index for the splitting
                     - int
                     - tuple of int
-            
+
             Output:
                     (train_data, train_labels):     the first part of the data with the labels
                         tuple of array
@@ -86,16 +99,10 @@ class _DataProcessing():
                         tuple of array
         '''
 
-        
         all_data, all_labels = self.build_data(split_index)
 
         # -- reshaping all the data in the form: (data1, labels1), ... (dataN, labelsN)
-        return_data = []
-        for (data, label) in zip(all_data, all_labels):
-            return_data.append((data, label))
-
-
-        return tuple(return_data)
+        return tuple(zip(all_data, all_labels))
 
 
 
@@ -106,7 +113,7 @@ class _DataProcessing():
 
             Input:
                     input_data:     the data for the dataset
-                    array-like 
+                    array-like
 
             Ouput:
                     dataset:        completed dateset
@@ -123,67 +130,63 @@ class _DataProcessing():
             if len(input_data) != 2: raise ValueError('expected 2 values but ', len(input_data), ' where given')
             data, labels = input_data
             dataset = tf.data.Dataset.from_tensor_slices((data, labels))
-        
+
         dataset = dataset.shuffle(buffer_size=buffer_size).batch(batch_size)
 
         return dataset
-    
 
-    def build_data(self, split_index):
+
+    def build_data(self, split_index, one_hot=True):
         '''
             operations list:
-            - split data and rearanging
-            - split labels and rearanging
-            - normalization and reshape (-1, 3840, 1) in float32
-            - one hot encoding of labels
+            - split sizes of every class, computed up front
+            - class slices copied straight into the preallocated (-1, 3840, 1) float32 split tensors
+            - in-place normalization of every split tensor
+            - labels of every split (one hot encoded by default)
 
             Input:
-                    split_index:    a set of index used to split both the data and the lables
+                    split_index:    a set of index used to split the rows of every class
                     [int, int ...]
                     int
+                    (float, float ...)  fractions, see `split_ranges`
+
+                    one_hot:        one hot float32 labels; False gives integer class ids (`build_all_labels`)
+                    bool
 
             Output:
                     all_data, all_lables
-                    tuple, tuple 
+                    list, list
+                    - [train, test] or [train, val, test] ...
 
+            Raises:
+                    ValueError  if the rows of a class split do not fill whole samples
         '''
 
-        splitted_data = self.split_all(split_index)
+        ranges = self.split_ranges_all(split_index)
         '''
-            possibile shape of splitted data:
-                - (data1_train, data1_test), (data2_train, data2_test) ...
-                - (data1_train, data1_val, data1_test), (data2_train, data2_val, data2_test) ...
+            ranges[k][s] = (start, stop) rows of the class k in the split s
         '''
 
-        all_data = list(np.concatenate(vector) for vector in zip(*splitted_data))
-        '''
-            put all the train/val/test data together
-            possibile result:
-                - (data_train, data_test)
-                - (data_train, data_val, data_test)
-        '''
+        counts = self.sample_counts(ranges)
+        sample_values = int(np.prod(self.sample_shape))
 
-        all_generated_labels = self.build_all_labels(split_index)
-        '''
-            possibile shape of all_labels
-                - (data1_labels_train, data1_labels_test), (data2_labels_train, data2_labels_test)
-                - (data1_labels_train, data1_labels_val, data1_labels_test), (data2_labels_train, data2_labels_val, data2_labels_test)
-        '''
+        all_data = []
+        for split, split_counts in enumerate(zip(*counts)):
+            data = np.empty((sum(split_counts),) + self.sample_shape, dtype=np.float32)
+            flat = data.reshape(-1)
 
-        all_labels = list(np.concatenate(label_vector) for label_vector in zip(*all_generated_labels))
-        '''
-            possible results:
-                - (labels_train, labels_test)
-                - (labels_train, labels_val, labels_test)
-        '''
-
-        for i in range(len(all_data)):        
-            all_data[i] = self.normalize(all_data[i])
-            all_data[i]= np.reshape(all_data[i], (-1, 3840, 1)).astype('float32')
+            # -- every class slice goes straight to its place (cast to float32 by the copy) --
+            offset = 0
+            for class_data, class_ranges, n_samples in zip(self.files_list, ranges, split_counts):
+                start, stop = class_ranges[split]
+                flat[offset:offset + n_samples * sample_values] = class_data[start:stop].reshape(-1)
+                offset += n_samples * sample_values
 
-        for i in range(len(all_labels)):
-            all_labels[i] = keras.utils.to_categorical(all_labels[i], self.num_classes)
+            all_data.append(self.normalize(data))
 
+        all_labels = self.build_all_labels(counts)
+        if one_hot:
+            all_labels = [encode_one_hot(labels, self.num_classes) for labels in all_labels]
 
         return all_data, all_labels
 
@@ -192,84 +195,122 @@ class _DataProcessing():
 
     def load_class(self, class_to_load):
 
-        if class_to_load > self.num_classes:
+        if not 0 <= class_to_load < self.num_classes:
             raise ValueError('invalid class')
         else:
             return self.files_list[class_to_load]
 
 
-    def build_all_labels(self, dimensions):
+    def split_ranges_all(self, split_index):
+        '''
+            (start, stop) rows of every split of every class
+        '''
+
+        return [split_ranges(len(data), split_index) for data in self.files_list]
+
+
+    def sample_counts(self, ranges):
+        '''
+            number of samples of every class in every split: counts[k][s]
+        '''
+
+        sample_values = int(np.prod(self.sample_shape))
+
+        counts = []
+        for label, (data, class_ranges) in enumerate(zip(self.files_list, ranges)):
+            row_values = int(np.prod(data.shape[1:]))
+            class_counts = []
+            for start, stop in class_ranges:
+                n_values = (stop - start) * row_values
+                if n_values % sample_values:
+                    raise ValueError(f'rows {start}:{stop} of the class {label} do not fill whole samples '
+                                     f'of shape {self.sample_shape}')
+                class_counts.append(n_values // sample_values)
+            counts.append(class_counts)
+
+        return counts
+
 
-        label_list = []
-        lab_num = 0
-        for data in self.files_list:
-            label = self.label_build(lab_num, dimensions)
-            lab_num += 1
+    def build_all_labels(self, counts):
+        '''
+            integer labels of every split, classes in order (smallest unsigned dtype)
+
+            Input:
+                    counts:     samples of every class in every split, see `sample_counts`
+        '''
 
-            label_list.append(label)
-        
-        return label_list
-    
+        return [class_labels(split_counts, self.num_classes) for split_counts in zip(*counts)]
 
-    def label_build(self, value, dimensions, max_dim = 100):
 
-        vector = [value] * max_dim
-        vectors = self.splitter(vector, dimensions)
+    def label_build(self, value, dimensions):
+        '''
+            labels of the class `value` in every split, `dimensions` samples per split
+        '''
 
-        return tuple(vectors)
+        if isinstance(dimensions, (int, np.integer)): dimensions = [dimensions]
+        return tuple(np.full(n_samples, value, dtype=label_dtype(self.num_classes)) for n_samples in dimensions)
 
 
     def split_all(self, split_index):
-        clutter_splitted = self.splitter(self.clutter, split_index)
-        falling_splitted = self.splitter(self.falling, split_index)
-        moving_arm_splitted = self.splitter(self.moving_arm, split_index)
-        target_presence_splitted = self.splitter(self.target_presence, split_index)
+        '''
+            views of every split of every class: (class1_train, class1_test), (class2_train, class2_test) ...
+        '''
 
-        return clutter_splitted, falling_splitted, moving_arm_splitted, target_presence_splitted
+        return [tuple(data[start:stop] for start, stop in class_ranges)
+                for data, class_ranges in zip(self.files_list, self.split_ranges_all(split_index))]
 
 
     def load_examples(self):
-        return self.clutter[0], self.falling[0], self.moving_arm[0], self.target_presence[0]
+        return tuple(data[0] for data in self.files_list)
 
 
     def load_class_example(self, class_to_load):
 
-        # -- clutter --
-        if class_to_load == 0:
-            return self.clutter[0]
-        
-        # -- falling ---
-        elif class_to_load == 1:
-            return self.falling[0]
-        
-        # --- moving arm ---
-        elif class_to_load == 2:
-            return self.moving_arm[0]
-        
-        # --- target presence ---
-        elif class_to_load == 3:
-            return self.target_presence[0]
-        
-        else:
+        if not 0 <= class_to_load < self.num_classes:
             return None
 
+        return self.files_list[class_to_load][0]
+
 
 
     ###  U T I L S  ##########################################################################################À
 
 
     def normalize(self, data, interval=None):
+        '''
+            in-place normalization of a float array over all its values
+
+            Input:
+                    data:       float array, overwritten
+                    interval:   None -> zero mean, unit variance
+                                '0-1' -> min-max scaling
+
+            Output:
+                    data
+        '''
+
+        flat = data.reshape(-1)
+
         if interval == None:
-            return self.normalizer.vector1DNormalization(data)
-        
+            blocks = (flat[start:start + _MOMENT_BLOCK] for start in range(0, len(flat), _MOMENT_BLOCK))
+            count, mean, m2 = _merge_moments(_block_moments(block) for block in blocks)
+            std = np.sqrt(m2 / count) if count else 0.
+            data -= data.dtype.type(mean)
+            data /= data.dtype.type(std if std > 0 else 1.)
+            return data
+
         elif interval == '0-1':
-            return (data - np.min(data)) / (np.max(data) - np.min(data))
-        
+            low, high = np.min(data), np.max(data)
+            data -= low
+            data /= (high - low) if high > low else 1
+            return data
+
         else: raise ValueError('invalid interval')
-    
 
 
-    def splitter(self, vector, indices):
+
+    @staticmethod
+    def splitter(vector, indices):
         '''
             splits a vector into many parts as the index
 
@@ -289,36 +330,18 @@ class _DataProcessing():
                     Out:    [1, 2], [3, 4, 5], [6, 7], [8, 9]
         '''
 
-        if type(indices) == int: indices = [indices]
-        if type(indices) == tuple: indices = [index for index in indices]
+        return tuple(vector[start:stop] for start, stop in split_ranges(len(vector), indices))
 
-        indices = [0] + indices + [len(vector)]
-    
-        # -- check if the indexes are valid --
-        if not all(0 <= index <= len(vector) for index in indices):
-            raise ValueError('incorrect index value')
-        
-        # -- vector splitting --
-        parts = [vector[indices[i]:indices[i+1]] for i in range(len(indices) - 1)]
-    
 
-        return tuple(parts)
 
-                
-                
 
 ###  T E S T  ###############################################################################################
 if __name__ == '__main__':
 
-    loader = DataProcessing()
-
     vector = [1, 2, 3, 4, 5, 6, 7, 8, 9]
     indices = (2, 5, 7)
-    part1, part2, part3, part4 = loader.splitter(vector, indices)
+    part1, part2, part3, part4 = _DataProcessing.splitter(vector, indices)
     print(part1)
     print(part2)
     print(part3)
     print(part4)
-
-    (data1, label1), (data2, label2) = loader.load_data(50)
-    print('done')
\ No newline at end of file
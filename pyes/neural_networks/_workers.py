@@ -0,0 +1,241 @@
+import os
+import tempfile
+
+import numpy as np
+
+from pyes.preprocessing.vector_manager import splitter, sliding_windows
+from pyes.preprocessing._parallel import _block_moments, _merge_moments
+
+
+
+#*### CONSTANTS #################################################################################################
+_MOMENT_BLOCK = 1 << 20             # values per block of the 'std' statistics
+
+
+
+#*### S U B S E T  P R O C E S S I N G #################################################################################################
+def subset_windows(subset, normalize, window, hop=None, padding='drop', out=None, scratch=None):
+    '''
+        ### Private function — do not use!
+
+        Normalizes one subset (train/val/test) and segments each class in windows.
+        Windows never cross a class boundary; their views are copied once, into
+        the final float32 array (`out` if given).
+
+        `out` is an array or a callable `(shape, dtype) -> array`; `scratch` is
+        such a callable for the concatenated subset (see `MemoryBudget.allocate`).
+
+        Returns
+        -------
+        tuple (windows, labels)
+    '''
+
+    normalized = normalize(_concatenate(subset, scratch))
+
+    windows, labels = [], []
+    start = 0
+    for label, class_data in enumerate(subset):
+        class_windows, class_labels = sliding_windows(normalized[start:start + len(class_data)],
+                                                      window, hop, padding=padding, labels=label)
+        windows.append(class_windows)
+        labels.append(class_labels)
+        start += len(class_data)
+
+    if out is None:
+        return np.concatenate(windows, dtype=np.float32), np.concatenate(labels)
+
+    n_windows = sum(len(w) for w in windows)
+    if callable(out):
+        out = out((n_windows,) + windows[0].shape[1:], np.float32)
+    else:
+        _checked(out, n_windows)
+
+    return np.concatenate(windows, out=out), np.concatenate(labels)
+
+
+def subset_reshape(subset, normalize, data_shape, out=None, scratch=None):
+    '''
+        ### Private function — do not use!
+        concatenates, normalizes and reshapes one subset into float32 (into `out` if given,
+        an array or a callable as in `subset_windows`)
+    '''
+
+    data = np.reshape(normalize(_concatenate(subset, scratch)), data_shape)
+    if out is None:
+        return data.astype('float32')
+
+    if callable(out):
+        out = out(data.shape, np.float32)
+    else:
+        _checked(out, len(data), data.shape)
+    out[...] = data
+    return out
+
+
+def _concatenate(subset, scratch=None):
+    '''
+        ### Private function — do not use!
+        `np.concatenate` of the class parts, into an array from `scratch` if given
+    '''
+
+    if scratch is None:
+        return np.concatenate(subset)
+
+    shape = (sum(len(part) for part in subset),) + subset[0].shape[1:]
+    return np.concatenate(subset, out=scratch(shape, np.result_type(*subset)))
+
+
+def window_count(length, window, hop=None, padding='drop'):
+    '''
+        ### Private function — do not use!
+        number of windows `sliding_windows` makes out of `length` steps
+    '''
+
+    hop = window if hop is None else hop
+    if padding == 'pad':
+        return -(-max(length - window, 0) // hop) + 1
+
+    return max(0, (length - window) // hop + 1)
+
+
+def _checked(out, n_rows, shape=None):
+    '''
+        ### Private function — do not use!
+        the normalization must not change the number of samples in parallel mode
+    '''
+
+    if len(out) != n_rows or (shape is not None and tuple(shape) != out.shape):
+        raise ValueError('the normalization function changed the shape of the data, '
+                         'which is not supported with n_workers')
+    return out
+
+
+
+#*### S T D  N O R M A L I Z A T I O N #################################################################################################
+def standardize(data, mean=None, std=None, out=None):
+    '''
+        ### Private function — do not use!
+
+        'std' normalization: zero mean and unit variance over all the values of
+        `data`, or with the given `mean` and `std` (e.g. merged from `row_moments`
+        of its parts). Float data keep their dtype.
+
+        The result is written block by block of rows into `out`, an array or a
+        callable `(shape, dtype) -> array` (see `MemoryBudget.allocate`), so no
+        other full-size array is created.
+    '''
+
+    if mean is None:
+        mean, std = mean_std(row_moments(data))
+
+    dtype = np.result_type(data.dtype, np.float32)
+    if out is None:
+        out = np.empty(data.shape, dtype=dtype)
+    elif callable(out):
+        out = out(data.shape, dtype)
+
+    mean, std = dtype.type(mean), dtype.type(std)
+    rows = _block_rows(data)
+    for start in range(0, len(data), rows):
+        target = out[start:start + rows]
+        np.subtract(data[start:start + rows], mean, out=target)
+        np.divide(target, std, out=target)
+
+    return out
+
+
+def row_moments(data):
+    '''
+        ### Private function — do not use!
+        (count, mean, m2) of all the values of `data`, in blocks of rows
+    '''
+
+    rows = _block_rows(data)
+    return _merge_moments(_block_moments(data[start:start + rows]) for start in range(0, len(data), rows))
+
+
+def _block_rows(data):
+    '''
+        ### Private function — do not use!
+        rows of `data` in a block of about `_MOMENT_BLOCK` values
+    '''
+
+    return max(1, _MOMENT_BLOCK // max(1, int(np.prod(data.shape[1:]))))
+
+
+def mean_std(moments):
+    '''
+        ### Private function — do not use!
+        mean and std of merged moments; a std of 0 (or no values) gives 1
+    '''
+
+    count, mean, m2 = moments
+    std = np.sqrt(m2 / count) if count else 0.
+    return float(mean), float(std) if std > 0 else 1.
+
+
+
+#*### S H A R E D  F I L E S #################################################################################################
+def shared_dir(in_memory=True):
+    '''
+        ### Private function — do not use!
+        temporary directory in RAM (/dev/shm) when available and `in_memory`, else in the default temp dir
+    '''
+
+    base = '/dev/shm' if in_memory and os.path.isdir('/dev/shm') else None
+    return tempfile.mkdtemp(prefix='pyes-', dir=base)
+
+
+def process_subset(task):
+    '''
+        ### Private function — do not use!
+
+        Worker of `DatasetManager.data_processing(n_workers=...)`. Inputs and output
+        are `.npy` files memory-mapped by both processes, so only this small task
+        description is pickled.
+    '''
+
+    raw = np.load(task['raw'], mmap_mode='r')
+    if task['class_offsets'] is not None:
+        offsets = task['class_offsets']
+        raw = [raw[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+
+    subset = [parts[task['subset']] for parts in splitter(raw, task['split_index'])]
+    out = np.load(task['out'], mmap_mode='r+')
+
+    if task['window'] is not None:
+        subset_windows(subset, task['normalize'], task['window'], task['hop'], task['padding'], out=out)
+    else:
+        subset_reshape(subset, task['normalize'], task['data_shape'], out=out)
+
+    out.flush()
+    return task['subset']
+
+
+def process_chunk(task):
+    '''
+        ### Private function — do not use!
+
+        Worker of `DatasetManager.data_processing(n_workers=...)` with the 'std'
+        normalization, on the rows `task['rows']` of the shared raw file:
+        - 'moments': returns their (count, mean, m2), merged by the caller per subset;
+        - 'write': normalizes them with `task['scale']` (mean, std) and writes their
+          windows (or their values, for a reshape) at `task['offset']` of the output.
+    '''
+
+    raw = np.load(task['raw'], mmap_mode='r')
+    start, stop = task['rows']
+    if task['stage'] == 'moments':
+        return row_moments(raw[start:stop])
+
+    data = standardize(raw[start:stop], *task['scale'])
+    out = np.load(task['out'], mmap_mode='r+')
+    offset = task['offset']
+
+    if task['window'] is not None:
+        windows = sliding_windows(data, task['window'], task['hop'], padding=task['padding'])
+        out[offset:offset + len(windows)] = windows
+    else:
+        out.reshape(-1)[offset:offset + data.size] = data.reshape(-1)
+
+    out.flush()
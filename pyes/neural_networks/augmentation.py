@@ -0,0 +1,251 @@
+import threading
+
+import numpy as np
+
+
+
+#*### B A T C H  A U G M E N T E R #################################################################################################
+class BatchAugmenter():
+
+    """
+        On-the-fly augmentation of whole batches, one vectorized call per operation.
+
+        Batches have shape (batch, time, ...). The random draws of a batch come
+        from its own generator, seeded with (`seed`, batch number), so a run can
+        be replayed exactly. Results are written into preallocated buffers that
+        are reused from one call to the next.
+
+        The operations run in this order:
+        - crop and shift: one gather of a random window of `crop` steps, rolled by
+          up to `max_shift` steps (circularly, or with zeros if `shift_mode='zero'`)
+        - scaling: every sample is multiplied by a factor drawn in `scale`
+        - noise: Gaussian noise of standard deviation `noise_std`
+        - mixup: every sample (and label) is blended with another sample of the
+          batch, with a weight drawn from Beta(`mixup`, `mixup`)
+
+        Parameters
+        ----------
+        noise_std : float, optional
+            Standard deviation of the additive Gaussian noise.
+        max_shift : int, optional
+            Largest time shift, in steps, in both directions.
+        shift_mode : {'roll', 'zero'}, optional (default='roll')
+            Steps shifted out of the window come back on the other side, or are zeros.
+        scale : tuple (low, high), optional
+            Range of the amplitude factors.
+        crop : int, optional
+            Length of the random crop along the time axis.
+        mixup : float, optional
+            Alpha of the mixup Beta distribution; needs float (one-hot) labels.
+        seed : int, optional
+            Base seed of the per-batch generators.
+
+        Examples
+        --------
+        >>> augment = BatchAugmenter(noise_std=0.01, max_shift=200, scale=(0.8, 1.2), seed=0)
+        >>> for x, y in manager.batches((train_data, train_labels), augment=augment):
+        ...     model.train_on_batch(x, y)
+        >>> dataset = manager.to_tf_dataset((train_data, train_labels), source='numpy', augment=augment)
+    """
+
+    def __init__(self, noise_std=None, max_shift=None, shift_mode='roll', scale=None, crop=None, mixup=None, seed=None):
+
+        if shift_mode not in ('roll', 'zero'):
+            raise ValueError("Invalid shift_mode. Choose 'roll' or 'zero'.")
+
+        self.noise_std = noise_std
+        self.max_shift = max_shift
+        self.shift_mode = shift_mode
+        self.scale = scale
+        self.crop = crop
+        self.mixup = mixup
+        self.seed = seed
+
+        self._entropy = seed if seed is not None else np.random.SeedSequence().entropy
+        self._batches = 0
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+
+    def output_shape(self, shape):
+        '''
+            Shape of the augmented version of a batch of shape `shape`.
+        '''
+
+        shape = tuple(shape)
+        if self.crop is None:
+            return shape
+        if self.crop > shape[1]:
+            raise ValueError(f'crop ({self.crop}) is longer than the time axis ({shape[1]})')
+
+        return shape[:1] + (self.crop,) + shape[2:]
+
+
+    @staticmethod
+    def output_dtype(dtype):
+        '''
+            Dtype of the augmented data: float64 stays float64, everything else becomes float32.
+        '''
+
+        return np.dtype(np.float64) if np.dtype(dtype) == np.float64 else np.dtype(np.float32)
+
+
+    def __call__(self, data, labels=None, out=None):
+        '''
+            Augments one batch.
+
+            Parameters
+            ----------
+            data : ndarray, shape (batch, time, ...)
+                Batch of samples; not modified.
+            labels : ndarray, shape (batch, ...), optional
+                Labels; only changed by mixup.
+            out : ndarray or tuple (data_out,) / (data_out, labels_out), optional
+                Destination buffers. Default are internal buffers, valid until the next call.
+
+            Returns
+            -------
+            ndarray or tuple (data, labels)     :   views of the destination buffers
+        '''
+
+        with self._lock:
+            rng = np.random.default_rng([self._entropy, self._batches])
+            self._batches += 1
+
+        if not isinstance(out, tuple):
+            out = (out,)
+        data_out, labels_out = out if len(out) == 2 else (out[0], None)
+        if data_out is None:
+            data_out = self._buffer('data', self.output_shape(data.shape), self.output_dtype(data.dtype))
+        data_out = data_out[:len(data)]
+        if not data_out.flags.c_contiguous:
+            raise ValueError('out must be C-contiguous')
+
+        self._crop_shift(data, data_out, rng)
+
+        if self.scale is not None:
+            low, high = self.scale
+            data_out *= rng.uniform(low, high, size=len(data)).astype(data_out.dtype).reshape((-1,) + (1,) * (data.ndim - 1))
+
+        if self.noise_std:
+            noise = self._buffer('noise', data_out.shape, data_out.dtype)[:len(data)]
+            rng.standard_normal(dtype=noise.dtype, out=noise)
+            noise *= self.noise_std
+            data_out += noise
+
+        if labels is None:
+            if self.mixup:
+                raise ValueError('mixup needs the labels')
+            return data_out
+
+        if labels_out is None:
+            labels_out = self._buffer('labels', labels.shape, labels.dtype)
+        labels_out = labels_out[:len(labels)]
+        labels_out[...] = labels
+
+        if self.mixup:
+            if not np.issubdtype(labels.dtype, np.floating):
+                raise ValueError('mixup needs float (e.g. one-hot) labels')
+            self._mix(data_out, rng, labels_out)
+
+        return data_out, labels_out
+
+
+    #*## O P E R A T I O N S ##############################################
+    def _crop_shift(self, data, out, rng):
+        '''
+            ### Private function — do not use!
+
+            Crop and shift as a single gather: output step t of sample b reads
+            step (start_b + t - shift_b) of the input.
+        '''
+
+        n, length = data.shape[:2]
+        window = out.shape[1]
+
+        if self.crop is None and not self.max_shift:
+            out[...] = data
+            return
+
+        start = rng.integers(0, length - window + 1, size=n) if self.crop is not None else np.zeros(n, dtype=np.int64)
+        shift = rng.integers(-self.max_shift, self.max_shift + 1, size=n) if self.max_shift else np.zeros(n, dtype=np.int64)
+
+        steps = start[:, None] + np.arange(window)[None, :] - shift[:, None]
+        outside = (steps < start[:, None]) | (steps >= start[:, None] + window)
+        if self.shift_mode == 'roll':
+            steps = start[:, None] + (steps - start[:, None]) % window
+
+        flat_index = (np.arange(n)[:, None] * length + np.clip(steps, 0, length - 1)).ravel()
+        np.take(data.reshape((n * length,) + data.shape[2:]), flat_index, axis=0,
+                out=out.reshape((n * window,) + data.shape[2:]), mode='clip')
+
+        if self.shift_mode == 'zero' and self.max_shift:
+            out[outside] = 0
+
+
+    def _mix(self, data, rng, labels):
+        '''
+            ### Private function — do not use!
+            in-place mixup of data and labels with a random pairing
+        '''
+
+        n = len(data)
+        pairs = rng.permutation(n)
+        weight = rng.beta(self.mixup, self.mixup, size=n)
+
+        for array, name in ((data, 'mix_data'), (labels, 'mix_labels')):
+            shape = (-1,) + (1,) * (array.ndim - 1)
+            partner = self._buffer(name, array.shape, array.dtype)[:n]
+            np.take(array, pairs, axis=0, out=partner)
+            array *= weight.astype(array.dtype).reshape(shape)
+            partner *= (1 - weight).astype(array.dtype).reshape(shape)
+            array += partner
+
+
+    def _buffer(self, name, shape, dtype):
+        '''
+            ### Private function — do not use!
+            preallocated buffer, reallocated only when the batch grows
+        '''
+
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape[1:] != tuple(shape[1:]) or len(buffer) < shape[0] or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+
+        return buffer
+
+
+    #*## T F ##############################################################
+    def tf_map(self):
+        '''
+            Map function applying the augmentation to the batches of a tf.data pipeline.
+
+            It must be used with sequential calls (no `num_parallel_calls`), since
+            the internal buffers are reused; the batches are copied into tensors.
+
+            Returns
+            -------
+            callable    :   `batch -> augmented batch`
+        '''
+
+        import tensorflow as tf
+
+        def augment(*arrays):
+            result = self(*arrays)
+            return tuple(np.array(array) for array in (result if isinstance(result, tuple) else (result,)))
+
+        def apply(*batch):
+            dtypes = [tf.as_dtype(self.output_dtype(batch[0].dtype.as_numpy_dtype))] + [tensor.dtype for tensor in batch[1:]]
+            augmented = tf.numpy_function(augment, list(batch), dtypes)
+
+            data_shape = batch[0].shape
+            if self.crop is not None:
+                data_shape = data_shape[:1].concatenate([self.crop]).concatenate(data_shape[2:])
+            for tensor, shape in zip(augmented, [data_shape] + [tensor.shape for tensor in batch[1:]]):
+                tensor.set_shape(shape)
+
+            return augmented[0] if len(augmented) == 1 else tuple(augmented)
+
+        return apply
+
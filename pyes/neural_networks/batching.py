@@ -0,0 +1,246 @@
+import queue
+import threading
+
+import numpy as np
+
+from pyes.neural_networks.labels import one_hot as encode_one_hot
+
+
+
+#*### B A T C H  I T E R A T O R #################################################################################################
+class BatchIterator():
+
+    """
+        Framework-agnostic mini-batch iterator over NumPy arrays.
+
+        Every epoch draws a new seeded permutation of the sample indices; batches
+        are gathered with `np.take` into preallocated buffers that are reused from
+        one batch to the next. With `prefetch` > 0 a background thread prepares
+        the next batches while the caller is computing on the current one.
+
+        A yielded batch is a view of a reused buffer: it stays valid until the
+        next batch is requested. Copy it to keep it longer.
+
+        Parameters
+        ----------
+        data : ndarray, shape (n_samples, ...)
+            Samples; memmaps are read batch by batch.
+        labels : ndarray, shape (n_samples, ...), optional
+            Labels, gathered with the same indices.
+        batch_size : int, optional (default=32)
+            Samples per batch.
+        shuffle : bool, optional (default=True)
+            Draw a new permutation every epoch.
+        seed : int, optional (default=None)
+            Seed of the permutations; the same seed gives the same epochs.
+        drop_last : bool, optional (default=False)
+            Skip the last batch if it is smaller than `batch_size`.
+        prefetch : int, optional (default=2)
+            Batches prepared ahead by the background thread; 0 disables the thread.
+        sampler : WeightedSampler, optional
+            Draws the indices of every epoch instead of the permutation
+            (`shuffle` and `seed` are then unused), see `pyes.neural_networks.sampling`.
+        augment : BatchAugmenter, optional
+            Augmentation applied to every batch (in the prefetch thread), see
+            `pyes.neural_networks.augmentation`. Each ring slot has its own output buffers.
+        one_hot : int, optional
+            Number of classes: the integer labels of every batch are one-hot encoded
+            (float32, into the slot buffer, before the augmentation). The full
+            label matrix is never built.
+
+        Examples
+        --------
+        >>> batches = BatchIterator(train_data, train_labels, batch_size=64, seed=0)
+        >>> for epoch in range(10):
+        ...     for x, y in batches:
+        ...         model.train_step(x, y)
+    """
+
+    def __init__(self, data, labels=None, batch_size=32, shuffle=True, seed=None, drop_last=False, prefetch=2,
+                 sampler=None, augment=None, one_hot=None):
+
+        if labels is not None and len(labels) != len(data):
+            raise ValueError(f'data and labels have different lengths ({len(data)} and {len(labels)})')
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        if one_hot and (labels is None or np.ndim(labels) != 1):
+            raise ValueError('one_hot needs integer labels of shape (n_samples,)')
+
+        self.arrays = (data,) if labels is None else (data, labels)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.prefetch = prefetch
+        self.sampler = sampler
+        self.augment = augment
+        self.one_hot = one_hot
+
+        self._rng = np.random.default_rng(seed)
+
+
+    def __len__(self):
+
+        n_samples = len(self.arrays[0]) if self.sampler is None else len(self.sampler)
+        if self.drop_last:
+            return n_samples // self.batch_size
+        return -(-n_samples // self.batch_size)
+
+
+    def __iter__(self):
+
+        indices = self.epoch_indices()
+        if self.prefetch > 0:
+            return self._background(indices)
+        return self._foreground(indices)
+
+
+    #*## I N D I C E S ####################################################
+    def epoch_indices(self):
+        '''
+            Indices of the next epoch, one array per batch.
+
+            Returns
+            -------
+            list of ndarray     :   views of a single permutation (or sampler draw)
+        '''
+
+        n_samples = len(self.arrays[0])
+        if self.sampler is not None:
+            order = self.sampler.epoch()
+        else:
+            order = self._rng.permutation(n_samples) if self.shuffle else np.arange(n_samples)
+
+        return [order[start:start + self.batch_size] for start in range(0, len(self) * self.batch_size, self.batch_size)]
+
+
+    #*## G A T H E R ######################################################
+    def _buffers(self, n_buffers):
+        '''
+            ### Private function — do not use!
+            `n_buffers` sets of preallocated batch arrays
+        '''
+
+        shapes = [(self.batch_size,) + array.shape[1:] for array in self.arrays]
+        dtypes = [array.dtype for array in self.arrays]
+        if self.one_hot:
+            shapes[1], dtypes[1] = (self.batch_size, self.one_hot), np.dtype(np.float32)
+
+        buffers = [tuple(np.empty(shape, dtype=dtype) for shape, dtype in zip(shapes, dtypes)) for _ in range(n_buffers)]
+        if self.augment is None:
+            return buffers
+
+        # -- every slot gets (gathered, augmented) buffers --
+        data = self.arrays[0]
+        return [(slot, (np.empty(self.augment.output_shape(slot[0].shape), dtype=self.augment.output_dtype(data.dtype)),)
+                 + tuple(np.empty_like(buffer) for buffer in slot[1:]))
+                for slot in buffers]
+
+
+    def _gather(self, batch_indices, buffers):
+        '''
+            ### Private function — do not use!
+            fills a set of buffers and returns the views of the batch
+        '''
+
+        if self.augment is not None:
+            gathered, augmented = buffers
+            return self.augment(*self._take(batch_indices, gathered), out=augmented)
+
+        batch = self._take(batch_indices, buffers)
+        return batch[0] if len(batch) == 1 else tuple(batch)
+
+
+    def _take(self, batch_indices, buffers):
+        '''
+            ### Private function — do not use!
+            gathers the rows of every array, returns the list of batch views
+
+            The indices are checked once per batch: 'clip' would silently turn an
+            out-of-range index (e.g. from a buggy sampler) into the last row.
+        '''
+
+        n_rows = len(self.arrays[0])
+        if len(batch_indices) and (np.min(batch_indices) < 0 or np.max(batch_indices) >= n_rows):
+            raise IndexError(f'batch indices out of range [0, {n_rows}): '
+                             f'min {np.min(batch_indices)}, max {np.max(batch_indices)}')
+
+        batch = []
+        for number, (array, buffer) in enumerate(zip(self.arrays, buffers)):
+            target = buffer[:len(batch_indices)]
+            if number == 1 and self.one_hot:
+                encode_one_hot(np.take(array, batch_indices, mode='clip'), self.one_hot, out=target)
+            else:
+                np.take(array, batch_indices, axis=0, out=target, mode='clip')     # 'clip' writes straight into `out`; indices checked above
+            batch.append(target)
+
+        return batch
+
+
+    def _foreground(self, indices):
+        '''
+            ### Private function — do not use!
+            single buffer, no thread
+        '''
+
+        buffers = self._buffers(1)[0]
+        for batch_indices in indices:
+            yield self._gather(batch_indices, buffers)
+
+
+    def _background(self, indices):
+        '''
+            ### Private function — do not use!
+
+            A daemon thread gathers the batches into a ring of `prefetch + 2`
+            buffers: `prefetch` queued, one being filled and one held by the caller.
+        '''
+
+        ring = self._buffers(self.prefetch + 2)
+        ready = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+
+        def offer(item):
+            # -- gives up as soon as the consumer has stopped --
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for number, batch_indices in enumerate(indices):
+                    if not offer(self._gather(batch_indices, ring[number % len(ring)])):
+                        return
+            except BaseException as error:
+                offer(_Failure(error))
+                return
+            offer(_END)
+
+        worker = threading.Thread(target=produce, name='pyes-batch-prefetch', daemon=True)
+        worker.start()
+
+        try:
+            while True:
+                batch = ready.get()
+                if batch is _END:
+                    return
+                if isinstance(batch, _Failure):
+                    raise batch.error
+                yield batch
+        finally:
+            stop.set()
+            worker.join()
+
+
+
+class _Failure():
+    ''' ### Private class — do not use! Exception raised in the prefetch thread. '''
+
+    def __init__(self, error):
+        self.error = error
+
+
+_END = object()
@@ -1,10 +1,28 @@
+import os
+import shutil
+import warnings
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import keras
 import tensorflow as tf
 
 from pyes.preprocessing.vector_manager import splitter
-from pyes.data_io.file_manager import load_from_file
-from pyes.utils import value_to_vector
+from pyes.preprocessing._parallel import _merge_moments
+from pyes.data_io.file_manager import array_file_info, load_array_from_file, row_index, read_array_rows, _array_type
+from pyes.neural_networks.batching import BatchIterator
+from pyes.neural_networks.processed_cache import ProcessedCache, dataset_fingerprint
+from pyes.neural_networks.shards import export_shards
+from pyes.neural_networks.shared import SharedDataset
+from pyes.neural_networks.instrumentation import Instrumentation, _rss_peak
+from pyes.neural_networks.memory import MemoryBudget
+from pyes.neural_networks.labels import label_dtype, class_labels, one_hot as encode_one_hot
+from pyes.neural_networks.incremental import IncrementalStore
+from pyes.neural_networks import _workers
+
+
+#*### CONSTANTS #################################################################################################
+_CHUNKS_PER_WORKER = 4          # more chunks than processes keeps the pool balanced
 
 
 '''
@@ -13,7 +31,7 @@ DOCS:
 Funzionalità:
 - load data     :    caricare dati grezzi, sia parziali che completi    OK
 - load dataset  :    caricare il dataset completo processato
-- load class    :    caricare una singola classe (parte del dataset)
+- load class    :    caricare una singola classe (parte del dataset)     OK
 - split data    :    suddividere il dataset
 
 - process data  :   fa il preprocessing del dataset
@@ -36,9 +54,23 @@ class DatasetManager():
         data_paths : str or list of str
             Percorsi ai file di dati (raw) da caricare.
         normalization : str or Callable, optional (default='std')
-            Funzione o tipo di normalizzazione da applicare ai dati.
-        file_type : {'auto', 'text', 'binary'}, optional (default='auto')
-            Tipo di file da caricare. Se 'auto', usa 'binary'.
+            Funzione o tipo di normalizzazione da applicare a ogni sottoinsieme.
+            'std': media zero e varianza unitaria su tutti i valori del sottoinsieme.
+        file_type : {'auto', 'text', 'npy', 'raw', 'binary'}, optional (default='auto')
+            Tipo di file da caricare, vedi `load_array_from_file`.
+        instrument : bool, optional
+            Misura tempo, byte e memoria di ogni fase (load_data, splitter, normalize,
+            build_label, one_hot ...). Default: variabile d'ambiente `PYES_INSTRUMENT`.
+        memory_limit : int or str, optional
+            Budget di RAM in byte (o '512M', '4GB' ...). Buffer dei dati grezzi,
+            concatenazioni intermedie e risultati che non ci stanno vengono creati
+            come memmap di file temporanei; i dati grezzi vengono rilasciati dopo
+            `data_processing` (`load_class` li rilegge dai file). Con 'std' anche il
+            risultato della normalizzazione e' allocato dal budget; la memoria usata
+            da una funzione di normalizzazione durante la sua esecuzione non e'
+            contata (vedi `normalize`). Vedi `MemoryBudget`.
+        spill_dir : str, optional
+            Cartella dei file temporanei del budget (default: cartella temporanea di sistema).
 
         Attributes
         ----------
@@ -48,8 +80,20 @@ class DatasetManager():
             Tipo di file effettivamente usato ('text' o 'binary').
         normalization_function : Union[str, Callable]
             Funzione di normalizzazione selezionata.
-        raw_data : np.ndarray or None
-            Dati grezzi caricati; None finché non si chiama `load_data`.
+        raw_data : np.ndarray or list of np.ndarray
+            Dati grezzi caricati: un tensore (n_classi, righe, ...) se tutte le classi
+            hanno lo stesso numero di righe, altrimenti una lista di viste per classe.
+        class_offsets : np.ndarray or None
+            Riga iniziale di ogni classe nel buffer unico (n_classi + 1 valori).
+        instrumentation : Instrumentation
+            Misure per fase: `instrumentation.report()`, hook con `add_hook`.
+        memory_budget : MemoryBudget or None
+            Contabilita' della memoria se `memory_limit` e' dato; vedi `memory_report()`.
+        feature_stats : list of dict or None
+            Dopo `update`: media e deviazione standard per feature dei dati grezzi
+            (non normalizzati) di ogni sottoinsieme. Descrivono i dati, non la
+            trasformazione applicata ('std' usa una sola media e deviazione sul
+            sottoinsieme intero).
         dataset : Any
             Risultato del preprocessing (non ancora implementato).
         labels : Any
@@ -59,13 +103,16 @@ class DatasetManager():
         -------
         load_data()
             Carica i dati raw da file e li memorizza in `raw_data`.
+        load_class(k), sample(k, n), example(k)
+            Accesso a una sola classe, senza caricare tutto il dataset.
         data_processing(split_index)
             Esegue splitting, creazione etichette e normalizzazione dei dati.
         label_build(dimensions)
             Costruisce la lista di etichette per il dataset.
     """
 
-    def __init__(self, data_paths, normalization='std', file_type='auto' ):
+    def __init__(self, data_paths, normalization='std', file_type='auto', instrument=None, memory_limit=None,
+                 spill_dir=None):
         
         if isinstance(data_paths, str):
             self.data_paths = [data_paths]
@@ -75,35 +122,175 @@ class DatasetManager():
         self.normalization_function = normalization
 
         self._raw_data = None
+        self._load_settings = {'dtype': 'float32', 'row_shape': None, 'delimiter': ','}
+        self.class_offsets = None
+        self._row_indices = {}
+        self.feature_stats = None
         self._dataset = None
         self._labels = None
+        self.instrumentation = Instrumentation(enabled=instrument)
+        self.memory_budget = MemoryBudget(memory_limit, spill_dir) if memory_limit is not None else None
+        self._raw_nbytes = 0
 
         
         
     #*## L O A D  D A T A ################################################# 
-    def load_data(self):
+    def load_data(self, dtype='float32', row_shape=None, delimiter=','):
         '''
             Loads raw data from specified paths.
 
+            Every file (one per class) is measured first, then parsed straight into
+            its slice of a single preallocated, typed buffer: no per-class arrays
+            are concatenated and no Python objects are built per value.
+
+            Parameters
+            ----------
+            dtype : dtype, optional (default='float32')
+                Dtype of the loaded values.
+            row_shape : tuple of int, optional
+                Shape of one row (sample); default is read from the files.
+            delimiter : str, optional (default=',')
+                Value separator of text files.
+
             Returns
             -------
-            loaded_data : list of ndarray
-                
+            raw_data : ndarray or list of ndarray
+                (n_classes, n_rows, *row_shape) view of the buffer if all the classes
+                have the same number of rows, otherwise one view per class; the
+                class boundaries are in `class_offsets`.
+
+            Raises
+            ------
+            ValueError
+                If the files have different row shapes.
         '''
 
-        loaded_data = []
-        for file in self.data_paths:
-                
-            data = load_from_file(file, self.file_type)
-            loaded_data.append(data)
+        self._load_settings = {'dtype': dtype, 'row_shape': row_shape, 'delimiter': delimiter}
+        with self.instrumentation.stage('load_data.scan'):
+            infos = [array_file_info(file, self.file_type, dtype, row_shape, delimiter) for file in self.data_paths]
+
+        row_shapes = {shape for _, shape in infos}
+        if len(row_shapes) != 1:
+            raise ValueError(f'all the files must have the same row shape, found {sorted(row_shapes)}')
+        row_shape = row_shapes.pop()
 
-        self.raw_data = np.array(loaded_data)
+        rows = [n_rows for n_rows, _ in infos]
+        self.class_offsets = np.concatenate(([0], np.cumsum(rows))).astype(np.int64)
 
-        return loaded_data
+        shape = (int(self.class_offsets[-1]),) + row_shape
+        if self.memory_budget is None:
+            buffer = np.empty(shape, dtype=dtype)
+        else:
+            self._release_raw()
+            buffer = self.memory_budget.allocate(shape, dtype)
+            self._raw_nbytes = 0 if isinstance(buffer, np.memmap) else buffer.nbytes
+        with self.instrumentation.stage('load_data.read', buffer.nbytes):
+            for file, start, stop in zip(self.data_paths, self.class_offsets[:-1], self.class_offsets[1:]):
+                load_array_from_file(file, out=buffer[start:stop], type=self.file_type, row_shape=row_shape,
+                                     delimiter=delimiter)
+
+        if len(set(rows)) == 1:
+            self.raw_data = buffer.reshape((len(rows), rows[0]) + row_shape)
+        else:
+            self.raw_data = [buffer[start:stop] for start, stop in zip(self.class_offsets[:-1], self.class_offsets[1:])]
+
+        return self.raw_data
     
 
+    #*## L O A D  C L A S S ###############################################
+    def load_class(self, k, rows=None):
+        '''
+            Loads one class (or some of its rows) without loading the others.
+
+            If `load_data` was already called the rows come from memory; otherwise
+            only the file of class `k` is read, through its row index (see `row_index`).
+
+            Parameters
+            ----------
+            k : int
+                Class index, i.e. position in `data_paths`.
+            rows : int, slice or array-like of int, optional
+                Rows to read. Default is the whole class.
+
+            Returns
+            -------
+            ndarray     :   shape (n_rows, *row_shape)
+        '''
+
+        if self._raw_data is not None:
+            class_data = self.raw_data[self._check_class(k)]
+            return class_data if rows is None else class_data[rows]
+
+        if rows is None:
+            settings = self._load_settings
+            return load_array_from_file(self.data_paths[self._check_class(k)], type=self.file_type, **settings)
+
+        return read_array_rows(self._class_index(k), rows, self._load_settings['delimiter'])
+
+
+    def sample(self, k, n, seed=None):
+        '''
+            Reads `n` random rows of class `k`, without replacement.
+
+            Parameters
+            ----------
+            k : int
+                Class index.
+            n : int
+                Number of rows (at most the rows of the class).
+            seed : int, optional
+                Seed of the row selection.
+
+            Returns
+            -------
+            ndarray     :   shape (n, *row_shape), rows in file order
+        '''
+
+        n_rows = self._class_index(k)['n_rows']
+        rows = np.sort(np.random.default_rng(seed).choice(n_rows, size=n, replace=False))
+
+        return self.load_class(k, rows)
+
+
+    def example(self, k, i=0):
+        '''
+            Reads row `i` of class `k`.
+        '''
+
+        return self.load_class(k, i)
+
+
+    def _check_class(self, k):
+        '''
+            ### Private function — do not use!
+        '''
+
+        if not 0 <= k < len(self.data_paths):
+            raise ValueError(f'invalid class {k}: there are {len(self.data_paths)} classes')
+        return k
+
+
+    def _class_index(self, k):
+        '''
+            ### Private function — do not use!
+            row index of the file of class `k`, built once
+        '''
+
+        if self._raw_data is not None:
+            class_data = self.raw_data[self._check_class(k)]
+            return {'n_rows': len(class_data)}
+
+        if k not in self._row_indices:
+            settings = self._load_settings
+            self._row_indices[k] = row_index(self.data_paths[self._check_class(k)], self.file_type, settings['dtype'],
+                                             settings['row_shape'], settings['delimiter'])
+
+        return self._row_indices[k]
+
+
     #*##  D A T A  P R O C E S S I N G ####################################
-    def data_processing(self, split_index, data_shape):
+    def data_processing(self, split_index, data_shape=None, window=None, hop=None, padding='drop', cache_dir=None,
+                        n_workers=None, one_hot=False):
         '''
             Splitta, crea etichette e normalizza il dataset.
 
@@ -115,72 +302,477 @@ class DatasetManager():
             data_shape  :   tuple
                 the shape of the final data
 
+            window      :   int, optional
+                Lunghezza delle finestre. Se dato, ogni classe di ogni sottoinsieme
+                viene segmentata con `sliding_windows` invece che con un reshape.
+
+            hop         :   int, optional
+                Passo tra due finestre (default = `window`, nessuna sovrapposizione).
+
+            padding     :   {'drop', 'pad', 'strict'}, optional (default='drop')
+                Gestione dell'ultima finestra incompleta, vedi `sliding_windows`.
+
+            cache_dir   :   str, optional
+                Cartella della cache dei dati processati (`ProcessedCache`). La chiave
+                e' un hash di dimensione e mtime dei file, delle impostazioni di
+                caricamento e di processing, della normalizzazione e della versione
+                di pyes. Se l'entry esiste gli array vengono mappati da disco e
+                `load_data` non serve; altrimenti il risultato viene salvato. Se la
+                normalizzazione non ha una descrizione deterministica (es. un oggetto
+                callable) la cache viene saltata con un `RuntimeWarning`.
+
+            n_workers   :   int, optional
+                Numero di processi: dati grezzi e risultati passano per file `.npy`
+                mappati in memoria (in /dev/shm se disponibile), quindi niente viene
+                serializzato. Con la normalizzazione 'std' il lavoro e' diviso in
+                blocchi di righe di ogni classe: i processi calcolano i momenti
+                parziali dei loro blocchi, uniti per sottoinsieme, poi normalizzano
+                i blocchi e ne scrivono finestre o valori al loro posto. Una funzione
+                di normalizzazione ha bisogno del sottoinsieme intero: ogni
+                sottoinsieme (train/val/test) va a un solo processo. La funzione deve essere serializzabile (niente
+                lambda) e non deve cambiare la forma dei dati. Il risultato e' lo
+                stesso del percorso seriale (con 'std' a meno di arrotondamenti).
+
+            one_hot     :   bool, optional (default=False)
+                Restituisce le etichette come matrici one-hot float32 (n, n_classi).
+                Di default sono indici di classe interi (`build_label`): uint8 fino a
+                256 classi, un byte per campione invece di n_classi float; il one-hot
+                si fa per batch con `batches(one_hot=True)` o `to_tf_dataset(one_hot=True)`.
+
             Returns
             -------
-            None
+            all_data, all_labels : list of ndarray
 
             Notes
             -----
             - Usa `splitter` per suddividere `raw_data`.
             - `label_build` genera etichette.
             - Applica la normalizzazione a ciascun sottoinsieme.
+            - Con `window` le finestre sono viste dei dati normalizzati: l'unica copia
+              e' quella finale in float32, la stessa del percorso con reshape.
         '''
 
-        splitted_data = splitter(self.raw_data, split_index)
-
-        all_data = list(np.concatenate(vector) for vector in zip(*splitted_data))
+        if cache_dir is None:
+            return self._process_data(split_index, data_shape, window, hop, padding, n_workers, one_hot)
 
-        labels = self.build_label(split_index)
+        try:
+            key, config = dataset_fingerprint(self.data_paths, self.normalization_function, file_type=self.file_type,
+                                              split_index=split_index, data_shape=data_shape, window=window, hop=hop,
+                                              padding=padding, one_hot=one_hot, **self._load_settings)
+        except TypeError as error:
+            warnings.warn(f'processed cache skipped: {error}', RuntimeWarning, stacklevel=2)
+            return self._process_data(split_index, data_shape, window, hop, padding, n_workers, one_hot)
 
-        all_labels = list(np.concatenate(label_vector) for label_vector in zip(*labels))
+        cache = ProcessedCache(cache_dir)
 
-        for i in range(len(all_data)):
-            all_data[i] = self.normalize(all_data[i])
-            all_data[i]= np.reshape(all_data[i], data_shape).astype('float32')
+        with self.instrumentation.stage('cache.load'):
+            cached = cache.load(key)
+        if cached is not None:
+            return cached
 
-        for i in range(len(all_labels)):
-            all_labels[i] = keras.utils.to_categorical(all_labels[i], self.labels)
+        if self._raw_data is None:
+            self.load_data(**self._load_settings)
 
+        all_data, all_labels = self._process_data(split_index, data_shape, window, hop, padding, n_workers, one_hot)
+        with self.instrumentation.stage('cache.save', sum(data.nbytes for data in all_data)):
+            cache.save(key, all_data, all_labels, config)
 
         return all_data, all_labels
 
 
+    #*## I N C R E M E N T A L  U P D A T E ##############################
+    def update(self, store_dir, split_index, data_shape=None, window=None, hop=None, padding='drop', one_hot=False):
+        '''
+            Incremental `data_processing`: only new or changed files are read.
+
+            Ogni file di `data_paths` viene registrato in `store_dir` (`IncrementalStore`)
+            con dimensione, mtime e hash del contenuto, insieme alle sue parti
+            train/val/test non normalizzate e ai loro momenti. A ogni chiamata
+            vengono letti e splittati solo i file nuovi o modificati; le parti delle
+            altre classi sono mappate da disco. Se nulla e' cambiato gli array
+            salvati vengono restituiti direttamente.
+
+            Altrimenti gli output sono ricostruiti per intero: normalizzazione,
+            finestre ed etichette vengono ricalcolate per tutte le classi, perche'
+            la normalizzazione di un sottoinsieme dipende da tutte le sue classi.
+            Il risultato e' quindi identico a `data_processing` con gli stessi
+            parametri; si risparmia solo la lettura dei file non cambiati.
+
+            Parameters
+            ----------
+            store_dir : str
+                Cartella dello stato incrementale.
+            split_index, data_shape, window, hop, padding, one_hot
+                Vedi `data_processing`. Se cambiano (o cambia la normalizzazione)
+                lo stato viene ricostruito da zero.
+
+            Returns
+            -------
+            all_data, all_labels : list of ndarray
+                Array mappati da `store_dir`.
+
+            Notes
+            -----
+            `feature_stats` riceve media e deviazione standard per feature dei dati
+            grezzi di ogni sottoinsieme, unite dai momenti salvati dei singoli file
+            (senza rileggerli). Non sono i parametri della normalizzazione applicata.
+        '''
+
+        store = IncrementalStore(store_dir)
+        try:
+            settings_key, _ = dataset_fingerprint([], self.normalization_function, file_type=self.file_type,
+                                                  split_index=split_index, data_shape=data_shape, window=window,
+                                                  hop=hop, padding=padding, one_hot=one_hot, **self._load_settings)
+        except TypeError as error:
+            # -- the settings cannot be compared with the stored ones: everything is ingested again --
+            warnings.warn(f'incremental state rebuilt: {error}', RuntimeWarning, stacklevel=2)
+            settings_key = None
+        if settings_key is None or store.state['settings_key'] != settings_key:
+            store.reset(settings_key)
+
+        removed = store.forget(self.data_paths)
+        changed = [path for path in self.data_paths if store.is_changed(path)]
+        order = [os.path.abspath(path) for path in self.data_paths]
+
+        outputs = store.load_outputs()
+        if outputs is not None and not changed and not removed and store.state['order'] == order:
+            if store.dirty:                 # refreshed mtimes of touched, unchanged files
+                store.commit()
+            self.feature_stats = store.statistics(self.data_paths)
+            return outputs
+
+        settings = self._load_settings
+        for path in changed:
+            with self.instrumentation.stage('update.ingest', os.path.getsize(path)):
+                class_data = load_array_from_file(path, type=self.file_type, **settings)
+                store.save_parts(path, splitter([class_data], split_index)[0])
+
+        splitted_data = [store.load_parts(path) for path in self.data_paths]
+        all_data, all_labels = self._process_splits(splitted_data, split_index, data_shape, window, hop, padding,
+                                                    one_hot=one_hot)
+
+        self.feature_stats = store.statistics(self.data_paths)
+        return store.save_outputs(self.data_paths, all_data, all_labels)
+
+
+    def _process_data(self, split_index, data_shape=None, window=None, hop=None, padding='drop', n_workers=None,
+                      one_hot=False):
+        '''
+            ### Private function — do not use!
+            the processing of `data_processing`, without cache
+        '''
+
+        with self.instrumentation.stage('splitter'):
+            splitted_data = splitter(self.raw_data, split_index)
+
+        result = self._process_splits(splitted_data, split_index, data_shape, window, hop, padding, n_workers, one_hot)
+        if self.memory_budget is not None:
+            del splitted_data
+            self._release_raw()
+
+        return result
+
+
+    def _release_raw(self):
+        '''
+            ### Private function — do not use!
+            drops the raw data (memory-limit mode): `load_class` reads them from the files again
+        '''
+
+        self._raw_data = None
+        self.memory_budget.untrack(self._raw_nbytes)
+        self._raw_nbytes = 0
+
+
+    def _process_splits(self, splitted_data, split_index, data_shape=None, window=None, hop=None, padding='drop',
+                        n_workers=None, one_hot=False):
+        '''
+            ### Private function — do not use!
+            labels, normalization and reshape/windows of the split parts of every class
+        '''
+
+        stage = self.instrumentation.stage
+        budget = self.memory_budget
+        out, scratch = (None, None) if budget is None else (budget.allocate, partial(budget.allocate, temporary=True))
+
+        if window is not None:
+            if n_workers is not None and n_workers > 1:
+                all_data, all_labels = self._parallel_subsets(splitted_data, split_index, n_workers,
+                                                              window=window, hop=hop, padding=padding)
+            else:
+                all_data, all_labels = [], []
+                for subset in zip(*splitted_data):
+                    with stage('windows', sum(data.nbytes for data in subset)):
+                        data, labels = _workers.subset_windows(subset, self.normalize, window, hop, padding,
+                                                               out=out, scratch=scratch)
+                    if budget is not None:
+                        budget.release()
+                    all_data.append(data)
+                    all_labels.append(labels)
+            if data_shape is not None:
+                all_data = [np.reshape(data, data_shape) for data in all_data]
+
+            dtype = label_dtype(len(self.data_paths))
+            return all_data, self._encode_labels([labels.astype(dtype, copy=False) for labels in all_labels], one_hot)
+
+        if n_workers is not None and n_workers > 1:
+            all_data, _ = self._parallel_subsets(splitted_data, split_index, n_workers, data_shape=data_shape)
+        else:
+            all_data = []
+            for subset in zip(*splitted_data):
+                with stage('subset_reshape', sum(data.nbytes for data in subset)):
+                    all_data.append(_workers.subset_reshape(subset, self.normalize, data_shape, out=out, scratch=scratch))
+                if budget is not None:
+                    budget.release()
+
+        with stage('build_label'):
+            all_labels = []
+            for subset, data in zip(zip(*splitted_data), all_data):
+                # -- samples of every class: the class parts must fill whole samples --
+                sample_size = int(np.prod(data.shape[1:]))
+                counts = [part.size // sample_size for part in subset]
+                if sum(counts) != len(data) or any(part.size % sample_size for part in subset):
+                    raise ValueError(f'the rows of every class must fill whole samples of shape {data.shape[1:]}')
+                all_labels.append(self.build_label(counts))
+
+        return all_data, self._encode_labels(all_labels, one_hot)
+
+
+    def _encode_labels(self, all_labels, one_hot=False):
+        '''
+            ### Private function — do not use!
+            compact integer labels, or their dense float32 one-hot encoding if `one_hot`
+        '''
+
+        if not one_hot:
+            return all_labels
+
+        with self.instrumentation.stage('one_hot'):
+            return [encode_one_hot(labels, len(self.data_paths)) for labels in all_labels]
+
+
+    def _parallel_subsets(self, splitted_data, split_index, n_workers, data_shape=None, window=None, hop=None,
+                          padding='drop'):
+        '''
+            ### Private function — do not use!
+
+            Processes the subsets on a process pool. The raw data are copied once
+            into a shared `.npy` file; the outputs are preallocated shared `.npy`
+            files that the workers fill in place and that are returned as memmaps.
+            The files are unlinked at the end: the mappings stay valid until the
+            arrays are released.
+
+            With the 'std' normalization the work is split in chunks of rows of
+            every class: the workers first compute the partial moments of their
+            chunk, merged per subset, then normalize their chunk and write its
+            windows (or values) at its place in the output. Any other normalization
+            function needs a whole subset, so each subset goes to one process.
+
+            Returns
+            -------
+            all_data, all_labels : list of ndarray
+                Labels are only computed for windows (None otherwise).
+        '''
+
+        nbytes = sum(part.nbytes for parts in splitted_data for part in parts)
+        # shared raw copy + outputs of about the same size: on disk if they do not fit in the budget
+        directory = _workers.shared_dir(in_memory=self.memory_budget is None or self.memory_budget.fits(2 * nbytes))
+
+        try:
+            # -- raw data, shared once (classes one after another) --
+            raw_data = self.raw_data
+            class_offsets = np.concatenate(([0], np.cumsum([len(data) for data in raw_data]))).astype(np.int64)
+
+            row_shape = splitted_data[0][0].shape[1:]
+            raw = f'{directory}/raw.npy'
+            shared = np.lib.format.open_memmap(raw, mode='w+', dtype=raw_data[0].dtype,
+                                               shape=(int(class_offsets[-1]),) + row_shape)
+            for data, start, stop in zip(raw_data, class_offsets[:-1], class_offsets[1:]):
+                shared[start:stop] = data
+            shared.flush()
+            del shared
+
+            # -- preallocated outputs, same order as the serial path --
+            outputs, all_labels = [], []
+            for number, subset in enumerate(zip(*splitted_data)):
+                if window is not None:
+                    counts = [_workers.window_count(len(data), window, hop, padding) for data in subset]
+                    all_labels.append(np.repeat(np.arange(len(subset)), counts))
+                    out_shape = (sum(counts), window) + row_shape
+                else:
+                    n_values = sum(len(data) for data in subset) * int(np.prod(row_shape))
+                    out_shape = np.broadcast_to(np.float32(0), (n_values,)).reshape(data_shape).shape
+
+                outputs.append(f'{directory}/subset_{number}.npy')
+                np.lib.format.open_memmap(outputs[-1], mode='w+', dtype=np.float32, shape=out_shape).flush()
+
+            with self.instrumentation.stage('parallel_subsets', nbytes):
+                with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                    if isinstance(self.normalization_function, str):
+                        self._normalizer()          # validates the name
+                        self._parallel_chunks(pool, splitted_data, class_offsets, raw, outputs, n_workers,
+                                              window, hop, padding)
+                    else:
+                        tasks = [{'raw': raw, 'class_offsets': class_offsets, 'split_index': split_index,
+                                  'subset': number, 'normalize': self.normalization_function, 'window': window,
+                                  'hop': hop, 'padding': padding, 'data_shape': data_shape, 'out': out}
+                                 for number, out in enumerate(outputs)]
+                        list(pool.map(_workers.process_subset, tasks))
+
+            all_data = [np.load(out, mmap_mode='r+') for out in outputs]
+
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        return all_data, all_labels or None
+
+
+    def _parallel_chunks(self, pool, splitted_data, class_offsets, raw, outputs, n_workers, window=None, hop=None,
+                         padding='drop'):
+        '''
+            ### Private function — do not use!
+            the 'std' processing of `_parallel_subsets`, by chunks of rows of every class
+        '''
+
+        hop = window if hop is None else hop
+        total_rows = sum(len(part) for parts in splitted_data for part in parts)
+        chunk_rows = max(1, -(-total_rows // (n_workers * _CHUNKS_PER_WORKER)))
+        if window is not None:
+            chunk_windows = max(1, -(-chunk_rows // hop))
+
+        # -- rows of every class part in the raw file: the parts of a class follow each other --
+        part_starts = [np.concatenate(([start], start + np.cumsum([len(part) for part in parts[:-1]])))
+                       for start, parts in zip(class_offsets[:-1], splitted_data)]
+
+        # -- first pass: partial moments, merged per subset --
+        moment_tasks, owners = [], []
+        for number, subset in enumerate(zip(*splitted_data)):
+            for part, starts in zip(subset, part_starts):
+                first = int(starts[number])
+                for start in range(0, len(part), chunk_rows):
+                    moment_tasks.append({'stage': 'moments', 'raw': raw,
+                                         'rows': (first + start, first + min(start + chunk_rows, len(part)))})
+                    owners.append(number)
+
+        moments = list(pool.map(_workers.process_chunk, moment_tasks))
+        scales = [_workers.mean_std(_merge_moments(part for owner, part in zip(owners, moments) if owner == number))
+                  for number in range(len(outputs))]
+
+        # -- second pass: normalized chunks written in place --
+        write_tasks = []
+        for number, (subset, out) in enumerate(zip(zip(*splitted_data), outputs)):
+            offset = 0
+            for part, starts in zip(subset, part_starts):
+                first = int(starts[number])
+                task = {'stage': 'write', 'raw': raw, 'scale': scales[number], 'out': out, 'window': window,
+                        'hop': hop, 'padding': padding}
+
+                if window is None:
+                    row_values = int(np.prod(part.shape[1:]))
+                    for start in range(0, len(part), chunk_rows):
+                        stop = min(start + chunk_rows, len(part))
+                        write_tasks.append(dict(task, rows=(first + start, first + stop),
+                                                offset=offset + start * row_values))
+                    offset += part.size
+                    continue
+
+                # chunks of whole windows; only the last one may be padded
+                n_windows = _workers.window_count(len(part), window, hop, padding)
+                for start in range(0, n_windows, chunk_windows):
+                    stop = min(start + chunk_windows, n_windows)
+                    last = stop == n_windows
+                    rows = (first + start * hop, first + (len(part) if last else (stop - 1) * hop + window))
+                    write_tasks.append(dict(task, rows=rows, offset=offset + start,
+                                            padding=padding if last else 'drop'))
+                offset += n_windows
+
+        list(pool.map(_workers.process_chunk, write_tasks))
+
+
     #*## B U I L D  L A B E L #############################################
-    def build_label(self, dimensions):
+    def build_label(self, counts):
         '''
-            Costruisce gli array di etichette per ciascuna classe.
+            Costruisce le etichette di un sottoinsieme, una classe dopo l'altra.
 
             Parameters
             ----------
-            dimensions : int
-                Numero di campioni per classe o dimensione del vettore etichetta.
+            counts : int or list of int
+                Numero di campioni per classe (un intero: uguale per tutte le classi).
 
             Returns
             -------
-            label_list : list of ndarray
-                Lista di array di interi, ciascuno contenente le etichette per una classe.
+            labels : ndarray, shape (sum(counts),)
+                Indici di classe nel tipo intero piu' piccolo possibile (`label_dtype`):
+                uint8 fino a 256 classi. Per il one-hot vedi `labels.one_hot`, o
+                `one_hot=True` di `batches` e `to_tf_dataset`.
         '''
 
-        label_list = []
-        for label in range(len(self.data_paths)):
+        n_classes = len(self.data_paths)
+        if np.ndim(counts) == 0:
+            counts = [counts] * n_classes
 
-            label_vector = value_to_vector(label, dimensions)
-            label_list.append(label_vector)
-        
-        return label_list
+        return class_labels(counts, n_classes)
 
 
     #*## C O N V E R S I O N  T O  T F  D A T A S E T #####################
-    def to_tf_dataset(self, input_data, buffer_size=50, batch_size=20):
+    def to_tf_dataset(self, input_data=None, buffer_size=None, batch_size=20, source='tensors', map_fn=None,
+                      numpy_map=False, cache=None, shuffle=True, drop_remainder=False, prefetch=True,
+                      cycle_length=None, delimiter=',', seed=None, sampler=None, augment=None, one_hot=False):
         '''
             build the dataset for specific data
 
             Input:
                     input_data:     the data for the dataset
-                    array-like 
+                    array-like, tuple (data, labels) or callable (source='generator')
+
+                    buffer_size:    shuffle buffer, in samples
+                    int, default: every sample for 'numpy', 10000 otherwise
+
+                    batch_size:     samples per batch
+                    int
+
+                    source:         where the samples come from
+                    - 'tensors':    `from_tensor_slices`, the arrays are copied into the graph
+                    - 'numpy':      in-memory or memmapped arrays; shuffled index batches are
+                                    gathered with a parallel map, nothing is copied into the graph
+                    - 'generator':  `input_data()` returns an iterator of samples or (sample, label)
+                    - 'files':      one file per class from `data_paths` (text, .npy or raw), read
+                                    in parallel and interleaved; labels are integer class indices.
+                                    'binary' (dill) files raise a ValueError
+
+                    map_fn:         batch transformation (e.g. normalization), applied with
+                                    `num_parallel_calls=AUTOTUNE` on the data of every batch
+                    callable
+
+                    numpy_map:      wrap `map_fn` in `tf.numpy_function` (for NumPy functions
+                                    such as `self.normalize`)
+                    bool
+
+                    cache:          cache the samples before shuffling: True in memory, str on
+                                    disk at that path. Not used with source='numpy'.
+
+                    shuffle, drop_remainder, prefetch:      bool
+                    cycle_length:   files read in parallel by source='files' (default: all)
+                    delimiter:      value separator of text files
+                    seed:           shuffle seed
+
+                    sampler:        `WeightedSampler` drawing the sample indices of every
+                                    epoch (class-balanced or weighted, with replacement);
+                                    the samples are gathered from the arrays as with
+                                    source='numpy' and `shuffle` is not used
+                    WeightedSampler
+
+                    augment:        `BatchAugmenter` applied to every batch, before `map_fn`
+                                    (sequentially, its buffers are reused)
+                    BatchAugmenter
+
+                    one_hot:        one-hot encode the integer labels of every batch
+                                    (`tf.one_hot`, float32), before `augment`; without it the
+                                    labels stay integers, for a sparse categorical loss
+                    bool
 
             Ouput:
-                    dataset:        completed dateset
+                    dataset:        completed dateset, also stored in `dataset`
                     tf.Dataset
 
             Note:
@@ -188,22 +780,334 @@ class DatasetManager():
             - *labels must be already normalized*
         '''
 
+        if sampler is not None:
+            if source not in ('tensors', 'numpy'):
+                raise ValueError("a sampler needs source='tensors' or 'numpy'")
+            source, shuffle = 'numpy', False
+            dataset = tf.data.Dataset.from_generator(lambda: iter(sampler), output_signature=tf.TensorSpec((), tf.int64))
+        elif source == 'tensors':
+            dataset = self._tensor_source(input_data, tf.data.Dataset.from_tensor_slices)
+        elif source == 'numpy':
+            dataset = self._tensor_source(input_data, tf.data.Dataset.range)
+        elif source == 'generator':
+            dataset = self._generator_source(input_data)
+        elif source == 'files':
+            dataset = self._files_source(cycle_length, delimiter)
+        else:
+            raise ValueError("Invalid source. Choose 'tensors', 'numpy', 'generator' or 'files'.")
+
+        if cache and source != 'numpy':
+            dataset = dataset.cache() if cache is True else dataset.cache(cache)
+
+        if shuffle:
+            if buffer_size is None:
+                buffer_size = len(self._numpy_arrays(input_data)[0]) if source == 'numpy' else 10000
+            dataset = dataset.shuffle(buffer_size=buffer_size, seed=seed, reshuffle_each_iteration=True)
+
+        dataset = dataset.batch(batch_size, drop_remainder=drop_remainder)
+
+        if source == 'numpy':
+            dataset = dataset.map(self._numpy_gather(input_data), num_parallel_calls=tf.data.AUTOTUNE)
+
+        if one_hot:
+            n_classes = len(self.data_paths)
+            dataset = dataset.map(lambda data, labels: (data, tf.one_hot(tf.cast(labels, tf.int32), n_classes)),
+                                  num_parallel_calls=tf.data.AUTOTUNE)
+
+        if augment is not None:
+            dataset = dataset.map(augment.tf_map())
+
+        if map_fn is not None:
+            dataset = dataset.map(self._batch_map(map_fn, numpy_map), num_parallel_calls=tf.data.AUTOTUNE)
+
+        if prefetch:
+            dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
+        self._dataset = dataset
+        return dataset
+
+
+    def _tensor_source(self, input_data, factory):
+        '''
+            ### Private function — do not use!
+
+            `from_tensor_slices` of the data (and labels), or `Dataset.range` over
+            their indices when the factory is `Dataset.range`.
+        '''
+
+        arrays = self._numpy_arrays(input_data)
+        if factory is tf.data.Dataset.range:
+            return tf.data.Dataset.range(len(arrays[0]))
+
+        return factory(arrays[0] if len(arrays) == 1 else tuple(arrays))
+
+
+    def _numpy_arrays(self, input_data):
+        '''
+            ### Private function — do not use!
+            (data,) or (data, labels) from the `input_data` argument
+        '''
+
         if type(input_data) != tuple:
-            dataset = tf.data.Dataset.from_tensor_slices((input_data))
+            return (input_data,)
+
+        if len(input_data) != 2: raise ValueError('expected 2 values but ', len(input_data), ' where given')
+        return input_data
+
+
+    def _numpy_gather(self, input_data):
+        '''
+            ### Private function — do not use!
+
+            Map function turning a batch of indices into the batch of samples,
+            gathered from the NumPy arrays (memmaps included) outside the graph.
+        '''
+
+        arrays = self._numpy_arrays(input_data)
+        dtypes = [tf.as_dtype(array.dtype) for array in arrays]
+
+        def gather(indices):
+            indices = np.sort(indices)      # sequential reads from memmaps
+            return tuple(np.take(array, indices, axis=0) for array in arrays)
+
+        def fetch(indices):
+            batch = tf.numpy_function(gather, [indices], dtypes)
+            for tensor, array in zip(batch, arrays):
+                tensor.set_shape((None,) + array.shape[1:])
+            return batch[0] if len(batch) == 1 else tuple(batch)
+
+        return fetch
+
+
+    def _generator_source(self, input_data):
+        '''
+            ### Private function — do not use!
+
+            `from_generator` over the callable `input_data`; the output signature
+            is read from its first sample.
+        '''
+
+        if not callable(input_data):
+            raise ValueError("source='generator' needs a callable returning an iterator")
+
+        first = next(iter(input_data()))
+        signature = tf.nest.map_structure(
+            lambda value: tf.TensorSpec(shape=np.shape(value), dtype=tf.as_dtype(np.asarray(value).dtype)), first)
+
+        return tf.data.Dataset.from_generator(input_data, output_signature=signature)
+
+
+    def _files_source(self, cycle_length=None, delimiter=','):
+        '''
+            ### Private function — do not use!
+
+            Reads the per-class files in parallel with `interleave`, one label per file.
+            Text files are parsed with `TextLineDataset`, .npy and raw files are
+            memory-mapped (raw files with the dtype and row shape of `load_data`).
+
+            Raises
+            ------
+            ValueError
+                For 'binary' (dill) files, which cannot be read row by row, or a mix of types.
+        '''
+
+        n_classes = len(self.data_paths)
+        types = {_array_type(path, self.file_type) for path in self.data_paths}
+        if 'binary' in types:
+            raise ValueError("source='files' cannot stream 'binary' (dill) files: use load_data and source='numpy'")
+        if len(types) > 1:
+            raise ValueError(f"source='files' needs files of one type, found {sorted(types)}")
+        file_type = types.pop()
+
+        settings = self._load_settings
+        _, row_shape = array_file_info(self.data_paths[0], file_type, settings['dtype'], settings['row_shape'], delimiter)
+
+        if file_type in ('npy', 'raw'):
+            if file_type == 'npy':
+                dtype = np.load(self.data_paths[0], mmap_mode='r').dtype
+                def load(path):
+                    return np.load(path, mmap_mode='r')
+            else:
+                dtype = np.dtype(settings['dtype'])
+                def load(path):
+                    return np.memmap(path, dtype=dtype, mode='r').reshape((-1,) + row_shape)
+
+            def read_rows(path):
+                yield from load(path.decode())
+
+            def open_file(path, label):
+                rows = tf.data.Dataset.from_generator(
+                    read_rows, args=(path,), output_signature=tf.TensorSpec(row_shape, tf.as_dtype(dtype)))
+                return rows.map(lambda row: (row, label))
         else:
-            if len(input_data) != 2: raise ValueError('expected 2 values but ', len(input_data), ' where given')
-            data, labels = input_data
-            dataset = tf.data.Dataset.from_tensor_slices((data, labels))
-        
-        self._dataset = dataset.shuffle(buffer_size=buffer_size).batch(batch_size)
+            def parse(line, label):
+                values = tf.strings.to_number(tf.strings.split(tf.strings.strip(line), delimiter), out_type=tf.float32)
+                return tf.reshape(values, row_shape), label
+
+            def open_file(path, label):
+                lines = tf.data.TextLineDataset(path).filter(lambda line: tf.strings.length(tf.strings.strip(line)) > 0)
+                return lines.map(lambda line: parse(line, label))
+
+        files = tf.data.Dataset.from_tensor_slices((self.data_paths, np.arange(n_classes, dtype=label_dtype(n_classes))))
+        return files.interleave(open_file, cycle_length=cycle_length or n_classes, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+    def _batch_map(self, map_fn, numpy_map=False):
+        '''
+            ### Private function — do not use!
+            applies `map_fn` to the data part of a batch
+        '''
+
+        def apply(data):
+            if not numpy_map:
+                return map_fn(data)
+            mapped = tf.numpy_function(lambda batch: np.asarray(map_fn(batch), dtype=batch.dtype), [data], data.dtype)
+            mapped.set_shape(data.shape)
+            return mapped
+
+        def batch_map(*batch):
+            if len(batch) == 1:
+                return apply(batch[0])
+            return (apply(batch[0]),) + batch[1:]
+
+        return batch_map
+
+
+    #*## N U M P Y  B A T C H E S ########################################
+    def batches(self, input_data, batch_size=32, shuffle=True, seed=None, drop_last=False, prefetch=2, sampler=None,
+                augment=None, one_hot=False):
+        '''
+            Framework-agnostic alternative to `to_tf_dataset`.
+
+            Parameters
+            ----------
+            input_data : ndarray or tuple (data, labels)
+                E.g. one of the subsets returned by `data_processing`.
+            batch_size, shuffle, seed, drop_last, prefetch, sampler, augment
+                See `BatchIterator`.
+            one_hot : bool, optional (default=False)
+                One-hot encode the integer labels of every batch (float32).
+
+            Returns
+            -------
+            BatchIterator   :   iterable over the batches of one epoch, reusable for every epoch
+        '''
+
+        data, labels = input_data if type(input_data) == tuple else (input_data, None)
+        return BatchIterator(data, labels, batch_size=batch_size, shuffle=shuffle, seed=seed,
+                             drop_last=drop_last, prefetch=prefetch, sampler=sampler,
+                             augment=augment, one_hot=len(self.data_paths) if one_hot else None)
+
+
+    #*## S H A R D S ######################################################
+    def export_shards(self, input_data, out_dir, shard_size=65536, prefix='shard'):
+        '''
+            Writes one processed subset as memory-mappable shards, see `export_shards`.
+
+            Parameters
+            ----------
+            input_data : tuple (data, labels)
+                E.g. one of the subsets returned by `data_processing`.
+            out_dir : str
+                Output directory, read back with `ShardReader`.
+            shard_size, prefix
+                See `export_shards`.
+
+            Returns
+            -------
+            dict    :   the manifest
+        '''
+
+        data, labels = input_data
+        return export_shards(data, labels, out_dir, shard_size=shard_size, prefix=prefix)
+
+
+    #*## S H A R E D  M E M O R Y #########################################
+    def publish_shared(self, input_data, name=None):
+        '''
+            Publishes the processed dataset once in shared memory, see `SharedDataset`.
+
+            Parameters
+            ----------
+            input_data : tuple (all_data, all_labels)
+                The result of `data_processing` (or `update`).
+            name : str, optional
+                Segment name.
+
+            Returns
+            -------
+            SharedDataset
+                Its `handle` is what the workers need: `SharedDataset.attach(handle)`
+                gives them read-only views of the same memory, without a
+                `DatasetManager` and without loading anything.
+        '''
+
+        all_data, all_labels = input_data
+        return SharedDataset.publish(all_data, all_labels, name=name)
 
 
     #*## N O R M A L I Z E ################################################
     def normalize(self, data_to_normalize):
         '''
             #TODO: test
+
+            Con `memory_limit` il risultato e' contato come temporaneo (vedi
+            `memory_report`). Con 'std' e' allocato dal budget prima del calcolo
+            (su file se non ci sta) e scritto a blocchi di righe: in RAM non c'e'
+            altra copia intera. Il risultato di una funzione di normalizzazione
+            che non entra nel budget e' copiato subito in un file e la copia in
+            RAM e' rilasciata; la memoria che la funzione alloca mentre e' in
+            esecuzione resta fuori dal budget.
         '''
-        return self.normalization_function(data_to_normalize)
+        normalizer = self._normalizer()
+        budget = self.memory_budget
+
+        with self.instrumentation.stage('normalize', np.asarray(data_to_normalize).nbytes):
+            if budget is not None and normalizer is _workers.standardize:
+                return _workers.standardize(data_to_normalize, out=partial(budget.allocate, temporary=True))
+            normalized = normalizer(data_to_normalize)
+
+        if budget is None:
+            return normalized
+
+        owned = isinstance(normalized, np.ndarray) and not isinstance(normalized, np.memmap) and normalized.base is None
+        if owned and not budget.fits(normalized.nbytes):
+            spilled = budget.allocate(normalized.shape, normalized.dtype, temporary=True)
+            spilled[...] = normalized
+            return spilled
+
+        return budget.track(normalized)
+
+
+    def _normalizer(self):
+        '''
+            ### Private function — do not use!
+            the normalization function; 'std' is the zero mean, unit variance of every subset
+        '''
+
+        if not isinstance(self.normalization_function, str):
+            return self.normalization_function
+        if self.normalization_function != 'std':
+            raise ValueError(f"Invalid normalization {self.normalization_function!r}. Choose 'std' or a function.")
+        return _workers.standardize
+
+
+    #*## M E M O R Y ######################################################
+    def memory_report(self):
+        '''
+            Uso della memoria.
+
+            Returns
+            -------
+            dict
+                Con `memory_limit`: limite, byte contati in RAM (attuali e picco),
+                byte e array spostati su file (`MemoryBudget.report`). In ogni caso
+                'rss_peak_bytes', il picco di memoria residente del processo.
+        '''
+
+        if self.memory_budget is None:
+            return {'limit': None, 'rss_peak_bytes': _rss_peak()}
+        return self.memory_budget.report()
 
     #############################################################################################*
     #*# P R O P E R T I E S                                                                     #*
@@ -211,7 +1115,7 @@ class DatasetManager():
 
     @property
     def raw_data(self):
-        if self._raw_data.all() == None:
+        if self._raw_data is None:
             raise AttributeError('No data loaded. Call "load_data()" first. ')
         
         return self._raw_data
@@ -235,7 +1139,7 @@ class DatasetManager():
     
     @property
     def dataset(self):
-        if self._dataset == None:
+        if self._dataset is None:
             raise ValueError('No dataset loaded. Call to_tf_dataset() first.')
         
         return self._dataset
@@ -0,0 +1,256 @@
+import os
+import json
+import shutil
+import hashlib
+
+import numpy as np
+
+from pyes.preprocessing._parallel import _block_moments, _merge_moments
+
+
+
+#*### I N C R E M E N T A L  S T O R E #################################################################################################
+class IncrementalStore():
+
+    """
+        On-disk state of an incrementally updated dataset.
+
+        For every ingested file the store keeps its size, mtime and content hash,
+        its split parts (train/val/test rows, before normalization) as `.npy`
+        files and their per-feature moments. A file is ingested again only if it
+        is new or its content changed; unchanged parts are memory-mapped back.
+
+        Parameters
+        ----------
+        directory : str
+            Store directory; created if missing.
+
+        Attributes
+        ----------
+        state : dict
+            Content of `state.json`: settings key, file order, file records.
+        dirty : bool
+            True if `state` changed since the last `commit` (e.g. refreshed mtimes).
+    """
+
+    STATE = 'state.json'
+
+    def __init__(self, directory):
+
+        self.directory = directory
+        self.dirty = False
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, self.STATE)
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.state = json.load(file)
+        else:
+            self.state = {'settings_key': None, 'order': [], 'files': {}, 'n_subsets': 0}
+
+
+    #*## S E T T I N G S ##################################################
+    def reset(self, settings_key):
+        '''
+            Drops every stored part and output, e.g. when the processing settings change.
+        '''
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif name != self.STATE:
+                os.remove(path)
+
+        self.state = {'settings_key': settings_key, 'order': [], 'files': {}, 'n_subsets': 0}
+
+
+    #*## F I L E S ########################################################
+    def is_changed(self, path):
+        '''
+            True if `path` was never ingested or its content changed.
+
+            Size and mtime are compared first; the content hash is computed only
+            when they differ, so a touched but identical file is not ingested again.
+            Its new mtime is recorded (`dirty` until the next `commit`), so the
+            hash is not computed again on the following runs.
+        '''
+
+        record = self.state['files'].get(os.path.abspath(path))
+        if record is None:
+            return True
+
+        stat = os.stat(path)
+        if record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+            return False
+
+        if record['size'] == stat.st_size and record['hash'] == file_hash(path):
+            record['mtime_ns'] = stat.st_mtime_ns
+            self.dirty = True
+            return False
+
+        return True
+
+
+    def save_parts(self, path, parts):
+        '''
+            Stores the split parts of one file and their moments.
+
+            Parameters
+            ----------
+            path : str
+                Ingested file.
+            parts : sequence of ndarray
+                One array of rows per subset (train/val/test), not normalized.
+        '''
+
+        key = os.path.abspath(path)
+        folder = os.path.join(self.directory, hashlib.blake2b(key.encode(), digest_size=8).hexdigest())
+        os.makedirs(folder, exist_ok=True)
+
+        moments = []
+        for number, part in enumerate(parts):
+            _save(os.path.join(folder, f'part_{number}.npy'), part)
+            count, mean, m2 = _block_moments(np.asarray(part, dtype=np.float64).reshape(len(part), -1), axis=0)
+            moments.append({'count': count, 'mean': np.ravel(mean).tolist(), 'm2': np.ravel(m2).tolist()})
+
+        stat = os.stat(path)
+        self.state['files'][key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': file_hash(path),
+            'folder': os.path.basename(folder),
+            'rows': [len(part) for part in parts],
+            'moments': moments,
+        }
+        self.state['n_subsets'] = len(parts)
+
+
+    def load_parts(self, path):
+        '''
+            Memory-maps the stored parts of one file.
+
+            Returns
+            -------
+            tuple of ndarray    :   one part per subset
+        '''
+
+        record = self.state['files'][os.path.abspath(path)]
+        folder = os.path.join(self.directory, record['folder'])
+        return tuple(np.load(os.path.join(folder, f'part_{number}.npy'), mmap_mode='r')
+                     for number in range(len(record['rows'])))
+
+
+    def forget(self, paths):
+        '''
+            Removes the files that are no longer in `paths`.
+
+            Returns
+            -------
+            list of str     :   the removed files
+        '''
+
+        keep = {os.path.abspath(path) for path in paths}
+        removed = [key for key in self.state['files'] if key not in keep]
+        for key in removed:
+            shutil.rmtree(os.path.join(self.directory, self.state['files'].pop(key)['folder']), ignore_errors=True)
+
+        return removed
+
+
+    def statistics(self, paths):
+        '''
+            Per-feature moments of every subset, merged over the files in `paths`.
+
+            Returns
+            -------
+            list of dict    :   'count', 'mean' and 'std' per subset
+        '''
+
+        statistics = []
+        for number in range(self.state['n_subsets']):
+            parts = []
+            for path in paths:
+                moments = self.state['files'][os.path.abspath(path)]['moments'][number]
+                parts.append((moments['count'], np.array(moments['mean']), np.array(moments['m2'])))
+
+            count, mean, m2 = _merge_moments(parts)
+            std = np.sqrt(m2 / count) if count else m2
+            statistics.append({'count': count, 'mean': mean, 'std': std})
+
+        return statistics
+
+
+    #*## O U T P U T S ####################################################
+    def save_outputs(self, paths, all_data, all_labels):
+        '''
+            Stores the processed arrays and the state; returns them as memmaps.
+        '''
+
+        for number, (data, labels) in enumerate(zip(all_data, all_labels)):
+            _save(os.path.join(self.directory, f'data_{number}.npy'), data)
+            _save(os.path.join(self.directory, f'labels_{number}.npy'), labels)
+
+        self.state['order'] = [os.path.abspath(path) for path in paths]
+        self.state['n_outputs'] = len(all_data)
+        self.commit()
+
+        return self.load_outputs()
+
+
+    def load_outputs(self):
+        '''
+            Memory-maps the stored processed arrays.
+
+            Returns
+            -------
+            all_data, all_labels : list of ndarray, or None if nothing is stored
+        '''
+
+        if 'n_outputs' not in self.state:
+            return None
+
+        all_data, all_labels = [], []
+        for number in range(self.state['n_outputs']):
+            all_data.append(np.load(os.path.join(self.directory, f'data_{number}.npy'), mmap_mode='r'))
+            all_labels.append(np.load(os.path.join(self.directory, f'labels_{number}.npy'), mmap_mode='r'))
+
+        return all_data, all_labels
+
+
+    def commit(self):
+        ''' Writes `state.json` atomically. '''
+
+        staging = os.path.join(self.directory, self.STATE + '.tmp')
+        with open(staging, 'w') as file:
+            json.dump(self.state, file, indent=2)
+        os.replace(staging, os.path.join(self.directory, self.STATE))
+        self.dirty = False
+
+
+
+def _save(path, array):
+    '''
+        ### Private function — do not use!
+
+        Saves a `.npy` file through a temporary file and a rename: arrays
+        memory-mapped from the previous version stay valid.
+    '''
+
+    staging = path + '.tmp'
+    with open(staging, 'wb') as file:
+        np.save(file, array)
+    os.replace(staging, path)
+
+
+def file_hash(path, chunk_bytes=1 << 20):
+    '''
+        BLAKE2 hash of the content of a file, read in chunks.
+    '''
+
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_bytes), b''):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+import tracemalloc
+
+
+
+#*### CONSTANTS #################################################################################################
+ENV_VAR = 'PYES_INSTRUMENT'         # '1' / 'true' / 'rss': on, 'tracemalloc': on with per-stage peaks
+
+
+
+#*### S T A G E  S T A T S #################################################################################################
+class StageStats():
+
+    """
+        Accumulated measures of one stage.
+
+        Attributes
+        ----------
+        name : str
+            Stage name.
+        calls : int
+            Number of runs.
+        seconds : float
+            Total wall time.
+        nbytes : int
+            Total bytes processed (as declared by the stage).
+        peak_bytes : int or None
+            Largest traced allocation peak of a run (memory='tracemalloc' only).
+        rss_peak_bytes : int or None
+            Peak resident set size of the process at the end of the last run.
+    """
+
+    def __init__(self, name):
+
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.
+        self.nbytes = 0
+        self.peak_bytes = None
+        self.rss_peak_bytes = None
+
+
+    @property
+    def throughput(self):
+        ''' processed bytes per second (0 if unknown) '''
+        return self.nbytes / self.seconds if self.seconds > 0 else 0.
+
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'seconds': self.seconds,
+            'nbytes': self.nbytes,
+            'throughput': self.throughput,
+            'peak_bytes': self.peak_bytes,
+            'rss_peak_bytes': self.rss_peak_bytes,
+        }
+
+
+
+#*### R E P O R T #################################################################################################
+class InstrumentationReport():
+
+    """
+        Snapshot of the stages measured by an `Instrumentation`.
+
+        Stages nest (e.g. 'normalize' runs inside 'subset_reshape'): every time
+        is inclusive of the stages called within it.
+
+        Attributes
+        ----------
+        stages : dict of str -> StageStats
+            Measures per stage, in order of first run.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+
+    def __getitem__(self, name):
+        return self.stages[name]
+
+
+    def as_dict(self):
+        return {name: stats.as_dict() for name, stats in self.stages.items()}
+
+
+    def to_json(self, path=None):
+        '''
+            JSON text of the report, also written to `path` if given.
+        '''
+
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as file:
+                file.write(text)
+        return text
+
+
+    def __str__(self):
+
+        lines = [f'{"stage":<24}{"calls":>7}{"seconds":>11}{"MB":>10}{"MB/s":>10}{"peak MB":>10}']
+        for stats in self.stages.values():
+            peak = stats.peak_bytes if stats.peak_bytes is not None else stats.rss_peak_bytes
+            lines.append(f'{stats.name:<24}{stats.calls:>7}{stats.seconds:>11.4f}{stats.nbytes / 2**20:>10.1f}'
+                         f'{stats.throughput / 2**20:>10.1f}{(peak or 0) / 2**20:>10.1f}')
+        return '\n'.join(lines)
+
+
+
+#*### I N S T R U M E N T A T I O N #################################################################################################
+class Instrumentation():
+
+    """
+        Per-stage timing and memory measures, off unless requested.
+
+        Parameters
+        ----------
+        enabled : bool, optional
+            Default is read from the `PYES_INSTRUMENT` environment variable.
+        memory : {'rss', 'tracemalloc', None}, optional
+            - 'rss': peak resident set size of the process after every stage (cheap)
+            - 'tracemalloc': per-stage peak of the Python/NumPy allocations (slower)
+            - None: no memory measure
+            Default is 'tracemalloc' if `PYES_INSTRUMENT=tracemalloc`, else 'rss'.
+        hooks : list of callable, optional
+            Called after every stage run with a dict: name, seconds, nbytes,
+            peak_bytes, rss_peak_bytes. Use them to feed a metrics exporter.
+
+        Examples
+        --------
+        >>> manager = DatasetManager(paths, normalization=to_z_score, instrument=True)
+        >>> manager.load_data(); manager.data_processing([70, 85], (-1, 3840, 1))
+        >>> print(manager.instrumentation.report())
+        >>> manager.instrumentation.add_hook(lambda event: statsd.timing(event['name'], event['seconds']))
+    """
+
+    def __init__(self, enabled=None, memory=None, hooks=None):
+
+        setting = os.environ.get(ENV_VAR, '').strip().lower()
+        if enabled is None:
+            enabled = setting not in ('', '0', 'false', 'off', 'no')
+        if memory is None:
+            memory = 'tracemalloc' if setting == 'tracemalloc' else 'rss'
+        if memory not in ('rss', 'tracemalloc', None):
+            raise ValueError("Invalid memory. Choose 'rss', 'tracemalloc' or None.")
+
+        self.enabled = bool(enabled)
+        self.memory = memory
+        self.hooks = list(hooks or [])
+
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._peaks = threading.local()       # running peaks of the open (nested) stages
+
+
+    def add_hook(self, hook):
+        ''' Registers a callable receiving one dict per stage run. '''
+        self.hooks.append(hook)
+
+
+    def stage(self, name, nbytes=0):
+        '''
+            Context manager measuring one run of a stage.
+
+            Parameters
+            ----------
+            name : str
+                Stage name.
+            nbytes : int, optional
+                Bytes processed by the run, for the throughput.
+
+            Returns
+            -------
+            context manager     :   a no-op when disabled
+        '''
+
+        if not self.enabled:
+            return _NO_STAGE
+        return self._measure(name, nbytes)
+
+
+    @contextlib.contextmanager
+    def _measure(self, name, nbytes):
+        '''
+            ### Private function — do not use!
+        '''
+
+        tracing = self.memory == 'tracemalloc'
+        if tracing:
+            open_peaks = self._peaks.__dict__.setdefault('stack', [])
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            elif open_peaks:
+                open_peaks[-1] = max(open_peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            open_peaks.append(0)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            peak = None
+            if tracing:
+                peak = max(open_peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if open_peaks:
+                    open_peaks[-1] = max(open_peaks[-1], peak)
+                if started_tracing:
+                    tracemalloc.stop()
+            rss = _rss_peak() if self.memory == 'rss' else None
+
+            with self._lock:
+                stats = self._stages.setdefault(name, StageStats(name))
+                stats.calls += 1
+                stats.seconds += seconds
+                stats.nbytes += int(nbytes)
+                if peak is not None:
+                    stats.peak_bytes = max(stats.peak_bytes or 0, peak)
+                if rss is not None:
+                    stats.rss_peak_bytes = rss
+
+            event = {'name': name, 'seconds': seconds, 'nbytes': int(nbytes), 'peak_bytes': peak, 'rss_peak_bytes': rss}
+            for hook in self.hooks:
+                hook(event)
+
+
+    def report(self):
+        '''
+            Returns an `InstrumentationReport` with a copy of the current measures.
+        '''
+
+        with self._lock:
+            stages = {}
+            for name, stats in self._stages.items():
+                copy = StageStats(name)
+                copy.__dict__.update(stats.__dict__)
+                stages[name] = copy
+        return InstrumentationReport(stages)
+
+
+    def reset(self):
+        ''' Drops every measure. '''
+        with self._lock:
+            self._stages.clear()
+
+
+
+def _rss_peak():
+    '''
+        ### Private function — do not use!
+        peak resident set size of the process in bytes, None where unavailable
+    '''
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+_NO_STAGE = contextlib.nullcontext()
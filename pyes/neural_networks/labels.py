@@ -0,0 +1,73 @@
+import numpy as np
+
+
+
+#*### C O M P A C T  L A B E L S #################################################################################################
+def label_dtype(n_classes):
+    '''
+        Smallest unsigned integer dtype holding the class ids 0 ... n_classes - 1.
+
+        >>> label_dtype(10), label_dtype(300), label_dtype(70000)
+        (dtype('uint8'), dtype('uint16'), dtype('uint32'))
+    '''
+
+    return np.min_scalar_type(max(int(n_classes) - 1, 0))
+
+
+def class_labels(counts, n_classes=None):
+    '''
+        Integer labels of consecutive class blocks: `counts[k]` times the class k.
+
+        Parameters
+        ----------
+        counts : sequence of int
+            Samples per class, in class order.
+        n_classes : int, optional
+            Number of classes, for the dtype (default: `len(counts)`).
+
+        Returns
+        -------
+        ndarray, shape (sum(counts),)   :   dtype from `label_dtype`
+    '''
+
+    n_classes = len(counts) if n_classes is None else n_classes
+    return np.repeat(np.arange(len(counts), dtype=label_dtype(n_classes)), counts)
+
+
+
+#*### O N E - H O T #################################################################################################
+def one_hot(labels, n_classes, dtype='float32', out=None):
+    '''
+        One-hot encoding of integer labels with a single scatter, no Python loop.
+
+        Use it per batch: the (n_samples, n_classes) matrix of a whole dataset
+        is often bigger than the data.
+
+        Parameters
+        ----------
+        labels : array-like of int, shape (n,)
+            Class ids.
+        n_classes : int
+            Number of classes (columns).
+        dtype : dtype, optional (default='float32')
+            Dtype of the encoding; unused if `out` is given.
+        out : ndarray, shape (n, n_classes), optional
+            Destination, overwritten.
+
+        Returns
+        -------
+        ndarray, shape (n, n_classes)
+    '''
+
+    labels = np.asarray(labels)
+    if labels.ndim != 1:
+        raise ValueError(f'expected integer labels of shape (n,), got shape {labels.shape}')
+
+    if out is None:
+        out = np.zeros((len(labels), n_classes), dtype=dtype)
+    else:
+        out = out[:len(labels)]
+        out[...] = 0
+
+    out[np.arange(len(labels)), labels] = 1
+    return out
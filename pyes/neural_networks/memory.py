@@ -0,0 +1,194 @@
+import os
+import re
+import tempfile
+import threading
+
+import numpy as np
+
+from pyes.neural_networks.instrumentation import _rss_peak
+
+
+
+#*### CONSTANTS #################################################################################################
+UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+
+
+#*### M E M O R Y  B U D G E T #################################################################################################
+class MemoryBudget():
+
+    """
+        Bookkeeping of the arrays held in RAM, with spill to memory-mapped files.
+
+        Every array requested with `allocate` is created in RAM if it fits in the
+        limit, next to the arrays already counted; otherwise it is a memmap of a
+        temporary `.npy` file in `directory`. The file is unlinked as soon as it
+        is mapped (where the OS allows it), so the disk space is given back when
+        the array is released and nothing is left behind.
+
+        Arrays allocated elsewhere (e.g. by a normalization function) are counted
+        with `track`. Temporary arrays, allocated or tracked with `temporary=True`,
+        are dropped from the count by `release`.
+
+        Parameters
+        ----------
+        limit : int or str
+            Bytes, or a string with a binary unit: '512M', '4GB', '1.5GiB'.
+        directory : str, optional
+            Base directory of the spill files. Default is the system temp dir,
+            on disk: /dev/shm would not save any RAM.
+
+        Attributes
+        ----------
+        limit : int
+            Budget in bytes.
+        in_memory : int
+            Bytes currently counted in RAM.
+        peak : int
+            Largest `in_memory` so far.
+        spilled : int
+            Bytes written to spill files so far.
+    """
+
+    def __init__(self, limit, directory=None):
+
+        self.limit = parse_bytes(limit)
+        self.directory = directory
+        self.in_memory = 0
+        self.peak = 0
+        self.spilled = 0
+        self.spilled_arrays = 0
+
+        self._temporary = 0
+        self._leftovers = []
+        self._lock = threading.Lock()
+
+
+    def fits(self, nbytes):
+        ''' True if `nbytes` more bytes stay within the limit. '''
+        return self.in_memory + int(nbytes) <= self.limit
+
+
+    def allocate(self, shape, dtype, temporary=False):
+        '''
+            Empty array in RAM if it fits in the budget, else a spilled memmap.
+
+            Parameters
+            ----------
+            shape : tuple of int
+            dtype : dtype
+            temporary : bool, optional
+                The array is dropped from the count by the next `release`.
+
+            Returns
+            -------
+            ndarray or np.memmap
+        '''
+
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        with self._lock:
+            if self.fits(nbytes):
+                self._count(nbytes, temporary)
+                return np.empty(shape, dtype=dtype)
+
+            self.spilled += nbytes
+            self.spilled_arrays += 1
+
+        handle, path = tempfile.mkstemp(prefix='pyes-spill-', suffix='.npy', dir=self.directory)
+        os.close(handle)
+        array = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+        try:
+            os.remove(path)
+        except OSError:
+            self._leftovers.append(path)        # e.g. Windows: removed by `close`
+
+        return array
+
+
+    def track(self, array, temporary=True):
+        '''
+            Counts an array allocated elsewhere; memmaps and views cost nothing.
+
+            Returns
+            -------
+            array   :   unchanged
+        '''
+
+        if isinstance(array, np.ndarray) and not isinstance(array, np.memmap) and array.base is None:
+            with self._lock:
+                self._count(array.nbytes, temporary)
+
+        return array
+
+
+    def untrack(self, nbytes):
+        ''' Drops `nbytes` from the count, e.g. after releasing a counted array. '''
+        with self._lock:
+            self.in_memory = max(0, self.in_memory - int(nbytes))
+
+
+    def release(self):
+        ''' Drops the temporary arrays from the count. '''
+        with self._lock:
+            self.in_memory = max(0, self.in_memory - self._temporary)
+            self._temporary = 0
+
+
+    def report(self):
+        '''
+            Memory use so far.
+
+            Returns
+            -------
+            dict    :   limit, in_memory_bytes, peak_bytes (counted), spilled_bytes,
+                        spilled_arrays, rss_peak_bytes (measured, None where unavailable)
+        '''
+
+        return {
+            'limit': self.limit,
+            'in_memory_bytes': self.in_memory,
+            'peak_bytes': self.peak,
+            'spilled_bytes': self.spilled,
+            'spilled_arrays': self.spilled_arrays,
+            'rss_peak_bytes': _rss_peak(),
+        }
+
+
+    def close(self):
+        ''' Removes the spill files that could not be unlinked while mapped. '''
+
+        for path in self._leftovers:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._leftovers = [path for path in self._leftovers if os.path.exists(path)]
+
+
+    def _count(self, nbytes, temporary):
+        '''
+            ### Private function — do not use!
+        '''
+
+        self.in_memory += nbytes
+        self.peak = max(self.peak, self.in_memory)
+        if temporary:
+            self._temporary += nbytes
+
+
+
+def parse_bytes(value):
+    '''
+        Bytes of a size given as a number or a string such as '512M', '4GB' or '1.5GiB'.
+    '''
+
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?)(i?B)?\s*', str(value), flags=re.IGNORECASE)
+    if match is None:
+        raise ValueError(f'Invalid memory size: {value!r}')
+
+    return int(float(match.group(1)) * UNITS[match.group(2).upper()])
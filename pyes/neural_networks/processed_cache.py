@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import shutil
+import types
+import hashlib
+import functools
+
+import numpy as np
+
+import pyes
+
+
+
+#*### F I N G E R P R I N T #################################################################################################
+def dataset_fingerprint(data_paths, normalization=None, **settings):
+    '''
+        Hash identifying a processed dataset.
+
+        Parameters
+        ----------
+        data_paths : list of str
+            Raw input files; their absolute path, size and modification time are hashed.
+        normalization : str or callable, optional
+            Normalization function. Functions are identified by module, qualified
+            name, bytecode, defaults and closure contents; `functools.partial` by
+            its function and arguments. Editing the function or its parameters
+            invalidates the entry.
+        **settings
+            Any other processing setting (split_index, data_shape, dtype ...),
+            hashed through its `repr`.
+
+        Returns
+        -------
+        tuple (str, dict)
+            The hexadecimal key and the JSON-serializable description it was computed from.
+
+        Raises
+        ------
+        TypeError
+            If the normalization has no deterministic description (e.g. an
+            instance of a callable class): it could never be found again.
+    '''
+
+    files = []
+    for path in data_paths:
+        stat = os.stat(path)
+        files.append({'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+
+    config = {
+        'pyes_version': pyes.__version__,
+        'files': files,
+        'normalization': _describe_function(normalization),
+        'settings': {name: repr(value) for name, value in sorted(settings.items())},
+    }
+
+    key = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:32]
+    return key, config
+
+
+def _describe_function(function):
+    '''
+        ### Private function — do not use!
+        stable description of a normalization function or name
+
+        Raises
+        ------
+        TypeError
+            if the function (or a value it depends on) has no deterministic description
+    '''
+
+    if function is None or isinstance(function, str):
+        return function
+
+    return hashlib.sha256(_describe(function, set()).encode()).hexdigest()[:32]
+
+
+def _describe(value, seen):
+    '''
+        ### Private function — do not use!
+
+        Deterministic text of a value for the fingerprint: plain values through
+        their repr, arrays through their bytes, functions through their code,
+        defaults and closure contents, partials through function and arguments,
+        other objects only through a repr of their own class. Nothing that
+        depends on a memory address is accepted.
+    '''
+
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, np.generic)):
+        return f'{type(value).__name__}:{value!r}'
+
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return f'ndarray:{value.dtype.str}:{value.shape}:{digest}'
+
+    if isinstance(value, (tuple, list)):
+        return f'{type(value).__name__}(' + ','.join(_describe(item, seen) for item in value) + ')'
+
+    if isinstance(value, dict):
+        items = sorted((_describe(key, seen), _describe(item, seen)) for key, item in value.items())
+        return 'dict(' + ','.join(f'{key}={item}' for key, item in items) + ')'
+
+    if isinstance(value, (set, frozenset)):
+        return f'{type(value).__name__}(' + ','.join(sorted(_describe(item, seen) for item in value)) + ')'
+
+    if isinstance(value, functools.partial):
+        return (f'partial({_describe(value.func, seen)},{_describe(value.args, seen)},'
+                f'{_describe(value.keywords, seen)})')
+
+    if isinstance(value, types.CodeType):
+        return (f'code({value.co_code.hex()},{_describe(value.co_consts, seen)},{value.co_names!r},'
+                f'{value.co_varnames!r})')
+
+    if isinstance(value, types.FunctionType):
+        name = f'{value.__module__}.{value.__qualname__}'
+        if id(value) in seen:                   # recursive closures
+            return f'function:{name}'
+        seen.add(id(value))
+
+        cells = [cell.cell_contents for cell in value.__closure__ or ()]
+        return (f'function:{name}:{_describe(value.__code__, seen)}:{_describe(value.__defaults__, seen)}:'
+                f'{_describe(value.__kwdefaults__, seen)}:{_describe(cells, seen)}')
+
+    if isinstance(value, types.MethodType):
+        return f'method:{_describe(value.__func__, seen)}:{_describe(value.__self__, seen)}'
+
+    if isinstance(value, (types.ModuleType, type, types.BuiltinFunctionType, np.ufunc)):
+        module = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, '__module__', '')
+        return f'{type(value).__name__}:{module}.{getattr(value, "__qualname__", value.__name__)}'
+
+    wrapped = getattr(value, '__wrapped__', None)          # e.g. NumPy's array-function dispatchers
+    if callable(wrapped):
+        return f'wrapper:{type(value).__name__}:{_describe(wrapped, seen)}'
+
+    # -- sentinels, enums ...: only a repr defined by the class and free of memory addresses --
+    if type(value).__repr__ is not object.__repr__:
+        text = repr(value)
+        if ' at 0x' not in text:
+            return f'{type(value).__module__}.{type(value).__qualname__}:{text}'
+
+    raise TypeError(f'{type(value).__name__} objects have no deterministic description for the cache key')
+
+
+
+#*### P R O C E S S E D  C A C H E #################################################################################################
+class ProcessedCache():
+
+    """
+        On-disk cache of processed datasets.
+
+        Every entry is a directory named after a `dataset_fingerprint` key,
+        holding one `.npy` file per processed array and a `manifest.json`
+        describing the arrays and the configuration they come from. Entries are
+        written to a temporary directory and renamed, so a crashed run never
+        leaves a half-written entry behind.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Root directory of the cache; created if missing.
+
+        Examples
+        --------
+        >>> cache = ProcessedCache('.pyes_cache')
+        >>> key, config = dataset_fingerprint(paths, normalization=std_norm, split_index=[70, 85])
+        >>> cached = cache.load(key)
+        >>> if cached is None:
+        ...     cache.save(key, all_data, all_labels, config)
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, cache_dir):
+
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    def load(self, key, mmap=True):
+        '''
+            Loads a cached entry.
+
+            Parameters
+            ----------
+            key : str
+                Entry key.
+            mmap : bool, optional (default=True)
+                Memory-map the arrays (read-only) instead of reading them.
+
+            Returns
+            -------
+            tuple (all_data, all_labels) of lists of ndarray, or None if the entry does not exist
+        '''
+
+        entry = os.path.join(self.cache_dir, key)
+        manifest_path = os.path.join(entry, self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode=mmap_mode) for name in manifest['arrays']}
+
+        all_data = [arrays[f'data_{i}'] for i in range(manifest['n_subsets'])]
+        all_labels = [arrays[f'labels_{i}'] for i in range(manifest['n_subsets'])]
+
+        return all_data, all_labels
+
+
+    def save(self, key, all_data, all_labels, config=None):
+        '''
+            Stores a processed dataset.
+
+            Parameters
+            ----------
+            key : str
+                Entry key, e.g. from `dataset_fingerprint`.
+            all_data, all_labels : list of ndarray
+                Processed subsets (train / val / test) and their labels.
+            config : dict, optional
+                Description stored in the manifest.
+
+            Returns
+            -------
+            str     :   path of the entry directory
+        '''
+
+        entry = os.path.join(self.cache_dir, key)
+        staging = f'{entry}.tmp-{os.getpid()}'
+        os.makedirs(staging, exist_ok=True)
+
+        arrays = {}
+        for i, (data, labels) in enumerate(zip(all_data, all_labels)):
+            for name, array in ((f'data_{i}', data), (f'labels_{i}', labels)):
+                np.save(os.path.join(staging, name + '.npy'), array)
+                arrays[name] = {'shape': list(np.shape(array)), 'dtype': str(np.asarray(array).dtype)}
+
+        manifest = {
+            'key': key,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'n_subsets': len(all_data),
+            'arrays': arrays,
+            'config': config,
+        }
+        with open(os.path.join(staging, self.MANIFEST), 'w') as file:
+            json.dump(manifest, file, indent=2)
+
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+
+        return entry
+
+
+    def clear(self):
+        '''
+            Removes every entry of the cache.
+        '''
+
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
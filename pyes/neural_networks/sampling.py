@@ -0,0 +1,208 @@
+import numpy as np
+
+
+
+#*### A L I A S  T A B L E #################################################################################################
+class AliasTable():
+
+    """
+        Walker / Vose alias table: draws from a discrete distribution in O(1) per draw.
+
+        Building the table is O(n). A draw picks a uniform bucket and keeps it
+        with probability `prob[bucket]`, otherwise returns `alias[bucket]`; both
+        steps are vectorized over the whole draw.
+
+        Parameters
+        ----------
+        weights : array-like of float, shape (n,)
+            Non-negative, not necessarily normalized, weights.
+
+        Attributes
+        ----------
+        prob : ndarray of float64, shape (n,)
+            Probability of keeping each bucket.
+        alias : ndarray of int64, shape (n,)
+            Outcome returned when the bucket is not kept.
+
+        Examples
+        --------
+        >>> table = AliasTable([1, 1, 8])
+        >>> table.draw(np.random.default_rng(0), 5)
+        array([2, 2, 2, 2, 2])
+    """
+
+    def __init__(self, weights):
+
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or len(weights) == 0:
+            raise ValueError('weights must be a non-empty 1D array')
+        if np.any(weights < 0) or not np.all(np.isfinite(weights)) or weights.sum() == 0:
+            raise ValueError('weights must be finite, non-negative and not all zero')
+
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+
+        self.prob = np.ones(n)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = list(np.flatnonzero(scaled < 1.0))
+        large = list(np.flatnonzero(scaled >= 1.0))
+        while small and large:
+            less, more = small.pop(), large[-1]
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(large.pop())
+
+        # -- leftovers are 1 up to rounding errors --
+        self.prob[small] = 1.0
+        self.prob[large] = 1.0
+
+
+    def __len__(self):
+        return len(self.prob)
+
+
+    def draw(self, rng, size):
+        '''
+            Draws `size` outcomes.
+
+            Parameters
+            ----------
+            rng : np.random.Generator
+                Random generator.
+            size : int
+                Number of draws.
+
+            Returns
+            -------
+            ndarray of int64
+        '''
+
+        buckets = rng.integers(len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[buckets]
+
+        return np.where(keep, buckets, self.alias[buckets])
+
+
+
+#*### W E I G H T E D  S A M P L E R #################################################################################################
+class WeightedSampler():
+
+    """
+        Draws sample indices with replacement, class-balanced or weighted.
+
+        Rare classes are oversampled by drawing their indices more often, so the
+        data are never duplicated. Class modes use an alias table over the
+        classes and a uniform pick inside the drawn class; custom weights use an
+        alias table over the samples. Every draw is O(1).
+
+        Parameters
+        ----------
+        labels : array-like, shape (n_samples,) or (n_samples, n_classes), optional
+            Integer or one-hot labels; required by the class modes.
+        mode : {'balanced', 'inverse_frequency'}, optional (default='balanced')
+            - 'balanced': every class is drawn with the same probability
+            - 'inverse_frequency': every sample has the weight `class_weights[k]` /
+              the number of samples of its class k, so the class k is drawn with a
+              probability proportional to `class_weights[k]`, whatever its size.
+              Needs `class_weights` (with equal weights it is 'balanced').
+            Ignored if `weights` is given.
+        class_weights : array-like of float, shape (n_classes,), optional
+            Relative importance of every class, for 'inverse_frequency'.
+        weights : array-like of float, shape (n_samples,), optional
+            Custom per-sample weights.
+        num_samples : int, optional
+            Indices per epoch. Default is the number of samples.
+        seed : int, optional
+            Seed of the draws; the same seed gives the same epochs.
+
+        Attributes
+        ----------
+        class_probabilities : ndarray or None
+            Probability of each class (class modes only).
+        sample_weights : ndarray or None
+            Weight of each sample, `class_weights[k] / count[k]` ('inverse_frequency' only).
+
+        Examples
+        --------
+        >>> sampler = WeightedSampler(train_labels, mode='balanced', seed=0)
+        >>> batches = BatchIterator(train_data, train_labels, batch_size=64, sampler=sampler)
+        >>> dataset = manager.to_tf_dataset((train_data, train_labels), sampler=sampler)
+    """
+
+    def __init__(self, labels=None, mode='balanced', weights=None, num_samples=None, seed=None, class_weights=None):
+
+        self._rng = np.random.default_rng(seed)
+        self.class_probabilities = None
+        self.sample_weights = None
+        self._order = None
+
+        if weights is not None:
+            self._table = AliasTable(weights)
+            n_samples = len(self._table)
+        else:
+            if labels is None:
+                raise ValueError('labels are required without custom weights')
+
+            classes = np.asarray(labels)
+            classes = classes.argmax(axis=1) if classes.ndim > 1 else classes.astype(np.int64)
+            counts = np.bincount(classes)
+
+            if mode == 'balanced':
+                class_weights = (counts > 0).astype(np.float64)
+            elif mode == 'inverse_frequency':
+                if class_weights is None:
+                    raise ValueError("'inverse_frequency' needs class_weights; without them use 'balanced'")
+                class_weights = np.asarray(class_weights, dtype=np.float64)
+                if class_weights.ndim != 1 or len(class_weights) < len(counts):
+                    raise ValueError(f'expected {len(counts)} class weights, got shape {class_weights.shape}')
+                counts = np.pad(counts, (0, len(class_weights) - len(counts)))      # classes with no sample
+                class_weights = np.where(counts > 0, class_weights, 0.)
+                # -- weight / class size per sample; drawn as: class by its weight, then a uniform sample --
+                self.sample_weights = class_weights[classes] / counts[classes]
+            else:
+                raise ValueError("Invalid mode. Choose 'balanced' or 'inverse_frequency'.")
+
+            self.class_probabilities = class_weights / class_weights.sum()
+            self._table = AliasTable(class_weights)
+            self._order = np.argsort(classes, kind='stable')
+            self._starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            self._counts = counts
+            n_samples = len(classes)
+
+        self.num_samples = n_samples if num_samples is None else num_samples
+
+
+    def __len__(self):
+        return self.num_samples
+
+
+    def __iter__(self):
+        yield from self.epoch().tolist()
+
+
+    def draw(self, size):
+        '''
+            Draws `size` sample indices.
+
+            Returns
+            -------
+            ndarray of int64
+        '''
+
+        picked = self._table.draw(self._rng, size)
+        if self._order is None:             # alias table over the samples
+            return picked
+
+        offsets = (self._rng.random(size) * self._counts[picked]).astype(np.int64)
+        return self._order[self._starts[picked] + offsets]
+
+
+    def epoch(self):
+        '''
+            Indices of one epoch (`num_samples` draws).
+        '''
+
+        return self.draw(self.num_samples)
@@ -0,0 +1,266 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+
+#*### CONSTANTS #################################################################################################
+MANIFEST = 'manifest.json'
+
+
+
+#*### E X P O R T #################################################################################################
+def export_shards(data, labels, out_dir, shard_size=65536, prefix='shard'):
+    '''
+        Writes a processed dataset as fixed-size shards.
+
+        Every shard is a pair of `.npy` files (data and labels) that can be
+        memory-mapped; `manifest.json` records, for every shard, its files, its
+        first sample (offset), its number of samples and its class distribution.
+
+        Parameters
+        ----------
+        data : ndarray, shape (n_samples, ...)
+            Samples, e.g. one of the subsets returned by `DatasetManager.data_processing`.
+        labels : ndarray, shape (n_samples,) or (n_samples, n_classes)
+            Integer or one-hot labels.
+        out_dir : str
+            Output directory; created if missing. If it already holds an export,
+            the shards named by its manifest are removed before writing, so a
+            smaller re-export does not leave stale shards behind.
+        shard_size : int, optional (default=65536)
+            Samples per shard (the last shard may be shorter).
+        prefix : str, optional (default='shard')
+            Prefix of the shard file names.
+
+        Returns
+        -------
+        dict    :   the manifest
+
+        Examples
+        --------
+        >>> export_shards(train_data, train_labels, '/data/train_shards', shard_size=10000)
+        >>> reader = ShardReader('/data/train_shards')
+    '''
+
+    if len(data) != len(labels):
+        raise ValueError(f'data and labels have different lengths ({len(data)} and {len(labels)})')
+    if shard_size < 1:
+        raise ValueError('shard_size must be positive')
+
+    os.makedirs(out_dir, exist_ok=True)
+    _remove_export(out_dir)
+
+    classes = _class_ids(labels)
+    n_classes = int(classes.max()) + 1 if len(classes) else 0
+
+    shards = []
+    for number, offset in enumerate(range(0, len(data), shard_size)):
+        stop = min(offset + shard_size, len(data))
+        data_file, labels_file = f'{prefix}-{number:05d}.data.npy', f'{prefix}-{number:05d}.labels.npy'
+
+        np.save(os.path.join(out_dir, data_file), np.ascontiguousarray(data[offset:stop]))
+        np.save(os.path.join(out_dir, labels_file), np.ascontiguousarray(labels[offset:stop]))
+
+        shards.append({
+            'data': data_file,
+            'labels': labels_file,
+            'offset': offset,
+            'count': stop - offset,
+            'class_counts': np.bincount(classes[offset:stop], minlength=n_classes).tolist(),
+        })
+
+    manifest = {
+        'n_samples': len(data),
+        'shard_size': shard_size,
+        'sample_shape': list(np.shape(data)[1:]),
+        'dtype': str(np.asarray(data[:0]).dtype),
+        'label_shape': list(np.shape(labels)[1:]),
+        'label_dtype': str(np.asarray(labels[:0]).dtype),
+        'class_counts': np.bincount(classes, minlength=n_classes).tolist(),
+        'shards': shards,
+    }
+
+    staging = os.path.join(out_dir, MANIFEST + '.tmp')
+    with open(staging, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(staging, os.path.join(out_dir, MANIFEST))
+
+    return manifest
+
+
+def _remove_export(out_dir):
+    '''
+        ### Private function — do not use!
+        removes the manifest of a previous export in out_dir, then the shards it names
+    '''
+
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return
+
+    with open(path) as file:
+        previous = json.load(file)
+    os.remove(path)
+
+    for shard in previous.get('shards', []):
+        for name in (shard['data'], shard['labels']):
+            name = os.path.join(out_dir, os.path.basename(name))
+            if os.path.exists(name):
+                os.remove(name)
+
+
+def _class_ids(labels):
+    '''
+        ### Private function — do not use!
+        integer class of every label (one-hot labels are decoded)
+    '''
+
+    labels = np.asarray(labels)
+    if labels.ndim > 1:
+        return labels.argmax(axis=1)
+    return labels.astype(np.int64)
+
+
+
+#*### R E A D E R #################################################################################################
+class ShardReader():
+
+    """
+        Reader of a dataset written by `export_shards`.
+
+        The reader only holds the directory and the manifest, so it can be sent
+        to worker processes; every worker asks for its own shards with `assign`
+        and opens them as memmaps, reading only the pages it touches.
+
+        Parameters
+        ----------
+        directory : str
+            Directory written by `export_shards`.
+        mmap : bool, optional (default=True)
+            Memory-map the shards instead of reading them in memory.
+
+        Attributes
+        ----------
+        manifest : dict
+            Content of `manifest.json`.
+
+        Examples
+        --------
+        >>> reader = ShardReader('/data/train_shards')
+        >>> for data, labels in reader.iter_shards(worker=rank, n_workers=world_size):
+        ...     train_on(data, labels)
+    """
+
+    def __init__(self, directory, mmap=True):
+
+        self.directory = directory
+        self.mmap = mmap
+
+        with open(os.path.join(directory, MANIFEST), 'r') as file:
+            self.manifest = json.load(file)
+
+
+    def __len__(self):
+        return len(self.manifest['shards'])
+
+
+    @property
+    def n_samples(self):
+        return self.manifest['n_samples']
+
+
+    #*## A S S I G N M E N T ##############################################
+    def assign(self, worker, n_workers, strategy='contiguous'):
+        '''
+            Shards of one worker; every shard belongs to exactly one worker.
+
+            Parameters
+            ----------
+            worker : int
+                Index of the worker, in [0, n_workers).
+            n_workers : int
+                Number of workers.
+            strategy : {'contiguous', 'round_robin'}, optional (default='contiguous')
+                'contiguous' gives each worker one run of consecutive shards,
+                'round_robin' gives it every `n_workers`-th shard.
+
+            Returns
+            -------
+            list of int     :   shard indices
+        '''
+
+        if not 0 <= worker < n_workers:
+            raise ValueError(f'worker must be in [0, {n_workers}), got {worker}')
+
+        if strategy == 'contiguous':
+            return np.array_split(np.arange(len(self)), n_workers)[worker].tolist()
+        if strategy == 'round_robin':
+            return list(range(worker, len(self), n_workers))
+
+        raise ValueError(f"strategy must be 'contiguous' or 'round_robin', got {strategy!r}")
+
+
+    #*## R E A D ##########################################################
+    def shard(self, index):
+        '''
+            Returns one shard.
+
+            Returns
+            -------
+            tuple (data, labels) of ndarray     :   memmaps if `mmap` is True
+        '''
+
+        info = self.manifest['shards'][index]
+        mmap_mode = 'r' if self.mmap else None
+
+        return (np.load(os.path.join(self.directory, info['data']), mmap_mode=mmap_mode),
+                np.load(os.path.join(self.directory, info['labels']), mmap_mode=mmap_mode))
+
+
+    def iter_shards(self, worker=0, n_workers=1, strategy='contiguous'):
+        '''
+            Yields (data, labels) for every shard assigned to `worker`, see `assign`.
+        '''
+
+        for index in self.assign(worker, n_workers, strategy):
+            yield self.shard(index)
+
+
+    def read(self, indices=None, n_jobs=4):
+        '''
+            Reads several shards in parallel into one array.
+
+            Every thread copies its shard straight into its slice of a preallocated
+            output, so the result is built without intermediate concatenations.
+
+            Parameters
+            ----------
+            indices : list of int, optional
+                Shards to read, in order. Default is every shard.
+            n_jobs : int, optional (default=4)
+                Number of reading threads.
+
+            Returns
+            -------
+            tuple (data, labels) of ndarray
+        '''
+
+        shards = self.manifest['shards']
+        indices = list(range(len(self))) if indices is None else list(indices)
+
+        starts = np.concatenate(([0], np.cumsum([shards[i]['count'] for i in indices]))).astype(int)
+        data = np.empty((int(starts[-1]),) + tuple(self.manifest['sample_shape']), dtype=self.manifest['dtype'])
+        labels = np.empty((int(starts[-1]),) + tuple(self.manifest['label_shape']), dtype=self.manifest['label_dtype'])
+
+        def copy(position):
+            shard_data, shard_labels = self.shard(indices[position])
+            data[starts[position]:starts[position + 1]] = shard_data
+            labels[starts[position]:starts[position + 1]] = shard_labels
+
+        with ThreadPoolExecutor(max_workers=max(1, n_jobs)) as pool:
+            list(pool.map(copy, range(len(indices))))
+
+        return data, labels
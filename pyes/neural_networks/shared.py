@@ -0,0 +1,357 @@
+import os
+import json
+import secrets
+import tempfile
+import contextlib
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:         # Windows: the OS frees a segment when its last handle is closed
+    fcntl = None
+
+
+
+#*### CONSTANTS #################################################################################################
+ALIGNMENT = 64          # bytes; the first block holds the reference count
+
+
+
+#*### H A N D L E #################################################################################################
+class SharedHandle():
+
+    """
+        Small, picklable description of a published dataset: segment name and
+        layout of the arrays. Pass it to the workers (as an argument, or as text
+        with `to_json`) and open it with `SharedDataset.attach`.
+
+        Attributes
+        ----------
+        name : str
+            Name of the shared memory segment.
+        entries : list of dict
+            'kind' ('data' or 'labels'), 'offset', 'shape' and 'dtype' of every array.
+    """
+
+    def __init__(self, name, entries):
+        self.name = name
+        self.entries = entries
+
+
+    def to_json(self):
+        return json.dumps({'name': self.name, 'entries': self.entries})
+
+
+    @classmethod
+    def from_json(cls, text):
+        content = json.loads(text)
+        return cls(content['name'], content['entries'])
+
+
+    @property
+    def nbytes(self):
+        ''' size of the segment '''
+        return _segment_size(self.entries)
+
+
+    def __repr__(self):
+        return f'SharedHandle({self.name!r}, {len(self.entries)} arrays, {self.nbytes / 2**20:.1f} MB)'
+
+
+
+#*### S H A R E D  D A T A S E T #################################################################################################
+class SharedDataset():
+
+    """
+        Processed arrays in one `multiprocessing.shared_memory` segment, copied
+        once by the publisher and mapped without copy by every attached process.
+
+        Attached arrays are read-only. Every `publish` and `attach` increments a
+        reference count kept in the segment (updated under a file lock); every
+        `close` decrements it and the last one unlinks the segment, whichever
+        process it runs in. The segment is removed from the multiprocessing
+        resource tracker, which would otherwise unlink it as soon as the first
+        attached process exits. Close it explicitly (or use `with`): if a process
+        dies without closing, `remove` frees the segment by name.
+
+        Attributes
+        ----------
+        handle : SharedHandle
+        data, labels : list of ndarray
+            Views of the segment, in the order of `data_processing`.
+
+        Examples
+        --------
+        >>> all_data, all_labels = manager.data_processing([70, 85], window=3840)
+        >>> shared = SharedDataset.publish(all_data, all_labels)        # parent
+        >>> pool.map(train_worker, [shared.handle] * 16)
+        ...
+        >>> def train_worker(handle):                                   # worker
+        ...     with SharedDataset.attach(handle) as dataset:
+        ...         train_data, train_labels = dataset.data[0], dataset.labels[0]
+    """
+
+    def __init__(self, memory, handle):
+
+        self.handle = handle
+        self._memory = memory
+        self.data, self.labels = _views(memory, handle.entries, writeable=False)
+
+
+    #*## P U B L I S H  /  A T T A C H ###################################
+    @classmethod
+    def publish(cls, all_data, all_labels=None, name=None):
+        '''
+            Copies the arrays into a new shared memory segment.
+
+            Parameters
+            ----------
+            all_data : list of ndarray
+                E.g. the data returned by `DatasetManager.data_processing`; memmaps
+                are copied without loading them whole.
+            all_labels : list of ndarray, optional
+                The matching labels.
+            name : str, optional
+                Segment name (default: a random 'pyes-...' name).
+
+            Returns
+            -------
+            SharedDataset   :   the publisher's own (read-only) view, holding one reference
+        '''
+
+        entries, offset = [], ALIGNMENT
+        for kind, arrays in (('data', all_data), ('labels', all_labels or [])):
+            for array in arrays:
+                entries.append({'kind': kind, 'offset': offset, 'shape': list(array.shape), 'dtype': array.dtype.str})
+                offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        name = name or f'pyes-{secrets.token_hex(6)}'
+        memory = shared_memory.SharedMemory(name=name, create=True, size=max(_segment_size(entries), ALIGNMENT))
+        _untrack(memory)
+
+        handle = SharedHandle(memory.name, entries)
+        with _locked(handle.name):
+            targets, target_labels = _views(memory, entries, writeable=True)
+            for target, source in zip(targets + target_labels, list(all_data) + list(all_labels or [])):
+                target[...] = source
+            _counter(memory)[0] = 1
+            del targets, target_labels
+
+        return cls(memory, handle)
+
+
+    @classmethod
+    def attach(cls, handle):
+        '''
+            Maps a published dataset, read-only and without copy.
+
+            Parameters
+            ----------
+            handle : SharedHandle or str
+                The publisher's `handle`, or its `to_json()` text.
+
+            Raises
+            ------
+            FileNotFoundError
+                If the segment was already released.
+        '''
+
+        if isinstance(handle, str):
+            handle = SharedHandle.from_json(handle)
+
+        with _locked(handle.name):
+            try:
+                memory = _open(handle.name)
+            except FileNotFoundError:
+                _remove_lock(handle.name)           # created by `_locked`
+                raise FileNotFoundError(f'shared dataset {handle.name!r} was already released') from None
+
+            counter = _counter(memory)
+            if fcntl is not None and counter[0] <= 0:
+                del counter
+                memory.close()
+                raise FileNotFoundError(f'shared dataset {handle.name!r} was already released')
+            counter[0] += 1
+            del counter
+
+        return cls(memory, handle)
+
+
+    #*## C L E A N U P ####################################################
+    def close(self):
+        '''
+            Releases this reference; the last one unlinks the segment.
+
+            The views in `data` and `labels` must not be used afterwards. The
+            mapping itself is closed once no array refers to it any more.
+        '''
+
+        if self._memory is None:
+            return
+
+        memory, self._memory = self._memory, None
+        self.data, self.labels = [], []
+
+        with _locked(self.handle.name):
+            counter = _counter(memory)
+            counter[0] -= 1
+            last = counter[0] <= 0
+            del counter
+            if last:
+                _unlink(memory.name)
+
+        with contextlib.suppress(BufferError):         # views still referenced elsewhere
+            memory.close()
+
+        if last:
+            _remove_lock(self.handle.name)
+
+
+    @property
+    def references(self):
+        ''' current reference count '''
+        if self._memory is None:
+            return 0
+        return int(_counter(self._memory)[0])
+
+
+    @staticmethod
+    def remove(name):
+        '''
+            Unlinks a segment by name, whatever its reference count (e.g. after a worker crash).
+        '''
+
+        with contextlib.suppress(FileNotFoundError):
+            _unlink(name)
+        _remove_lock(name)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __del__(self):
+        if getattr(self, '_memory', None) is None:
+            return
+        try:
+            self.close()
+        except Exception:           # e.g. at interpreter shutdown
+            pass
+
+
+
+#*### P R I V A T E #################################################################################################
+def _segment_size(entries):
+    '''
+        ### Private function — do not use!
+    '''
+
+    if not entries:
+        return ALIGNMENT
+    last = entries[-1]
+    return last['offset'] + int(np.prod(last['shape'])) * np.dtype(last['dtype']).itemsize
+
+
+def _views(memory, entries, writeable):
+    '''
+        ### Private function — do not use!
+        (data, labels) lists of arrays over the segment
+    '''
+
+    data, labels = [], []
+    for entry in entries:
+        array = np.ndarray(entry['shape'], dtype=np.dtype(entry['dtype']), buffer=memory.buf, offset=entry['offset'])
+        array.flags.writeable = writeable
+        (data if entry['kind'] == 'data' else labels).append(array)
+
+    return data, labels
+
+
+def _counter(memory):
+    '''
+        ### Private function — do not use!
+        int64 reference count at the start of the segment
+    '''
+
+    return np.ndarray((1,), dtype=np.int64, buffer=memory.buf)
+
+
+def _open(name):
+    '''
+        ### Private function — do not use!
+        attaches to an existing segment without registering it in the resource tracker
+    '''
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)         # Python >= 3.13
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        _untrack(memory)
+        return memory
+
+
+def _untrack(memory):
+    '''
+        ### Private function — do not use!
+
+        Python < 3.13 registers every segment, even attached ones, in the resource
+        tracker of the process, which unlinks it at exit: the reference count
+        decides instead.
+    '''
+
+    if os.name == 'posix':
+        with contextlib.suppress(Exception):
+            resource_tracker.unregister(memory._name, 'shared_memory')
+
+
+def _unlink(name):
+    '''
+        ### Private function — do not use!
+        unlinks without touching the resource tracker (no-op on Windows)
+    '''
+
+    if os.name == 'posix':
+        from multiprocessing.shared_memory import _posixshmem
+        _posixshmem.shm_unlink('/' + name.lstrip('/'))
+
+
+def _lock_path(name):
+    '''
+        ### Private function — do not use!
+    '''
+
+    return os.path.join(tempfile.gettempdir(), f'{name.lstrip("/")}.lock')
+
+
+@contextlib.contextmanager
+def _locked(name):
+    '''
+        ### Private function — do not use!
+        inter-process lock of the reference count (a no-op without fcntl)
+    '''
+
+    if fcntl is None:
+        yield
+        return
+
+    with open(_lock_path(name), 'a') as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _remove_lock(name):
+    '''
+        ### Private function — do not use!
+    '''
+
+    with contextlib.suppress(OSError):
+        os.remove(_lock_path(name))
@@ -0,0 +1,290 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+
+#*### CONSTANTS #################################################################################################
+_MIN_BLOCK_ROWS = 4096          # below this many rows per block the thread overhead dominates
+_BLOCKS_PER_JOB = 4             # more blocks than workers keeps the pool balanced
+
+
+
+#*### N  J O B S #################################################################################################
+def _resolve_n_jobs(n_jobs):
+    '''
+        ### Private function — do not use!
+
+        Converts a `n_jobs` value into an actual number of workers.
+
+        Parameters
+        ----------
+        n_jobs : int or None
+            - None or 1: single thread
+            - -1: all the available cores
+            - < -1: all the cores but (|n_jobs| - 1)
+
+        Returns
+        -------
+        int     :   number of workers (always >= 1)
+
+        Raises
+        ------
+        ValueError
+            if `n_jobs` is 0 or not int
+    '''
+
+    if n_jobs is None:
+        return 1
+
+    if not isinstance(n_jobs, int) or n_jobs == 0:
+        raise ValueError('n_jobs must be a non-zero int or None')
+
+    if n_jobs < 0:
+        n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+
+    return max(1, n_jobs)
+
+
+
+#*### R O W  B L O C K S #########################################################################################
+def _row_blocks(n_rows, n_jobs=None, min_rows=None, block_rows=None):
+    '''
+        ### Private function — do not use!
+
+        Partitions `n_rows` rows into contiguous blocks.
+
+        Parameters
+        ----------
+        n_rows : int
+            Number of rows to partition.
+        n_jobs : int or None
+            Number of workers that will process the blocks.
+        min_rows : int, optional
+            Minimum number of rows per block. Default is `_MIN_BLOCK_ROWS`.
+        block_rows : int, optional
+            Fixed number of rows per block (the last one may be shorter).
+            Overrides `n_jobs` and `min_rows`.
+
+        Returns
+        -------
+        list of tuple (start, stop)
+            Contiguous, non-overlapping row ranges covering [0, n_rows).
+
+        Examples
+        --------
+        >>> _row_blocks(10, n_jobs=2, min_rows=3)
+        [(0, 3), (3, 6), (6, 10)]
+    '''
+
+    if n_rows == 0:
+        return [(0, 0)]
+
+    if block_rows is not None:
+        return [(start, min(start + block_rows, n_rows)) for start in range(0, n_rows, block_rows)]
+
+    if min_rows is None:
+        min_rows = _MIN_BLOCK_ROWS
+
+    n_blocks = _resolve_n_jobs(n_jobs) * _BLOCKS_PER_JOB
+    n_blocks = max(1, min(n_blocks, n_rows // max(1, min_rows)))
+
+    bounds = np.linspace(0, n_rows, n_blocks + 1).astype(int)
+    return [(int(bounds[i]), int(bounds[i+1])) for i in range(n_blocks)]
+
+
+
+#*### M A P  B L O C K S #########################################################################################
+def _map_blocks(func, n_rows, n_jobs=None, executor=None, min_rows=None, block_rows=None):
+    '''
+        ### Private function — do not use!
+
+        Runs `func(start, stop)` on every row block, on a thread pool if requested.
+
+        NumPy releases the GIL inside its kernels, so threads give real parallelism
+        on the per-block work without copying the data into other processes.
+
+        Parameters
+        ----------
+        func : callable
+            Function called as `func(start, stop)` for every row block.
+        n_rows : int
+            Number of rows of the data being processed.
+        n_jobs : int or None
+            Number of threads. With `executor` it only sets the number of blocks.
+        executor : concurrent.futures.Executor or None
+            External executor to submit the blocks to.
+        min_rows : int, optional
+            Minimum number of rows per block. Default is `_MIN_BLOCK_ROWS`.
+        block_rows : int, optional
+            Fixed number of rows per block, see `_row_blocks`.
+
+        Returns
+        -------
+        list
+            The results of `func`, in block order.
+    '''
+
+    if executor is not None and n_jobs is None:
+        n_jobs = -1
+
+    return _map_ranges(func, _row_blocks(n_rows, n_jobs, min_rows, block_rows), n_jobs, executor)
+
+
+def _map_ranges(func, ranges, n_jobs=None, executor=None):
+    '''
+        ### Private function — do not use!
+
+        Runs `func(start, stop)` on explicit (start, stop) ranges, see `_map_blocks`.
+
+        Returns
+        -------
+        list
+            The results of `func`, in the order of `ranges`.
+    '''
+
+    if executor is not None:
+        return list(executor.map(lambda bounds: func(*bounds), ranges))
+
+    workers = _resolve_n_jobs(n_jobs)
+    if workers == 1 or len(ranges) <= 1:
+        return [func(start, stop) for start, stop in ranges]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda bounds: func(*bounds), ranges))
+
+
+
+#*### M O M E N T S ##############################################################################################
+def _block_moments(block, axis=None):
+    '''
+        ### Private function — do not use!
+
+        Computes count, mean and sum of squared deviations (M2) of a block.
+
+        Parameters
+        ----------
+        block : ndarray
+            Block of data.
+        axis : int, tuple of int or None
+            Axes reduced by the statistics. None reduces everything.
+
+        Returns
+        -------
+        tuple (count, mean, m2)
+            `mean` and `m2` are float64.
+    '''
+
+    count = block.size if axis is None else int(np.prod([block.shape[a] for a in np.atleast_1d(axis)]))
+    if count == 0:
+        return 0, 0., 0.
+
+    mean = block.mean(axis=axis, dtype=np.float64)
+    centered = block - (mean if axis is None else np.expand_dims(mean, axis))
+    m2 = np.square(centered).sum(axis=axis)
+
+    return count, mean, m2
+
+
+def _nan_block_moments(block):
+    '''
+        ### Private function — do not use!
+
+        Like `_block_moments` over all the elements, ignoring NaNs.
+    '''
+
+    if np.issubdtype(block.dtype, np.inexact):
+        block = block[~np.isnan(block)]
+
+    return _block_moments(block)
+
+
+def _merge_moments(parts, cross=False):
+    '''
+        ### Private function — do not use!
+
+        Merges (count, mean, M2) triples with the parallel algorithm of Chan et al.
+
+        Parameters
+        ----------
+        parts : iterable of tuple (count, mean, m2)
+            Partial moments, e.g. one per row block.
+        cross : bool, optional (default=False)
+            If True, `m2` is the scatter matrix (X - mean).T @ (X - mean) and the
+            correction term is the outer product of the mean differences.
+
+        Returns
+        -------
+        tuple (count, mean, m2)
+            Moments of the union of the blocks.
+    '''
+
+    count, mean, m2 = 0, 0., 0.
+    for n_b, mean_b, m2_b in parts:
+        if n_b == 0:
+            continue
+        if count == 0:
+            count, mean, m2 = n_b, mean_b, m2_b
+            continue
+
+        total = count + n_b
+        delta = mean_b - mean
+        mean = mean + delta * (n_b / total)
+        correction = np.multiply.outer(delta, delta) if cross else np.square(delta)
+        m2 = m2 + m2_b + correction * (count * n_b / total)
+        count = total
+
+    return count, mean, m2
+
+
+def _transform_blocks(data, transform, n_jobs=None, executor=None, dtype=None):
+    '''
+        ### Private function — do not use!
+
+        Applies `transform(block, out_block)` to every row block of `data`.
+
+        Parameters
+        ----------
+        data : ndarray
+            Input data, split along the first axis.
+        transform : callable
+            Called as `transform(data[start:stop], out[start:stop])`; must fill `out_block`.
+        n_jobs : int or None
+            Number of threads.
+        executor : concurrent.futures.Executor or None
+            External executor to submit the blocks to.
+        dtype : dtype, optional
+            Output dtype. Default is the floating dtype of `data`.
+
+        Returns
+        -------
+        ndarray     :   the transformed data, same shape as `data`
+    '''
+
+    out = np.empty(data.shape, dtype=dtype or _float_dtype(data))
+    _map_blocks(lambda start, stop: transform(data[start:stop], out[start:stop]), len(data), n_jobs, executor)
+
+    return out
+
+
+def _non_zero(scale):
+    '''
+        ### Private function — do not use!
+
+        Replaces zero scale factors with 1, as scikit-learn does for constant features.
+    '''
+
+    scale = np.array(scale, dtype=np.float64)
+    scale[scale == 0.0] = 1.0
+    return scale
+
+
+def _float_dtype(data):
+    '''
+        ### Private function — do not use!
+
+        Output dtype of a scaling: floating inputs keep their dtype, the others become float64.
+    '''
+
+    return data.dtype if np.issubdtype(data.dtype, np.floating) else np.dtype(np.float64)
@@ -1,12 +1,15 @@
+import warnings
+
 import numpy as np
 from sklearn.preprocessing import StandardScaler, MinMaxScaler, MaxAbsScaler, Normalizer
 
 from ..utils import to_z_score
+from ._parallel import _map_blocks, _map_ranges, _transform_blocks, _block_moments, _nan_block_moments, _merge_moments, _non_zero, _float_dtype
 
 
 
 #*### MIN - MAX SCALING #################################################################################################
-def minmax_scaling(data, min_val=0, max_val=1):
+def minmax_scaling(data, min_val=0, max_val=1, n_jobs=None, executor=None):
     """
         Scale data to a specified range.
 
@@ -18,6 +21,11 @@ def minmax_scaling(data, min_val=0, max_val=1):
             Desired lower bound of the transformed data.
         max_val : float or int, optional (default=1)
             Desired upper bound of the transformed data.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None keeps the single-core
+            scikit-learn implementation; -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
@@ -25,13 +33,31 @@ def minmax_scaling(data, min_val=0, max_val=1):
             Transformed data scaled to the interval [min_val, max_val].
     """
 
-    scaler = MinMaxScaler(feature_range=(min_val, max_val))
-    return scaler.fit_transform(data)
+    if n_jobs is None and executor is None:
+        scaler = MinMaxScaler(feature_range=(min_val, max_val))
+        return scaler.fit_transform(data)
+
+    data = np.asarray(data)
+
+    # -- per-block min / max, then reduced over the blocks --
+    parts = _map_blocks(lambda start, stop: (data[start:stop].min(axis=0), data[start:stop].max(axis=0)),
+                        len(data), n_jobs, executor)
+    data_min = np.minimum.reduce([part[0] for part in parts]).astype(np.float64)
+    data_max = np.maximum.reduce([part[1] for part in parts]).astype(np.float64)
+
+    scale = (max_val - min_val) / _non_zero(data_max - data_min)
+    offset = min_val - data_min * scale
+
+    def transform(block, out):
+        np.multiply(block, scale, out=out)
+        out += offset
+
+    return _transform_blocks(data, transform, n_jobs, executor)
 
 
 
 #*### MAX ABS SCALING #################################################################################################
-def maxabs_scaling(data):
+def maxabs_scaling(data, n_jobs=None, executor=None):
     """
         Scale data by its maximum absolute value.
 
@@ -39,6 +65,11 @@ def maxabs_scaling(data):
         ----------
         data : array-like, shape (n_samples, n_features)
             Input data to be scaled.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None keeps the single-core
+            scikit-learn implementation; -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
@@ -46,13 +77,21 @@ def maxabs_scaling(data):
             Transformed data where each feature is divided by its maximum absolute value.
     """
 
-    scaler = MaxAbsScaler()
-    return scaler.fit_transform(data)
+    if n_jobs is None and executor is None:
+        scaler = MaxAbsScaler()
+        return scaler.fit_transform(data)
+
+    data = np.asarray(data)
+
+    parts = _map_blocks(lambda start, stop: np.abs(data[start:stop]).max(axis=0), len(data), n_jobs, executor)
+    scale = _non_zero(np.maximum.reduce(parts))
+
+    return _transform_blocks(data, lambda block, out: np.divide(block, scale, out=out), n_jobs, executor)
 
 
 
 #*### STANDARD SCALING #################################################################################################
-def std_norm(data, dim='1D'):
+def std_norm(data, dim='1D', n_jobs=None, executor=None):
     """
         Normalize data to zero mean and unit variance.
 
@@ -64,6 +103,11 @@ def std_norm(data, dim='1D'):
             - If dim='2D', data is 3D with shape (n_samples, dim_x, dim_y).
         dim : {'1D', '2D'}, optional (default='1D')
             Dimension along which to apply normalization.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None keeps the single-core
+            scikit-learn implementation; -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
@@ -74,8 +118,18 @@ def std_norm(data, dim='1D'):
         ------
         ValueError
             If `dim` is not '1D' or '2D'.
+
+        See Also
+        --------
+        ChannelNormalizer : dataset-wide per-channel statistics for (N, H, W, C) / (N, C, H, W) batches.
     """
 
+    if dim not in ('1D', '2D'):
+        raise ValueError("Invalid dim. Dim must be '1D' or '2D'.")
+
+    if n_jobs is not None or executor is not None:
+        return _std_norm_blocks(data, dim, n_jobs, executor)
+
     scaler = StandardScaler()
 
     if dim == '1D':
@@ -91,9 +145,249 @@ def std_norm(data, dim='1D'):
     return normalized
 
 
+def _std_norm_blocks(data, dim, n_jobs=None, executor=None):
+    '''
+        ### Private function — do not use!
+
+        Multi-threaded `std_norm`: every sample (row) is standardized with its own
+        statistics, so the row blocks are independent.
+    '''
+
+    data = np.asarray(data)
+    flat = data.reshape((data.shape[0], -1))
+
+    def transform(block, out):
+        mean = block.mean(axis=1, keepdims=True)
+        std = _non_zero(block.std(axis=1, keepdims=True))
+        np.subtract(block, mean, out=out)
+        out /= std
+
+    normalized = _transform_blocks(flat, transform, n_jobs, executor).reshape(data.shape)
+
+    if dim == '2D':
+        normalized = np.expand_dims(normalized, axis=3)
+
+    return normalized
+
+
+
+#*### CHANNEL NORMALIZATION ##########################################################################################
+class ChannelNormalizer():
+    """
+        Per-channel standardization of image / tensor batches.
+
+        The per-channel mean and standard deviation are computed over the whole
+        dataset in a streaming pass (batches are merged with the parallel algorithm
+        of Chan et al.), then every batch is standardized by broadcasting, with no
+        reshaped or transposed copy. Fit it once on the training data and reuse it
+        for every batch of every split.
+
+        Parameters
+        ----------
+        layout : {'NHWC', 'NCHW'}, optional (default='NHWC')
+            Position of the channel axis: last ('NHWC') or right after the samples
+            ('NCHW'). Any number of spatial axes is accepted, e.g. (N, L, C).
+        dtype : dtype, optional (default=np.float32)
+            Dtype of the transformed batches.
+
+        Attributes
+        ----------
+        mean_ : ndarray, shape (n_channels,)
+            Per-channel mean; None until fitted.
+        std_ : ndarray, shape (n_channels,)
+            Per-channel standard deviation (constant channels get 1).
+        count_ : int
+            Number of values seen per channel.
+
+        Examples
+        --------
+        >>> normalizer = ChannelNormalizer(layout='NHWC').fit(train_images, batch_size=512)
+        >>> train_batch = normalizer.transform(train_images[:64])
+        >>> val_batch = normalizer.transform(val_images[:64])
+    """
+
+    def __init__(self, layout='NHWC', dtype=np.float32):
+
+        if layout not in ('NHWC', 'NCHW'):
+            raise ValueError("Invalid layout. Choose 'NHWC' or 'NCHW'.")
+
+        self.layout = layout
+        self.dtype = np.dtype(dtype)
+
+        self.count_ = 0
+        self._mean = None
+        self._m2 = None
+        self.mean_ = None
+        self.std_ = None
+
+
+    def partial_fit(self, batch):
+        '''
+            Updates the running per-channel statistics with one batch.
+
+            Parameters
+            ----------
+            batch : ndarray, shape (n_samples, ...)
+                Batch in the layout given to the constructor.
+
+            Returns
+            -------
+            self
+        '''
+
+        batch = np.asarray(batch)
+        if batch.ndim < 2:
+            raise ValueError(f'expected at least 2D batches (n_samples, ..., channels), got {batch.ndim}D')
+
+        axes = self._reduced_axes(batch.ndim)
+        self.count_, self._mean, self._m2 = _merge_moments([(self.count_, self._mean, self._m2),
+                                                            _block_moments(batch, axis=axes)])
+        self.mean_ = self._mean
+        self.std_ = _non_zero(np.sqrt(self._m2 / self.count_))
+
+        return self
+
+
+    def fit(self, data, batch_size=256):
+        '''
+            Computes the per-channel statistics in one streaming pass.
+
+            Parameters
+            ----------
+            data : ndarray or iterable of ndarray
+                A whole array (memmaps included), read `batch_size` samples at a
+                time, or an iterable yielding batches. Anything but an ndarray is
+                an iterable of batches: a plain list is a list of batches, not an
+                array (wrap it in `np.asarray` to fit on it as one).
+            batch_size : int, optional (default=256)
+                Samples per step when `data` is an array.
+
+            Returns
+            -------
+            self
+        '''
+
+        self.count_, self._mean, self._m2 = 0, None, None
+
+        if isinstance(data, np.ndarray):
+            for start in range(0, len(data), batch_size):
+                self.partial_fit(data[start:start + batch_size])
+        else:
+            for batch in data:
+                self.partial_fit(batch)
+
+        return self
+
+
+    def transform(self, batch, out=None):
+        '''
+            Standardizes a batch with the fitted per-channel statistics.
+
+            Parameters
+            ----------
+            batch : ndarray
+                Batch in the layout given to the constructor.
+            out : ndarray, optional
+                Destination array, e.g. a reused buffer or `batch` itself for an
+                in-place update. A new array of `dtype` is allocated if not given.
+
+            Returns
+            -------
+            ndarray     :   the standardized batch
+
+            Raises
+            ------
+            RuntimeError
+                If the normalizer is not fitted.
+        '''
+
+        if self.mean_ is None:
+            raise RuntimeError('ChannelNormalizer not fitted. Call "fit()" first.')
+
+        batch = np.asarray(batch)
+        if out is None:
+            out = np.empty(batch.shape, dtype=self.dtype)
+
+        shape = [1] * batch.ndim
+        shape[self._channel_axis(batch.ndim)] = -1
+        np.subtract(batch, self.mean_.astype(out.dtype).reshape(shape), out=out)
+        out /= self.std_.astype(out.dtype).reshape(shape)
+
+        return out
+
+
+    def fit_transform(self, data, batch_size=256):
+        '''
+            Fits on `data` and standardizes it. See `fit` and `transform`.
+
+            Parameters
+            ----------
+            data : ndarray or re-iterable of ndarray
+                A whole array, or an iterable of batches that can be iterated twice
+                (a list, a dataset object ...): the first pass fits, the second one
+                yields the standardized batches.
+            batch_size : int, optional (default=256)
+                Samples per step when `data` is an array.
+
+            Returns
+            -------
+            ndarray, or a generator of ndarray for an iterable of batches
+
+            Raises
+            ------
+            TypeError
+                If `data` is a one-shot iterator (e.g. a generator): fit on it with
+                `fit` and transform the batches of a new iterator.
+        '''
+
+        if isinstance(data, np.ndarray):
+            return self.fit(data, batch_size=batch_size).transform(data)
+
+        if iter(data) is data:
+            raise TypeError('fit_transform needs two passes over the batches, '
+                            'a one-shot iterator (e.g. a generator) can only be read once')
+
+        self.fit(data)
+        return (self.transform(batch) for batch in data)
+
+
+    def _channel_axis(self, ndim):
+        return ndim - 1 if self.layout == 'NHWC' else 1
+
+
+    def _reduced_axes(self, ndim):
+        channel_axis = self._channel_axis(ndim)
+        return tuple(axis for axis in range(ndim) if axis != channel_axis)
+
+
+def channel_norm(data, layout='NHWC', dtype=np.float32):
+    """
+        Normalize each channel of a batch to zero mean and unit variance.
+
+        Unlike `std_norm(dim='2D')`, the statistics are per channel over the whole
+        batch and the channel axis is kept where it is.
+
+        Parameters
+        ----------
+        data : ndarray, shape (n_samples, ..., n_channels) or (n_samples, n_channels, ...)
+            Input batch.
+        layout : {'NHWC', 'NCHW'}, optional (default='NHWC')
+            Position of the channel axis.
+        dtype : dtype, optional (default=np.float32)
+            Dtype of the normalized data.
+
+        Returns
+        -------
+        normalized : ndarray
+            Normalized data, same shape as `data`.
+    """
+
+    return ChannelNormalizer(layout=layout, dtype=dtype).fit_transform(np.asarray(data))
+
+
 
 #*### WHITENING #################################################################################################
-def whitening(data):
+def whitening(data, n_jobs=None, executor=None):
     """
         Apply whitening transformation to decorrelate features and set unit variance.
 
@@ -101,6 +395,11 @@ def whitening(data):
         ----------
         data : array-like, shape (n_samples, n_features)
             Input data to whiten.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None runs on a single core;
+            -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
@@ -108,18 +407,44 @@ def whitening(data):
             Transformed data with uncorrelated features and unit variance.
     """
 
-    mu = data.mean(axis=0)
-    cov = np.cov(data.T)
+    if n_jobs is None and executor is None:
+        mu = data.mean(axis=0)
+        cov = np.cov(data.T)
+    else:
+        data = np.asarray(data)
+        mu, cov = _blocked_mean_cov(data, n_jobs, executor)
+
     evals, evecs = np.linalg.eigh(cov)
     whitening_matrix = evecs / np.sqrt(evals)
-    whitened_data = (data - mu) @ whitening_matrix
 
-    return whitened_data
+    if n_jobs is None and executor is None:
+        return (data - mu) @ whitening_matrix
+
+    return _transform_blocks(data, lambda block, out: np.matmul(block - mu, whitening_matrix, out=out),
+                             n_jobs, executor, dtype=np.float64)
+
+
+def _blocked_mean_cov(data, n_jobs=None, executor=None):
+    '''
+        ### Private function — do not use!
+
+        Feature means and covariance matrix (ddof=1, as `np.cov`) merged from row blocks.
+    '''
+
+    def block_scatter(start, stop):
+        block = data[start:stop]
+        mean = block.mean(axis=0, dtype=np.float64)
+        centered = block - mean
+        return len(block), mean, centered.T @ centered
+
+    count, mean, scatter = _merge_moments(_map_blocks(block_scatter, len(data), n_jobs, executor), cross=True)
+
+    return mean, scatter / (count - 1)
 
 
 
 #*### NORMALIZATION #################################################################################################
-def normalization(data, type_norm='l1'):
+def normalization(data, type_norm='l1', n_jobs=None, executor=None):
     """
         Normalize samples individually to unit norm.
 
@@ -129,19 +454,160 @@ def normalization(data, type_norm='l1'):
             Input data to normalize.
         type_norm : {'l1', 'l2', 'max'}, optional (default='l1')
             Norm to use for normalization.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None keeps the single-core
+            scikit-learn implementation; -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
         normalized_data : ndarray, shape (n_samples, n_features)
             Transformed data where each sample has unit norm.
     """
-    normalizer = Normalizer(norm=type_norm)
-    return normalizer.fit_transform(data)
+    if n_jobs is None and executor is None:
+        normalizer = Normalizer(norm=type_norm)
+        return normalizer.fit_transform(data)
+
+    if type_norm not in ('l1', 'l2', 'max'):
+        raise ValueError("Invalid type_norm. Choose 'l1', 'l2' or 'max'.")
+
+    def transform(block, out):
+        if type_norm == 'l1':
+            norms = np.abs(block).sum(axis=1)
+        elif type_norm == 'l2':
+            norms = np.sqrt(np.einsum('ij,ij->i', block, block))
+        else:
+            norms = np.abs(block).max(axis=1)
+        np.divide(block, _non_zero(norms)[:, np.newaxis], out=out)
+
+    return _transform_blocks(np.asarray(data), transform, n_jobs, executor)
+
+
+
+#*### MISSING VALUES IMPUTATION ######################################################################################
+def impute(data, strategy='mean', fill_value=0, copy=True, chunk_rows=None, n_jobs=None, executor=None):
+    """
+        Replace missing values (NaN) feature by feature.
+
+        Missing values are found and the fill statistics computed in a single
+        vectorized pass per chunk; a second pass fills only the chunks that
+        contain missing values.
+
+        Parameters
+        ----------
+        data : ndarray, shape (n_samples, n_features) or (n_samples,)
+            Input data. Features are the columns (all trailing axes for N-D data).
+        strategy : {'mean', 'median', 'constant', 'ffill'}, optional (default='mean')
+            Fill value of every feature:
+            - 'mean': mean of its non-missing values.
+            - 'median': median of its non-missing values (computed in one call, not chunked).
+            - 'constant': `fill_value`.
+            - 'ffill': last non-missing value above it (chunks are processed in order).
+        fill_value : float, optional (default=0)
+            Used by 'constant', for features without any valid value and for the
+            leading missing values of 'ffill'.
+        copy : bool, optional (default=True)
+            If False, `data` is modified in place: it must be a writable floating
+            array (memmaps included).
+        chunk_rows : int, optional (default=None)
+            Rows per chunk, to bound the temporary memory on large or memmapped data.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing the chunks. Not used by 'ffill'.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the chunks are submitted to instead of a new thread pool.
+
+        Returns
+        -------
+        imputed : ndarray
+            Data without missing values; `data` itself if `copy` is False.
+
+        Raises
+        ------
+        ValueError
+            If `strategy` is not valid, or `copy` is False and `data` is not a floating ndarray.
+    """
+
+    if strategy not in ('mean', 'median', 'constant', 'ffill'):
+        raise ValueError("Invalid strategy. Choose 'mean', 'median', 'constant' or 'ffill'.")
+
+    if copy:
+        data = np.array(data, dtype=_float_dtype(np.asarray(data)))
+    elif not isinstance(data, np.ndarray) or not np.issubdtype(data.dtype, np.floating):
+        raise ValueError('in-place imputation needs a floating ndarray')
+
+    flat = data.reshape((len(data), -1))
+
+    if strategy == 'ffill':
+        _forward_fill(flat, fill_value, chunk_rows)
+    else:
+        # -- pass 1: missing values and fill statistics --
+        def scan(start, stop):
+            block = flat[start:stop]
+            missing = np.isnan(block)
+            valid = len(block) - missing.sum(axis=0)
+            total = np.where(missing, 0., block).sum(axis=0, dtype=np.float64) if strategy == 'mean' else None
+            return (start, stop), missing.any(), valid, total
+
+        parts = _map_blocks(scan, len(flat), n_jobs, executor, block_rows=chunk_rows)
+        with_missing = [bounds for bounds, has_missing, _, _ in parts if has_missing]
+
+        if strategy == 'mean':
+            valid = np.sum([part[2] for part in parts], axis=0)
+            total = np.sum([part[3] for part in parts], axis=0)
+            fill = np.divide(total, valid, out=np.full(flat.shape[1], float(fill_value)), where=valid > 0)
+        elif strategy == 'median':
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)     # all-NaN features get `fill_value` below
+                fill = np.nanmedian(flat, axis=0) if with_missing else None
+        else:
+            fill = np.full(flat.shape[1], fill_value, dtype=np.float64)
+
+        # -- pass 2: fill only the chunks with missing values --
+        if with_missing:
+            fill = np.where(np.isnan(fill), fill_value, fill).astype(flat.dtype)
+
+            def fill_block(start, stop):
+                block = flat[start:stop]
+                np.copyto(block, fill, where=np.isnan(block))
+
+            _map_ranges(fill_block, with_missing, n_jobs, executor)
+
+    if not np.shares_memory(flat, data):
+        data[...] = flat.reshape(data.shape)
+
+    return data
+
+
+def _forward_fill(flat, fill_value, chunk_rows=None):
+    '''
+        ### Private function — do not use!
+
+        In-place, vectorized forward fill of a 2-D array along the rows. The last
+        valid row of a chunk is carried over to the next one.
+    '''
+
+    carried = np.full(flat.shape[1], fill_value, dtype=flat.dtype)
+    columns = np.arange(flat.shape[1])
+    chunk_rows = chunk_rows or max(1, len(flat))
+
+    for start in range(0, len(flat), chunk_rows):
+        block = flat[start:start + chunk_rows]
+        missing = np.isnan(block)
+
+        if missing.any():
+            # -- index of the last valid row at or above every position, -1 if none --
+            last_valid = np.where(missing, -1, np.arange(len(block))[:, np.newaxis])
+            np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+            filled = np.where(last_valid >= 0, block[np.maximum(last_valid, 0), columns], carried)
+            np.copyto(block, filled, where=missing)
+
+        carried = block[-1].copy()
 
 
 
 #*### OUTLIER DETECTION ##############################################################################################
-def outlier_detection(data, threshold, method='std'):
+def outlier_detection(data, threshold, method='std', n_jobs=None, executor=None):
     """
         Detect outliers in the data using specified method.
 
@@ -155,12 +621,21 @@ def outlier_detection(data, threshold, method='std'):
             Method to use for detection:
             - 'std': return values greater than `threshold`.
             - 'z-score': compute z-scores and return values with |z| >= `threshold`.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None runs on a single core;
+            -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
         outliers : ndarray
-            Array of detected outlier values.
+            Array of detected outlier values. NaNs are ignored: they are never
+            outliers and do not affect the z-score statistics.
     """
+    if n_jobs is not None or executor is not None:
+        return _select_blocks(data, threshold, method, np.greater, np.greater_equal, False, n_jobs, executor)
+
     if method == 'std':
         return data[data > threshold]
     elif method == 'z-score':
@@ -172,7 +647,7 @@ def outlier_detection(data, threshold, method='std'):
 
 
 #*### OUTLIER REMOVAL #################################################################################################
-def remove_outliers(data, threshold, method='std'):
+def remove_outliers(data, threshold, method='std', n_jobs=None, executor=None):
     """
         Remove outliers from the data using specified method.
 
@@ -186,24 +661,75 @@ def remove_outliers(data, threshold, method='std'):
             Method to use for removal:
             - 'std': remove values greater than `threshold`.
             - 'z-score': compute z-scores and remove values with |z| > `threshold`.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None runs on a single core;
+            -1 uses all the available cores.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
         cleaned_data : ndarray
-            Data with outliers removed.
+            Data with outliers removed. NaNs are not outliers: they are kept and
+            do not affect the z-score statistics.
     """
+    if n_jobs is not None or executor is not None:
+        return _select_blocks(data, threshold, method, np.greater_equal, np.greater, True, n_jobs, executor)
+
+    # -- negated comparisons keep the NaNs --
     if method == 'std':
-        return data[data < threshold]
+        return data[~(data >= threshold)]
     elif method == 'z-score':
         z_scores = to_z_score(data)
-        return data[z_scores <= threshold]
+        return data[~(z_scores > threshold)]
     else:
         raise ValueError("Invalid method. Choose 'std' or 'z-score'.")
 
 
+def _global_mean_std(data, n_jobs=None, executor=None):
+    '''
+        ### Private function — do not use!
+
+        Mean and standard deviation of all the elements of `data`, merged from row blocks.
+        NaNs are ignored.
+    '''
+
+    parts = _map_blocks(lambda start, stop: _nan_block_moments(data[start:stop]), len(data), n_jobs, executor)
+    count, mean, m2 = _merge_moments(parts)
+
+    return mean, np.sqrt(m2 / count)
+
+
+def _select_blocks(data, threshold, method, std_compare, z_compare, invert, n_jobs=None, executor=None):
+    '''
+        ### Private function — do not use!
+
+        Multi-threaded boolean selection shared by `outlier_detection` and `remove_outliers`.
+        Blocks are concatenated in order, so the result matches the single-core one.
+        With `invert` the complement of the comparison is selected, NaNs included.
+    '''
+
+    if method not in ('std', 'z-score'):
+        raise ValueError("Invalid method. Choose 'std' or 'z-score'.")
+
+    data = np.asarray(data)
+    if method == 'z-score':
+        mean, std = _global_mean_std(data, n_jobs, executor)
+
+    def select(start, stop):
+        block = data[start:stop]
+        if method == 'std':
+            mask = std_compare(block, threshold)
+        else:
+            mask = z_compare(np.abs((block - mean) / std), threshold)
+        return block[~mask if invert else mask]
+
+    return np.concatenate(_map_blocks(select, len(data), n_jobs, executor))
+
+
 
 #*### OUTLIER REPLACEMENT ############################################################################################
-def replace_outliers(data, threshold, replacement_value='mean'):
+def replace_outliers(data, threshold, replacement_value='mean', n_jobs=None, executor=None):
     """
         Replace outliers in the data with a specified value.
 
@@ -215,9 +741,14 @@ def replace_outliers(data, threshold, replacement_value='mean'):
             Threshold for determining outliers (values > threshold are replaced).
         replacement_value : {'mean', 'median'} or float, optional (default='mean')
             Value to replace outliers:
-            - 'mean': global mean of `data`.
-            - 'median': global median of `data`.
+            - 'mean': global mean of `data`, NaNs ignored.
+            - 'median': global median of `data`, NaNs ignored.
             - float: specified constant value.
+        n_jobs : int or None, optional (default=None)
+            Number of threads processing row blocks. None runs on a single core;
+            -1 uses all the available cores. The median is always computed on one core.
+        executor : concurrent.futures.Executor, optional (default=None)
+            Executor the row blocks are submitted to instead of a new thread pool.
 
         Returns
         -------
@@ -230,13 +761,24 @@ def replace_outliers(data, threshold, replacement_value='mean'):
             If `replacement_value` is not 'mean', 'median', or numeric.
     """
 
+    parallel = n_jobs is not None or executor is not None
+    if parallel:
+        data = np.asarray(data)
+
     if replacement_value == 'mean':
-        replacement_value = np.mean(data)
+        replacement_value = _global_mean_std(data, n_jobs, executor)[0] if parallel else np.nanmean(data)
     elif replacement_value == 'median':
-        replacement_value = np.median(data)
+        replacement_value = np.nanmedian(data)
     elif not isinstance(replacement_value, (int, float)):
         raise ValueError("replacement_value must be numeric, 'mean', or 'median'.")
 
+    if parallel:
+        def replace(block, out):
+            out[...] = block
+            out[out > threshold] = replacement_value
+
+        return _transform_blocks(data, replace, n_jobs, executor, dtype=data.dtype)
+
     cleaned_data = data.copy()
     cleaned_data[cleaned_data > threshold] = replacement_value
     return cleaned_data
@@ -0,0 +1,311 @@
+import os
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+
+#*### CONSTANTS #################################################################################################
+_DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+
+#*### M E M O  C A C H E #################################################################################################
+class MemoCache():
+
+    """
+        Opt-in memoization of preprocessing functions, keyed by array content.
+
+        The key of a call is a BLAKE2 hash of the function name, of the raw buffer,
+        shape and dtype of every array argument, and of the `repr` of the other
+        parameters (defaults included, so positional and keyword calls match).
+        Results are kept in an in-memory LRU bounded by a byte budget and, if
+        `disk_dir` is given, also saved as `.npy` files that survive the process.
+
+        Only ndarray results are cached; other results are returned as they are.
+        Every call gets its own writable copy of a cached result, so callers can
+        modify it in place as with the plain function. With `copy_results=False`
+        the cached array is shared between the calls instead, without copy, and
+        returned read-only.
+
+        Parameters
+        ----------
+        max_bytes : int, optional (default=512 MiB)
+            Memory budget of the in-memory tier. Least recently used results are
+            evicted once it is exceeded.
+        disk_dir : str, optional (default=None)
+            Directory of the on-disk tier. Disabled if None.
+        copy_results : bool, optional (default=True)
+            Return a writable copy of cached results; False returns the shared,
+            read-only cached array.
+
+        Attributes
+        ----------
+        hits : int
+            Calls answered from memory.
+        disk_hits : int
+            Calls answered from the on-disk tier.
+        misses : int
+            Calls that ran the wrapped function.
+        evictions : int
+            Results dropped from memory to respect `max_bytes`.
+
+        Examples
+        --------
+        >>> cache = MemoCache(max_bytes=2 * 1024 ** 3, disk_dir='.pyes_cache')
+        >>> whitening = cache.wrap(cleaning.whitening)
+        >>> whitening(data)        # computed
+        >>> whitening(data)        # served from memory
+        >>> cache.stats()
+    """
+
+    def __init__(self, max_bytes=_DEFAULT_MAX_BYTES, disk_dir=None, copy_results=True):
+
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.copy_results = copy_results
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+
+    #*## W R A P ##########################################################
+    def wrap(self, func):
+        '''
+            Returns a memoized version of `func`.
+
+            Parameters
+            ----------
+            func : callable
+                Function returning an ndarray, e.g. any `pyes.preprocessing.cleaning` function.
+
+            Returns
+            -------
+            callable    :   wrapper with the same signature; the cache is available as `wrapper.cache`
+        '''
+
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = self.key(func, bound.arguments)
+
+            result = self.get(key)
+            if result is not None:
+                return result
+
+            result = func(*args, **kwargs)
+            if isinstance(result, np.ndarray):
+                result = self.put(key, result)
+
+            return result
+
+        wrapper.cache = self
+        return wrapper
+
+    __call__ = wrap
+
+
+    #*## K E Y ############################################################
+    def key(self, func, arguments):
+        '''
+            Computes the cache key of a call.
+
+            Parameters
+            ----------
+            func : callable
+                The called function.
+            arguments : dict
+                Parameter name -> value.
+
+            Returns
+            -------
+            str     :   hexadecimal digest
+        '''
+
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(f'{func.__module__}.{func.__qualname__}'.encode())
+
+        for name, value in arguments.items():
+            hasher.update(name.encode())
+            if isinstance(value, np.ndarray):
+                _hash_array(hasher, value)
+            else:
+                hasher.update(repr(value).encode())
+
+        return hasher.hexdigest()
+
+
+    #*## G E T  /  P U T ##################################################
+    def get(self, key):
+        '''
+            Looks a key up in memory, then on disk.
+
+            Returns
+            -------
+            ndarray or None     :   the cached result, None on a miss
+        '''
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._output(self._entries[key])
+
+        path = self._path(key)
+        if path is not None and os.path.exists(path):
+            result = np.load(path)
+            with self._lock:
+                self.disk_hits += 1
+                stored = self._store(key, result)
+            return result if stored is None else self._output(stored)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+
+    def put(self, key, result):
+        '''
+            Stores a result in memory (and on disk if enabled).
+
+            Returns
+            -------
+            ndarray     :   the result as it must be returned to the caller
+        '''
+
+        path = self._path(key)
+        if path is not None:
+            # -- temporary file + rename: a crash never leaves a truncated entry --
+            staging = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(staging, 'wb') as file:
+                np.save(file, result)
+            os.replace(staging, path)
+
+        with self._lock:
+            stored = self._store(key, result)
+
+        return result if stored is None else self._output(stored)
+
+
+    #*## S T A T S ########################################################
+    def stats(self):
+        '''
+            Returns the counters of the cache.
+
+            Returns
+            -------
+            dict    :   hits, disk_hits, misses, evictions, hit_rate, entries, nbytes
+        '''
+
+        with self._lock:
+            calls = self.hits + self.disk_hits + self.misses
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.disk_hits) / calls if calls else 0.,
+                'entries': len(self._entries),
+                'nbytes': self._nbytes,
+            }
+
+
+    def clear(self, disk=False):
+        '''
+            Empties the in-memory tier, and the on-disk one if `disk` is True.
+            The counters are left untouched.
+        '''
+
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+        if disk and self.disk_dir is not None:
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(('.npy', '.tmp')):
+                    os.remove(os.path.join(self.disk_dir, name))
+
+
+    #*## P R I V A T E ####################################################
+    def _store(self, key, result):
+        '''
+            Inserts a read-only view into the LRU, evicts down to the budget and returns the view.
+            None if the result is not kept in memory (not shared: it can be returned as it is).
+            The lock must be held.
+        '''
+
+        if result.nbytes > self.max_bytes or key in self._entries:
+            return None
+
+        result = result.view()
+        result.setflags(write=False)
+        self._entries[key] = result
+        self._nbytes += result.nbytes
+
+        while self._nbytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+            self.evictions += 1
+
+        return result
+
+
+    def _output(self, result):
+        return result.copy() if self.copy_results else result
+
+
+    def _path(self, key):
+        return None if self.disk_dir is None else os.path.join(self.disk_dir, key + '.npy')
+
+
+
+def _hash_array(hasher, array):
+    '''
+        ### Private function — do not use!
+
+        Feeds dtype, shape and raw content of an array to a hasher.
+        Contiguous arrays are hashed straight from their buffer, without copies.
+    '''
+
+    hasher.update(array.dtype.str.encode())
+    hasher.update(repr(array.shape).encode())
+
+    if array.dtype.hasobject:
+        hasher.update(repr(array.tolist()).encode())
+    else:
+        hasher.update(np.ascontiguousarray(array).reshape(-1).view(np.uint8))
+
+
+
+#*### D E F A U L T  C A C H E #################################################################################################
+default_cache = MemoCache()
+
+
+def memoize(func):
+    '''
+        Memoizes `func` with the process-wide `default_cache`.
+
+        Examples
+        --------
+        >>> from pyes.preprocessing.memoize import memoize, default_cache
+        >>> std_norm = memoize(cleaning.std_norm)
+        >>> default_cache.stats()
+    '''
+
+    return default_cache.wrap(func)
@@ -0,0 +1,505 @@
+import numpy as np
+
+from ._parallel import _block_moments, _merge_moments, _non_zero
+
+
+
+#*### CONSTANTS #################################################################################################
+_BLOCK_BYTES = 256 * 1024       # a block of float64 rows sized to stay in L2 cache
+
+
+
+#*### P I P E L I N E #################################################################################################
+class Pipeline():
+
+    """
+        Lazy, fused chain of cleaning steps.
+
+        Steps are only recorded when the chain is built; nothing touches the data
+        until `fit`, `transform` or `run` is called. Execution is blockwise: each
+        cache-sized block of rows goes through every stage before the next block is
+        read, and two block buffers are reused between the stages, so no full-size
+        intermediate array is ever created.
+
+        Fitting needs one pass over the data for each group of statistics that can
+        be computed together. A single pass gathers the per-feature count, mean,
+        variance, min and max (plus the covariance if a whitening step needs it).
+        Per-feature affine steps (`minmax_scaling`, `maxabs_scaling`) map that
+        summary to their output analytically, so the steps after them reuse it
+        without reading the data again.
+
+        Parameters
+        ----------
+        block_bytes : int, optional (default=256 KiB)
+            Size in bytes of a float64 block of rows.
+
+        Attributes
+        ----------
+        steps : list
+            The recorded steps, in order.
+
+        Examples
+        --------
+        >>> pipe = Pipeline().remove_outliers(3, method='z-score').minmax_scaling().normalization('l2')
+        >>> print(pipe.explain())
+        >>> cleaned = pipe.run(data)
+    """
+
+    def __init__(self, block_bytes=_BLOCK_BYTES):
+
+        self.block_bytes = block_bytes
+        self.steps = []
+        self._fitted = False
+
+
+    #*## S T E P S ########################################################
+    def replace_outliers(self, threshold, replacement_value='mean'):
+        '''
+            Records a replacement of the values greater than `threshold`.
+
+            See `cleaning.replace_outliers`. `replacement_value` can be 'mean' (global
+            mean of the step input) or a number; 'median' cannot be computed blockwise.
+        '''
+        return self._add(_ReplaceOutliers(threshold, replacement_value))
+
+    def remove_outliers(self, threshold, method='std'):
+        '''
+            Records the removal of the samples (rows) containing an outlier.
+
+            Unlike `cleaning.remove_outliers`, which returns the kept values flattened,
+            whole rows are dropped so the 2-D layout survives the following steps.
+        '''
+        return self._add(_RemoveOutliers(threshold, method))
+
+    def minmax_scaling(self, min_val=0, max_val=1):
+        ''' Records a per-feature min-max scaling, see `cleaning.minmax_scaling`. '''
+        return self._add(_MinMaxScaling(min_val, max_val))
+
+    def maxabs_scaling(self):
+        ''' Records a per-feature max-abs scaling, see `cleaning.maxabs_scaling`. '''
+        return self._add(_MaxAbsScaling())
+
+    def std_norm(self):
+        ''' Records a per-sample standardization, see `cleaning.std_norm` with dim='1D'. '''
+        return self._add(_StdNorm())
+
+    def normalization(self, type_norm='l1'):
+        ''' Records a per-sample unit-norm scaling, see `cleaning.normalization`. '''
+        return self._add(_Normalization(type_norm))
+
+    def whitening(self):
+        ''' Records a whitening transformation, see `cleaning.whitening`. '''
+        return self._add(_Whitening())
+
+
+    #*## P L A N ##########################################################
+    def plan(self):
+        '''
+            Computes the execution plan.
+
+            Returns
+            -------
+            list of dict
+                One dict per pass over the data, with keys:
+                - 'kind': 'statistics' or 'transform'
+                - 'replay': indices of the steps applied to each block before the statistics are gathered
+                - 'fits': indices of the steps fitted from the statistics of this pass
+        '''
+
+        passes = []
+        known = False
+        for index, step in enumerate(self.steps):
+
+            if step.needs_stats:
+                if not known:
+                    passes.append({'kind': 'statistics', 'replay': list(range(index)), 'fits': []})
+                    known = True
+                passes[-1]['fits'].append(index)
+
+            known = known and step.affine
+
+        passes.append({'kind': 'transform', 'replay': list(range(len(self.steps))), 'fits': []})
+
+        return passes
+
+
+    def explain(self):
+        '''
+            Describes the execution plan in a human readable form.
+
+            Returns
+            -------
+            str     :   one line per step and per pass over the data
+        '''
+
+        passes = self.plan()
+        lines = [f'Pipeline: {len(self.steps)} steps, {len(passes)} passes over the data '
+                 f'(block of {self.block_bytes // 1024} KiB)']
+
+        for index, step in enumerate(self.steps):
+            lines.append(f'  step {index}: {step.label()}')
+
+        for number, plan_pass in enumerate(passes, start=1):
+            replay = ' -> '.join(self.steps[i].name for i in plan_pass['replay']) or 'read'
+            if plan_pass['kind'] == 'statistics':
+                fits = ', '.join(self.steps[i].name for i in plan_pass['fits'])
+                lines.append(f'  pass {number} [statistics]: {replay} | summary fits: {fits}')
+            else:
+                lines.append(f'  pass {number} [transform]:  {replay} -> write')
+
+        return '\n'.join(lines)
+
+
+    #*## E X E C U T I O N ################################################
+    def fit(self, data):
+        '''
+            Computes the statistics of every step, with the passes given by `plan`.
+
+            Parameters
+            ----------
+            data : ndarray, shape (n_samples, n_features)
+                Data to fit. Memmaps are read block by block.
+
+            Returns
+            -------
+            self
+        '''
+
+        data = self._check(data)
+
+        summary = None
+        for index, step in enumerate(self.steps):
+
+            if step.needs_stats:
+                if summary is None:
+                    summary = self._summarize(data, index)
+                step.fit(summary)
+
+            summary = step.propagate(summary) if summary is not None and step.affine else None
+
+        self._fitted = True
+        return self
+
+
+    def transform(self, data, out=None):
+        '''
+            Applies the fitted steps in a single blockwise pass.
+
+            Parameters
+            ----------
+            data : ndarray, shape (n_samples, n_features)
+                Data to transform.
+            out : ndarray, optional
+                Output array with at least n_samples rows. A new float64 array is
+                allocated if not given.
+
+            Returns
+            -------
+            ndarray     :   the transformed data; fewer rows than `data` if a
+                            `remove_outliers` step dropped samples
+
+            Raises
+            ------
+            RuntimeError
+                If the pipeline is not fitted.
+        '''
+
+        if not self._fitted:
+            raise RuntimeError('Pipeline not fitted. Call "fit()" or "run()" first.')
+
+        data = self._check(data)
+        if out is None:
+            out = np.empty(data.shape, dtype=np.float64)
+
+        written = 0
+        for block in self._blocks(data, len(self.steps)):
+            out[written:written + len(block)] = block
+            written += len(block)
+
+        return out[:written]
+
+
+    def run(self, data, out=None):
+        '''
+            Fits the pipeline on `data` and transforms it. See `fit` and `transform`.
+        '''
+
+        return self.fit(data).transform(data, out=out)
+
+
+    #*## P R I V A T E ####################################################
+    def _add(self, step):
+        self.steps.append(step)
+        self._fitted = False
+        return self
+
+
+    def _check(self, data):
+        data = np.asarray(data)
+        if data.ndim != 2:
+            raise ValueError(f'expected 2D data (n_samples, n_features), got {data.ndim}D')
+        return data
+
+
+    def _blocks(self, data, n_steps):
+        '''
+            ### Private function — do not use!
+
+            Yields the blocks of `data` after the first `n_steps` steps.
+            The yielded arrays are views of two reused buffers.
+        '''
+
+        rows = max(1, self.block_bytes // (8 * max(1, data.shape[1])))
+        buffers = (np.empty((rows, data.shape[1])), np.empty((rows, data.shape[1])))
+
+        for start in range(0, len(data), rows):
+            block = data[start:start + rows]
+
+            for index, step in enumerate(self.steps[:n_steps]):
+                target = buffers[index % 2][:len(block)]
+                block = target[:step.apply(block, target)]
+
+            if len(block):
+                yield block
+
+
+    def _summarize(self, data, n_steps):
+        '''
+            ### Private function — do not use!
+
+            One statistics pass over the output of the first `n_steps` steps.
+        '''
+
+        summary = _Summary(data.shape[1], cov=any(step.needs_cov for step in self.steps[n_steps:]))
+        for block in self._blocks(data, n_steps):
+            summary.update(block)
+
+        return summary
+
+
+
+
+#*### S U M M A R Y #################################################################################################
+class _Summary():
+    '''
+        ### Private class — do not use!
+
+        Per-feature count, mean, M2, min, max (and optionally the scatter matrix) of a stream of blocks.
+    '''
+
+    def __init__(self, n_features, cov=False):
+
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.scatter = np.zeros((n_features, n_features)) if cov else None
+
+
+    def update(self, block):
+
+        if self.scatter is not None:
+            centered = block - block.mean(axis=0)
+            _, _, self.scatter = _merge_moments([(self.count, self.mean, self.scatter),
+                                                 (len(block), block.mean(axis=0), centered.T @ centered)], cross=True)
+
+        self.count, self.mean, self.m2 = _merge_moments([(self.count, self.mean, self.m2), _block_moments(block, axis=0)])
+        np.minimum(self.min, block.min(axis=0), out=self.min)
+        np.maximum(self.max, block.max(axis=0), out=self.max)
+
+
+    def global_mean_std(self):
+        ''' Mean and std of all the elements, as `utils.to_z_score` computes them. '''
+
+        mean = self.mean.mean()
+        m2 = self.m2.sum() + self.count * np.square(self.mean - mean).sum()
+        return mean, np.sqrt(m2 / (self.count * len(self.mean)))
+
+
+    def affine(self, scale, offset):
+        ''' Summary of `data * scale + offset`, without reading the data. '''
+
+        new = _Summary(len(self.mean))
+        new.count = self.count
+        new.mean = self.mean * scale + offset
+        new.m2 = self.m2 * np.square(scale)
+        low, high = self.min * scale + offset, self.max * scale + offset
+        new.min, new.max = np.minimum(low, high), np.maximum(low, high)
+        if self.scatter is not None:
+            new.scatter = self.scatter * np.multiply.outer(scale, scale)
+
+        return new
+
+
+
+
+#*### S T E P S #################################################################################################
+class _Step():
+    '''
+        ### Private class — do not use!
+
+        A pipeline stage. `apply(block, out)` writes the result into `out` and
+        returns the number of rows written.
+    '''
+
+    name = 'step'
+    needs_stats = False         # fitted from a `_Summary` of its input
+    needs_cov = False           # the summary must include the scatter matrix
+    affine = False              # output = input * scale + offset per feature
+
+    def label(self):
+        return self.name
+
+    def fit(self, summary):
+        pass
+
+    def propagate(self, summary):
+        return summary.affine(self.scale, self.offset)
+
+
+class _ReplaceOutliers(_Step):
+
+    name = 'replace_outliers'
+
+    def __init__(self, threshold, replacement_value):
+        if replacement_value == 'median':
+            raise ValueError("'median' cannot be computed blockwise; use cleaning.replace_outliers")
+        if replacement_value != 'mean' and not isinstance(replacement_value, (int, float)):
+            raise ValueError("replacement_value must be numeric or 'mean'.")
+
+        self.threshold = threshold
+        self.replacement_value = replacement_value
+        self.needs_stats = replacement_value == 'mean'
+        self.value = None if self.needs_stats else replacement_value
+
+    def label(self):
+        return f'replace_outliers(> {self.threshold} -> {self.replacement_value})'
+
+    def fit(self, summary):
+        self.value = summary.global_mean_std()[0]
+
+    def apply(self, block, out):
+        np.copyto(out, block)
+        out[out > self.threshold] = self.value
+        return len(block)
+
+
+class _RemoveOutliers(_Step):
+
+    name = 'remove_outliers'
+
+    def __init__(self, threshold, method):
+        if method not in ('std', 'z-score'):
+            raise ValueError("Invalid method. Choose 'std' or 'z-score'.")
+
+        self.threshold = threshold
+        self.method = method
+        self.needs_stats = method == 'z-score'
+
+    def label(self):
+        return f'remove_outliers({self.method}, threshold={self.threshold})'
+
+    def fit(self, summary):
+        self.mean, self.std = summary.global_mean_std()
+
+    def apply(self, block, out):
+        # -- negated comparisons keep the NaNs, as `cleaning.remove_outliers` --
+        if self.method == 'std':
+            keep = ~(block >= self.threshold).any(axis=1)
+        else:
+            keep = ~(np.abs((block - self.mean) / self.std) > self.threshold).any(axis=1)
+
+        kept = np.count_nonzero(keep)
+        np.compress(keep, block, axis=0, out=out[:kept])
+        return kept
+
+
+class _MinMaxScaling(_Step):
+
+    name = 'minmax_scaling'
+    needs_stats = True
+    affine = True
+
+    def __init__(self, min_val, max_val):
+        self.min_val = min_val
+        self.max_val = max_val
+
+    def label(self):
+        return f'minmax_scaling({self.min_val}, {self.max_val})'
+
+    def fit(self, summary):
+        self.scale = (self.max_val - self.min_val) / _non_zero(summary.max - summary.min)
+        self.offset = self.min_val - summary.min * self.scale
+
+    def apply(self, block, out):
+        np.multiply(block, self.scale, out=out)
+        out += self.offset
+        return len(block)
+
+
+class _MaxAbsScaling(_Step):
+
+    name = 'maxabs_scaling'
+    needs_stats = True
+    affine = True
+
+    def fit(self, summary):
+        self.scale = 1. / _non_zero(np.maximum(np.abs(summary.min), np.abs(summary.max)))
+        self.offset = np.zeros_like(self.scale)
+
+    def apply(self, block, out):
+        np.multiply(block, self.scale, out=out)
+        return len(block)
+
+
+class _StdNorm(_Step):
+
+    name = 'std_norm'
+
+    def apply(self, block, out):
+        mean = block.mean(axis=1, keepdims=True)
+        std = _non_zero(block.std(axis=1, keepdims=True))
+        np.subtract(block, mean, out=out)
+        out /= std
+        return len(block)
+
+
+class _Normalization(_Step):
+
+    name = 'normalization'
+
+    def __init__(self, type_norm):
+        if type_norm not in ('l1', 'l2', 'max'):
+            raise ValueError("Invalid type_norm. Choose 'l1', 'l2' or 'max'.")
+        self.type_norm = type_norm
+
+    def label(self):
+        return f'normalization({self.type_norm})'
+
+    def apply(self, block, out):
+        if self.type_norm == 'l1':
+            norms = np.abs(block).sum(axis=1)
+        elif self.type_norm == 'l2':
+            norms = np.sqrt(np.einsum('ij,ij->i', block, block))
+        else:
+            norms = np.abs(block).max(axis=1)
+
+        np.divide(block, _non_zero(norms)[:, np.newaxis], out=out)
+        return len(block)
+
+
+class _Whitening(_Step):
+
+    name = 'whitening'
+    needs_stats = True
+    needs_cov = True
+
+    def fit(self, summary):
+        evals, evecs = np.linalg.eigh(summary.scatter / (summary.count - 1))
+        self.mean = summary.mean
+        self.matrix = evecs / np.sqrt(evals)
+
+    def apply(self, block, out):
+        np.matmul(block - self.mean, self.matrix, out=out)
+        return len(block)
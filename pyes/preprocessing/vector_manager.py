@@ -1,4 +1,8 @@
+import struct
+import hashlib
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from pyes.utils import is_even
 
@@ -102,12 +106,12 @@ def _find_half(data, axis=0):
                     if the data length is odd the index will be the (length + 1) // 2
     '''
 
-    data = np.array(data)
+    shape = _shape_of(data)
 
-    if axis >= data.ndim:
-        raise ValueError(f"Invalid dimension {axis} for data {data.ndim}D")
+    if axis >= len(shape):
+        raise ValueError(f"Invalid dimension {axis} for data {len(shape)}D")
     
-    data_length = data.shape[axis]
+    data_length = shape[axis]
 
     if data_length == 0:
         raise ValueError('input data is empty')
@@ -120,6 +124,628 @@ def _find_half(data, axis=0):
 
 
 
+def _shape_of(data):
+    '''
+        ### Private function - do no use!
+        finds the shape of a structure without converting it to an array
+
+        Parameters
+        ----------
+        data    :   array-like
+            ndarray, memmap or nested lists / tuples
+
+        Returns
+        -------
+        tuple   :   the shape `np.array(data)` would have for regular nested sequences
+    '''
+
+    if hasattr(data, 'shape'):
+        return tuple(data.shape)
+
+    shape = []
+    while isinstance(data, (list, tuple)):
+        shape.append(len(data))
+        if len(data) == 0:
+            break
+        data = data[0]
+
+    return tuple(shape)
+
+
+
+#*## S P L I T  V I E W S ###########################################################
+def split_ranges(length, splits='half'):
+    '''
+        Computes the (start, stop) ranges of a split, without touching any data.
+
+        Parameters
+        ----------
+        length  :   int
+            Length of the axis to split.
+
+        splits  :   'half', int, sequence of int or sequence of float, default = 'half'
+            - 'half': two parts, as in `splitter`
+            - int or sequence of int: absolute split positions, as in `splitter`
+            - sequence of float: fractions of `length`, e.g. (0.7, 0.15, 0.15).
+              If they sum to less than 1 the remainder is an extra last part.
+
+        Returns
+        -------
+        list of tuple (start, stop)
+            Contiguous ranges covering [0, length).
+
+        Raises
+        ------
+        ValueError
+            if the positions are out of range or the fractions are negative or sum to more than 1
+
+        Examples
+        --------
+        >>> split_ranges(10, (0.7, 0.15, 0.15))
+        [(0, 7), (7, 8), (8, 10)]
+        >>> split_ranges(10, [2, 5])
+        [(0, 2), (2, 5), (5, 10)]
+    '''
+
+    if isinstance(splits, str):
+        if splits != 'half':
+            raise ValueError(f"invalid split '{splits}'")
+        splits = [(length + 1) // 2]
+
+    if isinstance(splits, (int, np.integer)):
+        splits = [splits]
+
+    splits = list(splits)
+
+    if any(isinstance(split, (float, np.floating)) for split in splits):
+        fractions = np.asarray(splits, dtype=np.float64)
+        total = fractions.sum()
+        if np.any(fractions < 0) or total > 1 + 1e-9:
+            raise ValueError('fractions must be non-negative and sum to at most 1')
+        bounds = np.round(np.cumsum(fractions) * length).astype(int)
+        positions = [int(bound) for bound in bounds[:-1]]
+        if total < 1 - 1e-9:
+            positions.append(int(bounds[-1]))
+    else:
+        positions = [int(split) for split in splits]
+
+    positions = [0] + positions + [length]
+
+    if not all(0 <= position <= length for position in positions) or positions != sorted(positions):
+        raise ValueError('incorrect index value')
+
+    return [(positions[i], positions[i+1]) for i in range(len(positions) - 1)]
+
+
+
+def split_views(data, splits='half', axis=0, ranges=False):
+    '''
+        Splits an array along any axis into views, without copying or converting it.
+
+        Parameters
+        ----------
+        data    :   ndarray or memmap
+            Data to split. Slicing a memmap returns memmaps, so nothing is read from disk.
+
+        splits  :   'half', int, sequence of int or sequence of float, default = 'half'
+            Split specification, see `split_ranges`.
+
+        axis    :   int, default = 0
+            Axis along which to split.
+
+        ranges  :   bool, default = False
+            If True return the (start, stop) ranges instead of the views.
+
+        Returns
+        -------
+        tuple of ndarray or list of tuple (start, stop)
+            Views of `data` sharing its memory, or their index ranges.
+
+        Examples
+        --------
+        >>> train, val, test = split_views(data, (0.7, 0.15, 0.15))
+        >>> first, second = split_views(signals, 'half', axis=1)
+    '''
+
+    shape = _shape_of(data)
+    if not -len(shape) <= axis < len(shape):
+        raise ValueError(f"Invalid dimension {axis} for data {len(shape)}D")
+    axis = axis % len(shape)
+
+    bounds = split_ranges(shape[axis], splits)
+    if ranges:
+        return bounds
+
+    prefix = (slice(None),) * axis
+    return tuple(data[prefix + (slice(start, stop),)] for start, stop in bounds)
+
+
+
+
+
+#*## S H U F F L E D  /  S T R A T I F I E D  /  K - F O L D  S P L I T S ###########
+def shuffle_split(data, splits=(0.8, 0.2), n_repeats=1, seed=None):
+    '''
+        Yields shuffled splits as index arrays. The data is never copied.
+
+        Parameters
+        ----------
+        data    :   int or array-like
+            Number of samples, or the data itself (only its length is read).
+
+        splits  :   sequence of float or int, default = (0.8, 0.2)
+            Split specification, see `split_ranges`.
+
+        n_repeats   :   int, default = 1
+            Number of independent shuffles.
+
+        seed    :   int or None
+            Seed of the random generator; the same seed yields the same splits.
+
+        Yields
+        ------
+        tuple of ndarray
+            One index array per part, views of a single permutation.
+
+        Examples
+        --------
+        >>> for train_idx, test_idx in shuffle_split(data, (0.8, 0.2), seed=0):
+        ...     model.fit(data[train_idx])
+    '''
+
+    n_samples = _n_samples(data)
+    bounds = split_ranges(n_samples, splits)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(n_repeats):
+        permutation = rng.permutation(n_samples)
+        yield tuple(permutation[start:stop] for start, stop in bounds)
+
+
+
+def stratified_split(labels, splits=(0.8, 0.2), n_repeats=1, seed=None):
+    '''
+        Yields shuffled splits that keep the class proportions of `labels`.
+
+        Parameters
+        ----------
+        labels  :   array-like, shape (n_samples,) or one-hot (n_samples, n_classes)
+            Class of every sample.
+
+        splits  :   sequence of float or int, default = (0.8, 0.2)
+            Split specification applied to every class, see `split_ranges`.
+
+        n_repeats   :   int, default = 1
+            Number of independent shuffles.
+
+        seed    :   int or None
+            Seed of the random generator.
+
+        Yields
+        ------
+        tuple of ndarray
+            One shuffled index array per part.
+    '''
+
+    classes = _class_indices(labels)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(n_repeats):
+        class_parts = []
+        for indices in classes:
+            permuted = rng.permutation(indices)
+            class_parts.append([permuted[start:stop] for start, stop in split_ranges(len(indices), splits)])
+
+        parts = [np.concatenate(part) for part in zip(*class_parts)]
+        for part in parts:
+            rng.shuffle(part)
+
+        yield tuple(parts)
+
+
+
+def kfold(data, n_folds=5, shuffle=True, seed=None, labels=None):
+    '''
+        Yields the (train, test) index arrays of a K-fold cross-validation.
+
+        The permutation is computed once and the folds are produced lazily, so
+        only index arrays are allocated, never copies of the data.
+
+        Parameters
+        ----------
+        data    :   int or array-like
+            Number of samples, or the data itself (only its length is read).
+
+        n_folds :   int, default = 5
+            Number of folds, at least 2.
+
+        shuffle :   bool, default = True
+            Shuffle the samples before building the folds.
+
+        seed    :   int or None
+            Seed of the random generator.
+
+        labels  :   array-like, optional
+            If given, the folds are stratified: every class is spread evenly over the folds.
+
+        Yields
+        ------
+        tuple (train_idx, test_idx)
+
+        Examples
+        --------
+        >>> for train_idx, test_idx in kfold(data, n_folds=10, seed=0):
+        ...     score(data[train_idx], data[test_idx])
+    '''
+
+    yield from _kfold(data, n_folds, shuffle, np.random.default_rng(seed), labels)
+
+
+
+def repeated_kfold(data, n_folds=5, n_repeats=10, seed=None, labels=None):
+    '''
+        Yields the (train, test) index arrays of `n_repeats` K-fold cross-validations,
+        each with a different shuffle. See `kfold`.
+    '''
+
+    rng = np.random.default_rng(seed)
+    for _ in range(n_repeats):
+        yield from _kfold(data, n_folds, True, rng, labels)
+
+
+
+def _kfold(data, n_folds, shuffle, rng, labels=None):
+    '''
+        ### Private function — do not use!
+
+        K-fold generator shared by `kfold` and `repeated_kfold`.
+    '''
+
+    n_samples = _n_samples(data) if labels is None else len(labels)
+    if not 2 <= n_folds <= n_samples:
+        raise ValueError(f'n_folds must be between 2 and the number of samples ({n_samples})')
+
+    if labels is None:
+        order = rng.permutation(n_samples) if shuffle else np.arange(n_samples)
+        bounds = np.linspace(0, n_samples, n_folds + 1).astype(int)
+        for k in range(n_folds):
+            yield np.concatenate((order[:bounds[k]], order[bounds[k+1]:])), order[bounds[k]:bounds[k+1]]
+        return
+
+    # -- stratified: every class is dealt round-robin over the folds --
+    fold_of = np.empty(n_samples, dtype=np.intp)
+    offset = 0
+    for indices in _class_indices(labels):
+        if shuffle:
+            indices = rng.permutation(indices)
+        fold_of[indices] = (np.arange(len(indices)) + offset) % n_folds
+        offset += len(indices)
+
+    for k in range(n_folds):
+        test = fold_of == k
+        yield np.flatnonzero(~test), np.flatnonzero(test)
+
+
+
+def _n_samples(data):
+    '''
+        ### Private function — do not use!
+        number of samples of `data`, which can also be the number itself
+    '''
+
+    if isinstance(data, (int, np.integer)):
+        return int(data)
+    return _shape_of(data)[0]
+
+
+
+def _class_indices(labels):
+    '''
+        ### Private function — do not use!
+        list with the sample indices of every class, one-hot labels accepted
+    '''
+
+    labels = np.asarray(labels)
+    if labels.ndim == 2:
+        labels = labels.argmax(axis=1)
+
+    order = np.argsort(labels, kind='stable')
+    _, starts = np.unique(labels[order], return_index=True)
+
+    return np.split(order, starts[1:])
+
+
+
+
+#*## S T R E A M I N G  S P L I T ###################################################
+def assign_stream(items, ratios=(0.8, 0.1, 0.1), mode='hash', key=None, salt=''):
+    '''
+        Lazily assigns every item of an iterator to a split. Nothing is materialized.
+
+        Parameters
+        ----------
+        items   :   iterable
+            Any iterator or generator, e.g. a streaming loader.
+
+        ratios  :   sequence of float, default = (0.8, 0.1, 0.1)
+            Relative size of every split; normalized to sum 1.
+
+        mode    :   {'hash', 'count'}, default = 'hash'
+            - 'hash': the split is chosen from a stable hash of the record, so the
+              same record always lands in the same split, whatever the order or the run.
+            - 'count': running count; every item goes to the split furthest below
+              its target ratio. Exact proportions, deterministic for a given order.
+
+        key     :   callable, optional
+            Maps an item to the value that is hashed (e.g. a record id). Default is the item itself.
+
+        salt    :   str, default = ''
+            Changes the hash assignment while keeping it reproducible. Salts
+            longer than 16 bytes are hashed down to 16 bytes.
+
+        Yields
+        ------
+        tuple (split_index, item)
+
+        Raises
+        ------
+        ValueError
+            if `mode` is not 'hash' or 'count' or the ratios are not positive
+        TypeError
+            in 'hash' mode, if a record (or its key) has no stable byte representation:
+            bytes, str, numbers, arrays and tuples / lists of them are supported
+    '''
+
+    ratios = np.asarray(ratios, dtype=np.float64)
+    if ratios.ndim != 1 or len(ratios) == 0 or np.any(ratios < 0) or ratios.sum() <= 0:
+        raise ValueError('ratios must be a non-empty sequence of non-negative numbers')
+    ratios = ratios / ratios.sum()
+
+    if mode == 'hash':
+        bounds = np.cumsum(ratios)
+        bounds[-1] = 1.
+        salt = salt.encode()
+        if len(salt) > hashlib.blake2b.SALT_SIZE:       # hashed down, not truncated: every character counts
+            salt = hashlib.blake2b(salt, digest_size=hashlib.blake2b.SALT_SIZE).digest()
+        for item in items:
+            fraction = _hash_fraction(_record_bytes(item if key is None else key(item)), salt)
+            yield int(np.searchsorted(bounds, fraction, side='right')), item
+
+    elif mode == 'count':
+        counts = np.zeros(len(ratios))
+        for seen, item in enumerate(items, start=1):
+            split = int(np.argmax(seen * ratios - counts))
+            counts[split] += 1
+            yield split, item
+
+    else:
+        raise ValueError("Invalid mode. Choose 'hash' or 'count'.")
+
+
+
+def stream_split(items, sinks, ratios=(0.8, 0.1, 0.1), mode='hash', key=None, salt=''):
+    '''
+        Routes the items of an iterator into train / val / test sinks.
+
+        Parameters
+        ----------
+        items   :   iterable
+            Any iterator or generator.
+
+        sinks   :   sequence
+            One sink per split: a callable called with the item, or an object
+            with an `append` method (list, file-backed writer ...).
+
+        ratios, mode, key, salt
+            See `assign_stream`.
+
+        Returns
+        -------
+        list of int     :   number of items routed to each sink
+
+        Examples
+        --------
+        >>> train, val, test = [], [], []
+        >>> stream_split(record_generator(), (train.append, val.append, test.append), (0.8, 0.1, 0.1))
+    '''
+
+    if len(sinks) != len(ratios):
+        raise ValueError(f'expected {len(ratios)} sinks but {len(sinks)} were given')
+
+    targets = [sink if callable(sink) else sink.append for sink in sinks]
+
+    counts = [0] * len(sinks)
+    for split, item in assign_stream(items, ratios, mode, key, salt):
+        targets[split](item)
+        counts[split] += 1
+
+    return counts
+
+
+
+def _hash_fraction(record, salt=b''):
+    '''
+        ### Private function — do not use!
+        maps bytes to a float in [0, 1) with a hash that is stable across runs
+    '''
+
+    digest = hashlib.blake2b(record, digest_size=8, salt=salt).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+
+
+def _record_bytes(record):
+    '''
+        ### Private function — do not use!
+        stable byte representation of a record, unlike the salted built-in `hash`
+
+        bytes and str are taken as they are. Numbers are encoded canonically,
+        whatever their Python or NumPy type and the NumPy version: a type tag
+        (bool, integer, real, complex) and the value, integers in decimal and
+        floats as big-endian IEEE doubles, so 1.0 and np.float64(1.0) match.
+        Arrays are encoded by dtype, shape and little-endian raw bytes; the items
+        of tuples and lists recursively, each prefixed by its length.
+
+        Raises
+        ------
+        TypeError
+            for records with no stable encoding (e.g. objects whose repr holds an address)
+    '''
+
+    if isinstance(record, (bytes, bytearray, memoryview)):
+        return bytes(record)
+    if isinstance(record, str):
+        return record.encode()
+    if record is None:
+        return b'n'
+    if isinstance(record, (bool, np.bool_)):
+        return b'b' + bytes([bool(record)])
+    if isinstance(record, (int, np.integer)):
+        return b'i' + str(int(record)).encode()
+    if isinstance(record, (float, np.floating)):
+        return b'f' + struct.pack('>d', float(record))
+    if isinstance(record, (complex, np.complexfloating)):
+        return b'c' + struct.pack('>dd', record.real, record.imag)
+    if isinstance(record, np.ndarray):
+        if record.dtype.hasobject:
+            raise TypeError('object arrays have no stable byte representation')
+        record = np.ascontiguousarray(record, dtype=record.dtype.newbyteorder('<'))
+        return record.dtype.str.encode() + repr(record.shape).encode() + record.tobytes()
+    if isinstance(record, (tuple, list)):
+        parts = [_record_bytes(item) for item in record]
+        return type(record).__name__.encode() + b''.join(len(part).to_bytes(8, 'big') + part for part in parts)
+
+    raise TypeError(f'{type(record).__name__} records have no stable byte representation: pass a `key`')
+
+
+
+
+#*## S L I D I N G  W I N D O W S ###################################################
+def sliding_windows(data, window, hop=None, axis=0, padding='drop', pad_value=0, labels=None, label_mode='last'):
+    '''
+        Segments data into fixed-length, possibly overlapping windows.
+
+        Built on `numpy.lib.stride_tricks.sliding_window_view`: the windows are
+        read-only views of `data`, so a 50% overlap costs no extra memory.
+
+        Parameters
+        ----------
+        data    :   ndarray
+            Data to segment, e.g. a signal (n_steps,) or (n_steps, n_channels).
+
+        window  :   int
+            Window length, in steps.
+
+        hop     :   int, optional
+            Distance between the starts of two windows. Default is `window` (no overlap).
+
+        axis    :   int, default = 0
+            Time axis.
+
+        padding :   {'drop', 'pad', 'strict'}, default = 'drop'
+            What to do with the steps that do not fill a last window:
+            - 'drop': ignore them (views). Data shorter than `window` give no
+              windows: an empty array (and empty labels)
+            - 'pad': pad the end with `pad_value` to fill a last window. This needs
+              one padded copy of `data`, the windows are views of that copy.
+            - 'strict': raise a ValueError if there are any
+
+        pad_value   :   scalar, default = 0
+            Value used by padding='pad'.
+
+        labels  :   scalar or array-like, optional
+            A label for the whole of `data`, or one label per step along `axis`.
+            If given, the per-window labels are returned too.
+
+        label_mode  :   {'first', 'last', 'center', 'majority'}, default = 'last'
+            How the label of a window is chosen from per-step labels.
+
+        Returns
+        -------
+        windows :   ndarray
+            View of shape data.shape[:axis] + (n_windows, window) + data.shape[axis+1:]
+
+        window_labels   :   ndarray, shape (n_windows,)
+            Only if `labels` is given.
+
+        Examples
+        --------
+        >>> signal = np.arange(10)
+        >>> sliding_windows(signal, 4, hop=2)
+        array([[0, 1, 2, 3],
+               [2, 3, 4, 5],
+               [4, 5, 6, 7],
+               [6, 7, 8, 9]])
+    '''
+
+    data = np.asarray(data)
+    axis = axis % data.ndim
+    hop = window if hop is None else hop
+    if window < 1 or hop < 1:
+        raise ValueError('window and hop must be positive')
+
+    length = data.shape[axis]
+
+    if padding == 'pad':
+        n_windows = -(-max(length - window, 0) // hop) + 1
+        pad = (n_windows - 1) * hop + window - length
+        if pad:
+            widths = [(0, 0)] * data.ndim
+            widths[axis] = (0, pad)
+            data = np.pad(data, widths, constant_values=pad_value)
+            if labels is not None and np.ndim(labels):
+                labels = np.pad(np.asarray(labels), (0, pad), mode='edge')
+    elif padding == 'strict':
+        if length < window or (length - window) % hop:
+            raise ValueError(f'{length} steps cannot be split exactly in windows of {window} with hop {hop}')
+    elif padding != 'drop':
+        raise ValueError("Invalid padding. Choose 'drop', 'pad' or 'strict'.")
+    elif length < window:
+        windows = np.empty(data.shape[:axis] + (0, window) + data.shape[axis+1:], dtype=data.dtype)
+        windows.flags.writeable = False         # read-only, like the windows views
+        if labels is None:
+            return windows
+        return windows, _window_labels(labels, 0, window, hop, label_mode)
+
+    if data.shape[axis] < window:
+        raise ValueError(f'window ({window}) is longer than the data ({length})')
+
+    windows = sliding_window_view(data, window, axis=axis)
+    windows = np.moveaxis(windows[(slice(None),) * axis + (slice(None, None, hop),)], -1, axis + 1)
+
+    if labels is None:
+        return windows
+
+    return windows, _window_labels(labels, windows.shape[axis], window, hop, label_mode)
+
+
+
+def _window_labels(labels, n_windows, window, hop, label_mode='last'):
+    '''
+        ### Private function — do not use!
+        one label per window, from a scalar or from per-step labels
+    '''
+
+    if np.ndim(labels) == 0:
+        return np.full(n_windows, labels)
+    if n_windows == 0:
+        return np.empty(0, dtype=np.asarray(labels).dtype)
+
+    steps = sliding_window_view(np.asarray(labels), window)[::hop][:n_windows]
+
+    if label_mode == 'first':
+        return steps[:, 0].copy()
+    if label_mode == 'last':
+        return steps[:, -1].copy()
+    if label_mode == 'center':
+        return steps[:, window // 2].copy()
+    if label_mode == 'majority':
+        classes = np.unique(steps)
+        counts = np.stack([(steps == value).sum(axis=1) for value in classes], axis=1)
+        return classes[counts.argmax(axis=1)]
+
+    raise ValueError("Invalid label_mode. Choose 'first', 'last', 'center' or 'majority'.")
+
 
 
 
@@ -15,10 +15,11 @@ def to_z_score(data): # tested
         Returns
         -------
         np.array    :   z-score data
+                        NaNs are ignored by the mean and the std, and stay NaN
     '''
 
     data = np.array(data)
-    return np.abs((data - np.mean(data)) / np.std(data))
+    return np.abs((data - np.nanmean(data)) / np.nanstd(data))
 
 
 
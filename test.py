@@ -1,10 +1,142 @@
+import numpy as np
+import pytest
+
 from pyes.neural_networks.dataset_manager import DatasetManager
+from pyes.neural_networks.DataProcessing import _DataProcessing
+from pyes.neural_networks.shared import SharedDataset, _open
+from pyes.preprocessing import cleaning
+from pyes.utils import to_z_score
+
+
+
+#*### F I X T U R E S #################################################################################################
+@pytest.fixture
+def class_files(tmp_path):
+    ''' three .npy classes with different sizes, means and scales '''
+
+    rng = np.random.default_rng(1)
+    paths = []
+    for k, rows in enumerate((103, 97, 120)):
+        path = str(tmp_path / f'class_{k}.npy')
+        np.save(path, (rng.normal(size=(rows, 3)) * (k + 1) + k).astype(np.float32))
+        paths.append(path)
+    return paths
+
+
+def _assert_same_output(expected, result):
+    (data_a, labels_a), (data_b, labels_b) = expected, result
+    assert len(data_a) == len(data_b) and len(labels_a) == len(labels_b)
+    for a, b in zip(data_a, data_b):
+        assert a.shape == b.shape
+        np.testing.assert_allclose(a, b, atol=1e-5)
+    for a, b in zip(labels_a, labels_b):
+        np.testing.assert_array_equal(a, b)
+
+
+
+#*### D A T A S E T  M A N A G E R #################################################################################################
+@pytest.mark.parametrize('normalization', ['std', to_z_score])
+@pytest.mark.parametrize('processing', [dict(window=8, hop=3), dict(window=8, hop=5, padding='pad'),
+                                        dict(data_shape=(-1, 3))])
+def test_parallel_processing_matches_serial(class_files, normalization, processing):
+    manager = DatasetManager(class_files, normalization=normalization)
+    manager.load_data()
+    serial = manager.data_processing([50, 75], **processing)
+
+    manager = DatasetManager(class_files, normalization=normalization)
+    manager.load_data()
+    parallel = manager.data_processing([50, 75], n_workers=2, **processing)
+
+    _assert_same_output(serial, parallel)
+
+
+@pytest.mark.parametrize('processing', [dict(window=8, hop=3), dict(data_shape=(-1, 3))])
+def test_memory_limit_spills_same_values(class_files, tmp_path, processing):
+    manager = DatasetManager(class_files)
+    manager.load_data()
+    expected = manager.data_processing([50, 75], **processing)
+
+    spill_dir = tmp_path / 'spill'
+    spill_dir.mkdir()
+    manager = DatasetManager(class_files, memory_limit=1024, spill_dir=str(spill_dir))
+    manager.load_data()
+    result = manager.data_processing([50, 75], **processing)
+
+    assert manager.memory_budget.report()['spilled_bytes'] > 0
+    _assert_same_output(expected, result)
+
+
+
+#*### C L E A N I N G #################################################################################################
+@pytest.mark.parametrize('function, kwargs', [
+    (cleaning.minmax_scaling, {}),
+    (cleaning.maxabs_scaling, {}),
+    (cleaning.std_norm, {}),
+    (cleaning.whitening, {}),
+    (cleaning.normalization, {'type_norm': 'l2'}),
+])
+def test_threaded_cleaning_matches_serial(function, kwargs):
+    data = np.random.default_rng(2).normal(size=(5000, 4)) * [1, 2, 3, 4] + [0, 1, -1, 5]
+
+    expected = function(data, n_jobs=None, **kwargs)
+    result = function(data, n_jobs=-1, **kwargs)
+
+    np.testing.assert_allclose(result, expected, rtol=1e-7, atol=1e-10)
+
+
+
+#*### S H A R E D  D A T A S E T #################################################################################################
+def test_shared_dataset_lifecycle():
+    data = [np.arange(12, dtype=np.float32).reshape(4, 3), np.ones((2, 3), dtype=np.float32)]
+    labels = [np.array([0, 1, 1, 0]), np.array([1, 0])]
+
+    publisher = SharedDataset.publish(data, labels)
+    handle = publisher.handle
+    worker = SharedDataset.attach(handle.to_json())
+
+    assert publisher.references == 2
+    for a, b in zip(worker.data + worker.labels, data + labels):
+        np.testing.assert_array_equal(a, b)
+    assert not worker.data[0].flags.writeable
+
+    worker.close()
+    assert publisher.references == 1
+    publisher.close()
+    assert publisher.references == 0
+
+    with pytest.raises(FileNotFoundError):
+        _open(handle.name)
+    with pytest.raises(FileNotFoundError):
+        SharedDataset.attach(handle)
+
+
+
+#*### D A T A  P R O C E S S I N G #################################################################################################
+def test_data_processing_load_data_splits(tmp_path):
+    paths = []
+    for k, rows in enumerate((40, 24)):
+        path = str(tmp_path / f'class_{k}.npy')
+        np.save(path, np.arange(rows * 2, dtype=np.float64).reshape(rows, 2) + 100 * k)
+        paths.append(path)
+
+    processing = _DataProcessing(paths, file_type='npy', sample_shape=(4, 2))
+    (train_data, train_labels), (test_data, test_labels) = processing.load_data((0.5, 0.5))
+
+    # class 0: 40 rows -> 5 + 5 samples, class 1: 24 rows -> 3 + 3 samples
+    assert train_data.shape == (8, 4, 2) and test_data.shape == (8, 4, 2)
+    assert train_data.dtype == np.float32
+    expected_labels = np.array([[1, 0]] * 5 + [[0, 1]] * 3, dtype=np.float32)
+    np.testing.assert_array_equal(train_labels, expected_labels)
+    np.testing.assert_array_equal(test_labels, expected_labels)
+
+
 
-path_1 = 'test_resources/TEST_DATA_1.txt'
-path_2 = 'test_resources/TEST_DATA_2.txt'
+if __name__ == '__main__':
+    path_1 = 'test_resources/TEST_DATA_1.txt'
+    path_2 = 'test_resources/TEST_DATA_2.txt'
 
-paths = [path_1, path_2]
+    paths = [path_1, path_2]
 
-manager = DatasetManager(paths, file_type='text')
-manager.load_data()
-print(manager.raw_data)
\ No newline at end of file
+    manager = DatasetManager(paths, file_type='text')
+    manager.load_data()
+    print(manager.raw_data)